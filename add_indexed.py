@@ -1,43 +1,298 @@
+import argparse
+import re
 import sqlite3
 import time
+from collections import OrderedDict
+from query_cache import normalize_sql
+from query_guard import QueryTimeout, install_time_budget, mask_sql, table_aliases, time_budget
+from query_log import read_query_log
+from spatial import register_spatial_functions
+from depth_grid import register_grid_functions
 
+# --- Configuration ---
 DB_FILE_PATH = 'argo.db'
+QUERY_LOG_PATH = 'query_log.jsonl' # Written by backend.execute_sql_query
+INDEX_PREFIX = 'idx_auto_' # Name prefix of indexes this tool creates
+TOP_QUERIES = 50 # Most frequent distinct queries replayed
+REPEATS = 3 # Timed runs per query (best is reported)
+QUERY_TIMEOUT_SECONDS = 30 # Budget per timed run
+MAX_COVERING_COLUMNS = 4 # Extra columns an index may carry to cover a query's SELECT list
 
-def add_indexes():
-    """Connects to the SQLite database and adds indexes to improve query performance."""
-    print(f"➡️ Connecting to database at '{DB_FILE_PATH}'...")
+_PREDICATE_PATTERN = re.compile(r"(?:\b(\w+)\.)?\b(\w+)\s*(==|=|>=|<=|>|<|\bIN\b|\bBETWEEN\b|\bLIKE\b)", re.IGNORECASE)
+_JOIN_PATTERN = re.compile(r"\b(\w+)\.(\w+)\s*=\s*(\w+)\.(\w+)")
+_COLUMN_PATTERN = re.compile(r"(?:\b(\w+)\.)?\b([A-Za-z_]\w*)\b")
+_CLAUSE_END = r"(?=\b(?:GROUP\s+BY|ORDER\s+BY|HAVING|LIMIT|WINDOW)\b|$)"
+_EQUALITY_OPERATORS = {'=', '==', 'in'}
+_PLAN_INDEX_PATTERN = re.compile(r"\bINDEX (\w+)")
+_SHADOW_SUFFIXES = ('node', 'parent', 'rowid') # Shadow tables SQLite keeps for each R*Tree
+
+def load_workload(log_path, top=TOP_QUERIES):
+    """
+    Distinct queries from the log (by normalized SQL and parameters), most frequent first.
+    Result-cache hits, which older logs recorded, never reached the database and are ignored.
+    """
+    workload = OrderedDict()
+    for entry in read_query_log(log_path):
+        if entry.get('source') == 'cache':
+            continue
+        params = entry.get('params') or {}
+        key = (normalize_sql(entry['sql']), tuple(sorted(params.items())))
+        item = workload.setdefault(key, {'sql': entry['sql'], 'params': params, 'count': 0})
+        item['count'] += 1
+    return sorted(workload.values(), key=lambda item: -item['count'])[:top]
+
+def describe_schema(conn):
+    """
+    Returns ({table: [columns]}, {table: [existing index column lists]}, {table: rowid alias column}, [view definitions]).
+    Virtual tables (the R*Tree) and their shadow tables are left out, since SQLite cannot index them.
+    """
+    virtual = [row[0] for row in conn.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'table' AND sql LIKE 'CREATE VIRTUAL TABLE%'")]
+    shadows = {f"{name}_{suffix}" for name in virtual for suffix in _SHADOW_SUFFIXES}
+    tables = [row[0] for row in conn.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%'")
+              if row[0] not in virtual and row[0] not in shadows]
+    columns, indexes, rowids = {}, {}, {}
+    for table in tables:
+        info = conn.execute(f"PRAGMA table_info({table})").fetchall()
+        columns[table] = [row[1] for row in info]
+        # An INTEGER PRIMARY KEY is the rowid: already the table's key and stored in every index.
+        primary_key = [row for row in info if row[5]]
+        if len(primary_key) == 1 and primary_key[0][2].upper() == 'INTEGER':
+            rowids[table] = primary_key[0][1]
+        indexes[table] = [[rowids[table]]] if table in rowids else []
+        for index in conn.execute(f"PRAGMA index_list({table})").fetchall():
+            indexes[table].append([row[2] for row in conn.execute(f"PRAGMA index_info({index[1]})")])
+    views = [row[0] for row in conn.execute("SELECT sql FROM sqlite_master WHERE type = 'view'")]
+    return columns, indexes, rowids, views
+
+def _clause(masked, keyword):
+    match = re.search(rf"\b{keyword}\b(.*?){_CLAUSE_END}", masked, re.IGNORECASE | re.DOTALL)
+    return match.group(1) if match else ""
+
+def analyze_query(sql, columns, aliases, join_columns):
+    """
+    Per base table, the columns a query filters by equality, filters by range,
+    orders by and selects: {table: {'eq': [...], 'range': [...], 'order': [...], 'select': [...] or None}}.
+    Columns read through the `profiles` view are attributed to the base table that owns them.
+    """
+    owners = {}
+    for table, names in columns.items():
+        for name in names:
+            owners.setdefault(name.lower(), []).append((table, name))
+
+    # Only tables the query (or a view it reads) references can own its columns; profile_grid,
+    # for one, also has TEMP and PSAL columns but is never behind the `profiles` view.
+    referenced = set(aliases.values())
+    def resolve(qualifier, name):
+        table = aliases.get(qualifier) if qualifier else None
+        candidates = [(owner, column) for owner, column in owners.get(name.lower(), []) if owner in referenced]
+        for owner, column in candidates:
+            if owner == table:
+                return owner, column
+        # Unqualified, or qualified by a view: only columns owned by exactly one table can be attributed.
+        return candidates[0] if len(candidates) == 1 else (None, None)
+
+    usage = {}
+    def use(table, kind, column):
+        entry = usage.setdefault(table, {'eq': [], 'range': [], 'order': [], 'select': []})
+        if column not in entry[kind]:
+            entry[kind].append(column)
+
+    masked = mask_sql(sql)
+    for clause in (_clause(masked, 'WHERE'), " ".join(re.findall(r"\bON\b(.*?)(?=\bJOIN\b|\bWHERE\b|$)", masked, re.IGNORECASE | re.DOTALL))):
+        for qualifier, name, operator in _PREDICATE_PATTERN.findall(clause):
+            table, column = resolve(qualifier, name)
+            if table is None or column in join_columns.get(table, ()):
+                continue
+            use(table, 'eq' if operator.lower() in _EQUALITY_OPERATORS else 'range', column)
+    for qualifier, name in _COLUMN_PATTERN.findall(_clause(masked, r'ORDER\s+BY')):
+        table, column = resolve(qualifier, name)
+        if table is not None:
+            use(table, 'order', column)
+
+    select_list = re.search(r"\bSELECT\b(.*?)\bFROM\b", masked, re.IGNORECASE | re.DOTALL)
+    select_all = select_list is None or '*' in select_list.group(1)
+    if not select_all:
+        for qualifier, name in _COLUMN_PATTERN.findall(select_list.group(1)):
+            table, column = resolve(qualifier, name)
+            if table is not None:
+                use(table, 'select', column)
+    for entry in usage.values():
+        if select_all:
+            entry['select'] = None
+    return usage
+
+def candidate_indexes(usage, join_columns, rowids):
+    """
+    Composite index candidates for one query: equality columns first, then one range
+    (or ORDER BY) column; a variant led by the join key, for tables reached through
+    a join from another filtered table; and covering variants that add the selected columns.
+    A table's rowid column is never added, since every index already carries it.
+    """
+    candidates = []
+    filtered_tables = [table for table, entry in usage.items() if entry['eq'] or entry['range']]
+    for table, entry in usage.items():
+        if table not in filtered_tables:
+            continue
+        joins = sorted(join_columns.get(table, set()) - {rowids.get(table)})
+        keys = sorted(entry['eq']) + (entry['range'][:1] or entry['order'][:1])
+        variants = [keys]
+        if len(filtered_tables) > 1:
+            variants += [[join] + keys for join in joins if join not in keys]
+        for variant in list(variants):
+            if entry['select'] is None:
+                continue
+            extra = [column for column in dict.fromkeys(entry['select'] + joins + entry['range'][1:]) if column not in variant and column != rowids.get(table)]
+            if extra and len(extra) <= MAX_COVERING_COLUMNS:
+                variants.append(variant + extra)
+        candidates += [(table, tuple(variant)) for variant in variants if variant]
+    return candidates
+
+def index_name(table, columns):
+    return f"{INDEX_PREFIX}{table}_{'_'.join(column.lower() for column in columns)}"
+
+def plan_indexes(conn, sql, params):
+    """Names of the indexes in a query's EXPLAIN QUERY PLAN; empty if the query cannot be planned."""
     try:
-        conn = sqlite3.connect(DB_FILE_PATH)
-        cursor = conn.cursor()
-        
-        print("➡️ Checking for existing indexes...")
-        # Get existing indexes
-        cursor.execute("SELECT name FROM sqlite_master WHERE type='index';")
-        existing_indexes = {row[0] for row in cursor.fetchall()}
-        print(f"Found indexes: {existing_indexes if existing_indexes else 'None'}")
-
-        indexes_to_create = {
-            'idx_float_id': 'CREATE INDEX idx_float_id ON profiles (float_id);',
-            'idx_pres': 'CREATE INDEX idx_pres ON profiles (PRES);',
-            'idx_time': 'CREATE INDEX idx_time ON profiles (TIME);'
-        }
-
-        for idx_name, sql_command in indexes_to_create.items():
-            if idx_name not in existing_indexes:
-                print(f"➡️ Creating index '{idx_name}'...")
-                start_time = time.time()
-                cursor.execute(sql_command)
-                end_time = time.time()
-                print(f"✅ Index '{idx_name}' created successfully in {end_time - start_time:.2f} seconds.")
-            else:
-                print(f"🔵 Index '{idx_name}' already exists, skipping.")
-
-        conn.commit()
+        rows = conn.execute(f"EXPLAIN QUERY PLAN {sql}", params).fetchall()
+    except sqlite3.Error as e:
+        print(f"⚠️ Could not plan query ({e}): {normalize_sql(sql)[:90]}")
+        return set()
+    return {name for row in rows for name in _PLAN_INDEX_PATTERN.findall(row[3])}
+
+def time_query(conn, sql, params, repeats=REPEATS):
+    """
+    Best wall-clock time in ms over `repeats` full executions, None if the query times out,
+    or False if it fails (e.g. a logged query for a table or function this database lacks).
+    """
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        try:
+            with time_budget(QUERY_TIMEOUT_SECONDS):
+                conn.execute(sql, params).fetchall()
+        except QueryTimeout:
+            return None
+        except sqlite3.Error as e:
+            print(f"⚠️ Skipping query that failed ({e}): {normalize_sql(sql)[:90]}")
+            return False
+        timings.append((time.perf_counter() - start) * 1000)
+    return min(timings)
+
+def _format_ms(ms):
+    if ms is False:
+        return "failed"
+    return f"{ms:.1f}" if ms is not None else "timeout"
+
+def advise(db_path, log_path, apply=False, top=TOP_QUERIES):
+    """
+    Replays the most frequent logged queries, proposes composite/covering indexes for them,
+    builds the candidates inside a transaction and keeps only those SQLite's planner uses.
+    Reports before/after latency per query; the indexes are committed only with `apply`.
+    """
+    workload = load_workload(log_path, top)
+    if not workload:
+        print(f"🔵 No queries recorded in '{log_path}' yet. Use the app for a while, then run this again.")
+        return
+
+    print(f"➡️ Connecting to database at '{db_path}'...")
+    conn = sqlite3.connect(db_path, isolation_level=None)
+    install_time_budget(conn)
+    # Logged template queries call the SQL functions the backend registers on its connections.
+    register_spatial_functions(conn)
+    register_grid_functions(conn)
+    columns, existing, rowids, views = describe_schema(conn)
+
+    join_columns = {}
+    view_aliases = table_aliases(*views)
+    for view in views:
+        for left_alias, left_column, right_alias, right_column in _JOIN_PATTERN.findall(mask_sql(view)):
+            for alias, column in ((left_alias, left_column), (right_alias, right_column)):
+                if alias in view_aliases:
+                    join_columns.setdefault(view_aliases[alias], set()).add(column)
+
+    print(f"➡️ Analyzing {len(workload)} distinct queries...")
+    proposals = OrderedDict()
+    for item in workload:
+        aliases = table_aliases(item['sql'], *views)
+        for table, cols in candidate_indexes(analyze_query(item['sql'], columns, aliases, join_columns), join_columns, rowids):
+            # Skip candidates an existing index already covers as a prefix.
+            if any([c.lower() for c in index[:len(cols)]] == [c.lower() for c in cols] for index in existing.get(table, [])):
+                continue
+            proposals.setdefault(index_name(table, cols), (table, cols))
+    # An index whose columns lead a longer candidate on the same table serves no lookup the longer one cannot.
+    for name, (table, cols) in list(proposals.items()):
+        if any(other_table == table and len(other) > len(cols) and other[:len(cols)] == cols for other_table, other in proposals.values()):
+            del proposals[name]
+    if not proposals:
+        print("🔵 Existing indexes already cover the recorded queries.")
         conn.close()
-        print("\n✅ Database indexing complete.")
+        return
 
-    except sqlite3.Error as e:
-        print(f"❌ Database error: {e}")
+    print(f"➡️ Timing queries before indexing ({REPEATS} runs each)...")
+    for item in workload:
+        item['before'] = time_query(conn, item['sql'], item['params'])
+    # A logged query that fails here is reported and left out of the rest of the run.
+    workload = [item for item in workload if item['before'] is not False]
+
+    conn.execute("BEGIN")
+    for name, (table, cols) in list(proposals.items()):
+        start_time = time.time()
+        try:
+            conn.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({', '.join(cols)})")
+        except sqlite3.Error as e:
+            print(f"⚠️ Skipping candidate '{name}' that could not be built: {e}")
+            del proposals[name]
+            continue
+        print(f"   Built candidate '{name}' in {time.time() - start_time:.2f} seconds.")
+
+    used = set()
+    for item in workload:
+        item['indexes'] = sorted(plan_indexes(conn, item['sql'], item['params']) & set(proposals))
+        used.update(item['indexes'])
+    for name in proposals:
+        if name not in used:
+            conn.execute(f"DROP INDEX {name}")
+
+    print("➡️ Timing queries with the chosen indexes...")
+    for item in workload:
+        item['after'] = time_query(conn, item['sql'], item['params'])
+
+    if apply and used:
+        conn.execute("COMMIT")
+    else:
+        conn.execute("ROLLBACK")
+    conn.close()
+
+    print(f"\n{'count':>6} {'before ms':>10} {'after ms':>10} {'speedup':>8}  query / indexes used")
+    for item in workload:
+        before, after = item['before'], item['after']
+        speedup = f"{before / after:.1f}x" if before and after else "-"
+        print(f"{item['count']:>6} {_format_ms(before):>10} {_format_ms(after):>10} {speedup:>8}  {normalize_sql(item['sql'])[:90]}")
+        for name in item['indexes']:
+            print(f"{'':>39}↳ {name}")
+
+    print()
+    for name in sorted(used):
+        table, cols = proposals[name]
+        print(f"{'✅ Created' if apply else '💡 Proposed'}: CREATE INDEX {name} ON {table} ({', '.join(cols)});")
+    if not used:
+        print("🔵 The planner did not use any candidate index; nothing to create.")
+    elif not apply:
+        print("\nRe-run with --apply to create these indexes.")
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Propose (and optionally create) indexes for the recorded query workload.")
+    parser.add_argument('--db', default=DB_FILE_PATH, help="SQLite database to index.")
+    parser.add_argument('--log', default=QUERY_LOG_PATH, help="Query log written by the backend.")
+    parser.add_argument('--top', type=int, default=TOP_QUERIES, help="Number of most frequent distinct queries to replay.")
+    parser.add_argument('--apply', action='store_true', help="Create the indexes the planner uses instead of only reporting them.")
+    return parser.parse_args()
 
 if __name__ == '__main__':
-    add_indexes()
\ No newline at end of file
+    args = parse_args()
+    try:
+        advise(args.db, args.log, apply=args.apply, top=args.top)
+    except sqlite3.Error as e:
+        print(f"❌ Database error: {e}")
@@ -1,11 +1,26 @@
-from flask import Flask, render_template, request, jsonify, send_from_directory
+from flask import Flask, Response, render_template, request, jsonify, send_from_directory
 import pandas as pd
 import plotly.express as px
-import plotly.utils
 import json
+import os
+import queue
+from concurrent.futures import ThreadPoolExecutor
 import backend
+from downsample import bin_map_points, downsample_profile
+from chart_encoding import encode_figure
 
 app = Flask(__name__)
+# Most points a chart may draw; larger results are downsampled before the figure is built.
+MAP_POINT_BUDGET = int(os.getenv("MAP_POINT_BUDGET", "5000"))
+PROFILE_POINT_BUDGET = int(os.getenv("PROFILE_POINT_BUDGET", "2000"))
+# 'json' (plain Plotly JSON) or 'compact' (typed arrays, see chart_encoding.py); requests may pass `chart_format`.
+CHART_FORMAT = os.getenv("CHART_FORMAT", "json")
+# Runs summary LLM calls alongside chart building; each chat request uses at most one worker.
+summary_executor = ThreadPoolExecutor(max_workers=int(os.getenv("SUMMARY_WORKERS", "8")), thread_name_prefix="summary")
+
+# Models load on the first question that needs them; set WARM_UP_MODELS=1 to load them in the background at startup instead.
+if os.getenv("WARM_UP_MODELS") == "1":
+    backend.warm_up(background=True)
 
 @app.route('/')
 def index():
@@ -15,20 +30,84 @@ def index():
 def dashboard():
     return render_template('dashboard.html')
 
+@app.route('/cache/stats')
+def cache_stats():
+    return jsonify(backend.get_cache_stats())
+
+def build_result_payload(result_df, max_points=None, chart_format=None):
+    """
+    Chart or table part of a chat response: {'response_type': ..., 'chart' or 'table_html': ...}.
+    Charts report `total_rows` (rows in the result), `plotted_rows` (points drawn after
+    downsampling) and `chart_encoding`. `max_points` and `chart_format` override the configured defaults.
+    """
+    compact = (chart_format or CHART_FORMAT) == 'compact'
+    viz_suggestion = backend.get_visualization_suggestion(result_df)
+
+    if viz_suggestion == 'map':
+        plot_df = bin_map_points(result_df, int(max_points or MAP_POINT_BUDGET))
+        hover_data = {'points': True} if 'points' in plot_df.columns else None
+        fig = px.scatter_geo(plot_df, lat='LATITUDE', lon='LONGITUDE', hover_name='float_id', hover_data=hover_data, title='ARGO Float Locations', template='plotly_dark')
+        fig.update_layout(margin={"r":0,"t":40,"l":0,"b":0}, paper_bgcolor="rgba(0,0,0,0)", plot_bgcolor="rgba(0,0,0,0)")
+    elif viz_suggestion == 'profile_plot':
+        y_axis_col = 'TEMP' if 'TEMP' in result_df.columns else 'PSAL'
+        plot_df = downsample_profile(result_df, y_axis_col, budget=int(max_points or PROFILE_POINT_BUDGET))
+        fig = px.line(plot_df, x=y_axis_col, y='PRES', title=f'Depth Profile ({y_axis_col})', template='plotly_dark', labels={'PRES': 'Pressure (dbar)', y_axis_col: y_axis_col.title()})
+        fig.update_yaxes(autorange="reversed")
+        fig.update_layout(margin={"r":20,"t":40,"l":20,"b":20}, paper_bgcolor="rgba(0,0,0,0)", plot_bgcolor="rgba(0,0,0,0)")
+    else:
+        return {'response_type': 'table', 'table_html': result_df.to_html(classes='min-w-full divide-y divide-slate-700 bg-slate-900', border=0)}
+
+    return {
+        'response_type': 'plot',
+        'chart': encode_figure(fig, compact=compact),
+        'chart_encoding': 'compact' if compact else 'json',
+        'total_rows': len(result_df),
+        'plotted_rows': len(plot_df),
+    }
+
+def paging_payload(result_handle):
+    """Tells the client how to read the rest of a table shown one page at a time."""
+    if result_handle is None:
+        return {}
+    return {'result_handle': result_handle, 'has_more': True, 'page_size': backend.TABLE_PAGE_SIZE}
+
+def error_payload(e, sql_query):
+    error_message = f"An error occurred: {str(e)}"
+    if sql_query:
+        error_message += f"\n\nAttempted SQL Query:\n{sql_query}"
+    return {'sql_query': sql_query, 'response_type': 'error', 'message': error_message}
+
+@app.route('/results/<handle>', methods=['GET'])
+def result_page(handle):
+    """Next page of a table result: {'columns', 'rows', 'offset', 'done'}."""
+    page_size = max(1, min(request.args.get('page_size', backend.TABLE_PAGE_SIZE, type=int), 5000))
+    try:
+        return jsonify(backend.fetch_result_page(handle, page_size))
+    except KeyError:
+        return jsonify({'error': 'Unknown or expired result handle'}), 404
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/results/<handle>', methods=['DELETE'])
+def close_result(handle):
+    backend.close_result(handle)
+    return '', 204
+
 @app.route('/chat', methods=['POST'])
 def chat():
     user_question = request.json.get('question')
+    max_points = request.json.get('max_points')
+    chart_format = request.json.get('chart_format')
     if not user_question:
         return jsonify({'error': 'No question provided'}), 400
 
     sql_query = ""
+    result_handle = None
     try:
-        # --- THIS LINE HAS CHANGED ---
-        sql_query = backend.get_sql_query(user_question)
-        # --------------------------
+        sql_query, sql_params = backend.get_sql_query(user_question)
 
-        result_df = backend.execute_sql_query(sql_query)
-        response_payload = {'sql_query': sql_query}
+        result_df, result_handle = backend.execute_sql_paged(sql_query, sql_params)
+        response_payload = {'sql_query': sql_query, 'sql_params': sql_params}
 
         if result_df.empty:
             response_payload.update({
@@ -37,39 +116,83 @@ def chat():
             })
             return jsonify(response_payload)
 
-        summary = backend.generate_summary(user_question, result_df)
-        response_payload['summary'] = summary
-
-        viz_suggestion = backend.get_visualization_suggestion(result_df)
-
-        if viz_suggestion == 'map':
-            fig = px.scatter_geo(result_df, lat='LATITUDE', lon='LONGITUDE', hover_name='float_id', title='ARGO Float Locations', template='plotly_dark')
-            fig.update_layout(margin={"r":0,"t":40,"l":0,"b":0}, paper_bgcolor="rgba(0,0,0,0)", plot_bgcolor="rgba(0,0,0,0)")
-            response_payload['response_type'] = 'plot'
-            response_payload['chart'] = json.dumps(fig, cls=plotly.utils.PlotlyJSONEncoder)
-        elif viz_suggestion == 'profile_plot':
-            y_axis_col = 'TEMP' if 'TEMP' in result_df.columns else 'PSAL'
-            fig = px.line(result_df, x=y_axis_col, y='PRES', title=f'Depth Profile ({y_axis_col})', template='plotly_dark', labels={'PRES': 'Pressure (dbar)', y_axis_col: y_axis_col.title()})
-            fig.update_yaxes(autorange="reversed")
-            fig.update_layout(margin={"r":20,"t":40,"l":20,"b":20}, paper_bgcolor="rgba(0,0,0,0)", plot_bgcolor="rgba(0,0,0,0)")
-            response_payload['response_type'] = 'plot'
-            response_payload['chart'] = json.dumps(fig, cls=plotly.utils.PlotlyJSONEncoder)
-        else:
-            response_payload['response_type'] = 'table'
-            response_payload['table_html'] = result_df.to_html(classes='min-w-full divide-y divide-slate-700 bg-slate-900', border=0)
+        backend.remember_query(user_question, sql_query)
+
+        # The summary is an LLM round trip; build the chart while it is in flight.
+        summary_future = summary_executor.submit(backend.generate_summary, user_question, result_df)
+        response_payload.update(build_result_payload(result_df, max_points, chart_format))
+        response_payload.update(paging_payload(result_handle))
+        response_payload['summary'] = summary_future.result()
 
         return jsonify(response_payload)
 
     except Exception as e:
-        error_message = f"An error occurred: {str(e)}"
-        if sql_query:
-            error_message += f"\n\nAttempted SQL Query:\n{sql_query}"
-
-        return jsonify({
-            'sql_query': sql_query,
-            'response_type': 'error',
-            'message': error_message
-        }), 500
+        # The client never sees the handle, so release its cursor now instead of at TTL.
+        if result_handle is not None:
+            backend.close_result(result_handle)
+        return jsonify(error_payload(e, sql_query)), 500
+
+@app.route('/chat/stream', methods=['POST'])
+def chat_stream():
+    """
+    Streaming variant of /chat as newline-delimited JSON. Events, in order:
+    {"event": "sql", ...}, {"event": "result", ...} (chart, table or message),
+    any number of {"event": "summary", "delta": "..."}, then {"event": "done"}.
+    A failure at any point sends {"event": "error", ...} and ends the stream.
+    """
+    user_question = request.json.get('question')
+    max_points = request.json.get('max_points')
+    chart_format = request.json.get('chart_format')
+    if not user_question:
+        return jsonify({'error': 'No question provided'}), 400
+
+    def ndjson(event, **payload):
+        return json.dumps({'event': event, **payload}, default=str) + "\n"
+
+    def generate():
+        sql_query = ""
+        result_handle, handle_sent = None, False
+        try:
+            sql_query, sql_params = backend.get_sql_query(user_question)
+            yield ndjson('sql', sql_query=sql_query, sql_params=sql_params)
+
+            result_df, result_handle = backend.execute_sql_paged(sql_query, sql_params)
+            if result_df.empty:
+                yield ndjson('result', response_type='message', message='Your query returned no results. Please try a different question.')
+                yield ndjson('done')
+                return
+
+            backend.remember_query(user_question, sql_query)
+
+            # Summary tokens are produced on a worker thread while this one builds the chart.
+            chunks = queue.Queue()
+            def produce_summary():
+                try:
+                    for chunk in backend.stream_summary(user_question, result_df):
+                        chunks.put(chunk)
+                    chunks.put(None)
+                except Exception as e:
+                    chunks.put(e)
+            summary_executor.submit(produce_summary)
+
+            result_event = ndjson('result', **build_result_payload(result_df, max_points, chart_format), **paging_payload(result_handle))
+            handle_sent = True
+            yield result_event
+
+            while (chunk := chunks.get()) is not None:
+                if isinstance(chunk, Exception):
+                    raise chunk
+                yield ndjson('summary', delta=chunk)
+            yield ndjson('done')
+
+        except Exception as e:
+            yield ndjson('error', **error_payload(e, sql_query))
+        finally:
+            # A handle the client never received (failure or disconnect before the result) is released now.
+            if result_handle is not None and not handle_sent:
+                backend.close_result(result_handle)
+
+    return Response(generate(), mimetype='application/x-ndjson', headers={'X-Accel-Buffering': 'no', 'Cache-Control': 'no-cache'})
 
 if __name__ == '__main__':
     app.run(debug=True, port=5001)
@@ -0,0 +1,84 @@
+import json
+import os
+import numpy as np
+
+# Layout of the memory-mapped measurement store written by `main.py --arrays`:
+#   <root>/CURRENT            name of the snapshot directory readers should open
+#   <root>/<snapshot>/meta.json
+#   <root>/<snapshot>/<column>.npy, one file per column below
+# Rows are grouped by float (sorted by float_id), then by cast in time order, then by level,
+# so a float's full history and a single cast are both contiguous slices.
+LEVEL_COLUMNS = ('PRES', 'TEMP', 'PSAL')
+PROFILE_COLUMNS = ('profile_key', 'profile_id', 'TIME', 'LATITUDE', 'LONGITUDE')
+INDEX_COLUMNS = ('float_ids', 'float_offsets', 'float_profile_offsets', 'profile_offsets', 'profile_order')
+CURRENT_FILE = 'CURRENT'
+META_FILE = 'meta.json'
+
+def current_snapshot(root: str):
+    """Directory of the snapshot `root` currently points at, or None if there is none."""
+    try:
+        with open(os.path.join(root, CURRENT_FILE), encoding='utf-8') as f:
+            name = f.read().strip()
+    except OSError:
+        return None
+    path = os.path.join(root, name)
+    return path if name and os.path.isdir(path) else None
+
+class ArrayStore:
+    """
+    Read-only view of one snapshot. Every column is opened with np.load(mmap_mode='r'),
+    so slices are views into the page cache: nothing is copied until a caller does so.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(os.path.join(path, META_FILE), encoding='utf-8') as f:
+            self.meta = json.load(f)
+        self.data_version = self.meta.get('data_version')
+        self.columns = {name: self._load(name) for name in LEVEL_COLUMNS + PROFILE_COLUMNS}
+        for name in INDEX_COLUMNS:
+            setattr(self, name, self._load(name))
+
+    def _load(self, name):
+        return np.load(os.path.join(self.path, f"{name}.npy"), mmap_mode='r')
+
+    def _float_index(self, float_id: str):
+        i = int(np.searchsorted(self.float_ids, float_id))
+        if i < len(self.float_ids) and self.float_ids[i] == float_id:
+            return i
+        return None
+
+    def float_rows(self, float_id: str):
+        """Slice of level rows holding a float's full history, or None for an unknown float."""
+        i = self._float_index(str(float_id))
+        if i is None:
+            return None
+        return slice(int(self.float_offsets[i]), int(self.float_offsets[i + 1]))
+
+    def profile_rows(self, profile_key: int):
+        """Slice of level rows holding one cast, or None for an unknown cast."""
+        keys = self.columns['profile_key']
+        i = int(np.searchsorted(keys, profile_key, sorter=self.profile_order))
+        if i >= len(keys) or keys[self.profile_order[i]] != profile_key:
+            return None
+        p = int(self.profile_order[i])
+        return slice(int(self.profile_offsets[p]), int(self.profile_offsets[p + 1]))
+
+    def float_levels(self, float_id: str, names=LEVEL_COLUMNS):
+        """{column: view} of a float's level rows (zero-copy), or None for an unknown float."""
+        rows = self.float_rows(float_id)
+        if rows is None:
+            return None
+        return {name: self.columns[name][rows] for name in names}
+
+    def float_casts(self, float_id: str):
+        """
+        (per-cast columns, level count per cast) of a float, for spreading cast values
+        such as TIME or LATITUDE over its level rows; None for an unknown float.
+        """
+        i = self._float_index(str(float_id))
+        if i is None:
+            return None
+        casts = slice(int(self.float_profile_offsets[i]), int(self.float_profile_offsets[i + 1]))
+        counts = np.diff(self.profile_offsets[casts.start:casts.stop + 1])
+        return {name: self.columns[name][casts] for name in PROFILE_COLUMNS}, counts
@@ -141,18 +141,31 @@
 
 import pandas as pd
 import sqlalchemy
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.pool import QueuePool
 import numpy as np
+import bisect
 import re
 import os
-from langchain_chroma import Chroma
-from langchain_huggingface import HuggingFaceEmbeddings
-from langchain_groq import ChatGroq
-from langchain_core.runnables import RunnablePassthrough
-from langchain_core.output_parsers import StrOutputParser
-from langchain.prompts import ChatPromptTemplate
-from thefuzz import process
+import threading
+import time
+from query_templates import TemplateEngine
 from dotenv import load_dotenv
+from query_cache import QueryCache
+from semantic_cache import SemanticCache
+from example_learner import ExampleLearner
+from result_pages import ResultPages
+from query_log import QueryLog
+from query_guard import check_statement, ensure_limit, install_time_budget, mask_sql, review_plan, table_aliases, time_budget
+from spatial import SPATIAL_TABLE, bbox_condition, register_spatial_functions, window_condition
+from array_store import LEVEL_COLUMNS, ArrayStore, current_snapshot
+from depth_grid import GRID_TABLE, STANDARD_DEPTHS, anomalies, depth_slice, from_blobs, mean_profile, register_grid_functions
+
+try:
+    import duckdb
+except ImportError:
+    print("Warning: duckdb is not installed. Aggregate queries will run on SQLite only.")
+    duckdb = None
 
 # --- Load environment variables ---
 load_dotenv()  # Load variables from .env file
@@ -160,40 +173,254 @@ load_dotenv()  # Load variables from .env file
 # --- Configuration ---
 DB_PATH = "sqlite:///argo.db"
 CHROMA_PATH = "./chroma_db"
+PARQUET_PATH = "./argo_parquet"  # Columnar sidecar written by `main.py --parquet`
+ARRAY_STORE_PATH = "./argo_arrays"  # Memory-mapped measurements written by `main.py --arrays`
+PROFILE_COLUMNS = "float_id, PRES, TEMP, PSAL, LATITUDE, LONGITUDE, TIME, profile_id"
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "8"))  # Connections kept open for request threads
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "8"))  # Extra connections allowed under bursts
+# Read-heavy serving: WAL lets ingestion write while we read, mmap and a large
+# page cache avoid syscalls, and query_only rejects any write the LLM might generate.
+SQLITE_PRAGMAS = {
+    "journal_mode": "WAL",
+    "mmap_size": 268435456,
+    "cache_size": -65536,
+    "temp_store": "MEMORY",
+    "busy_timeout": 5000,
+    "query_only": "ON",
+}
+RESULT_CACHE_MAX_BYTES = int(os.getenv("RESULT_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+RESULT_CACHE_SPILL_DIR = os.getenv("RESULT_CACHE_SPILL_DIR")  # Unset = memory only
+RESULT_CACHE_MAX_SPILL_BYTES = int(os.getenv("RESULT_CACHE_MAX_SPILL_BYTES", str(1024 * 1024 * 1024)))
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.92"))  # Min cosine similarity to reuse SQL
+SEMANTIC_CACHE_CAPACITY = int(os.getenv("SEMANTIC_CACHE_CAPACITY", "5000"))
+LEARNED_EXAMPLES_MAX = int(os.getenv("LEARNED_EXAMPLES_MAX", "2000"))  # Few-shot examples learned from traffic; 0 disables learning
+LEARNED_EXAMPLES_HALF_LIFE_DAYS = float(os.getenv("LEARNED_EXAMPLES_HALF_LIFE_DAYS", "30"))  # Recency decay used when evicting them
+TABLE_PAGE_SIZE = int(os.getenv("TABLE_PAGE_SIZE", "200"))  # Rows per page of a table result
+OPEN_RESULTS_LIMIT = int(os.getenv("OPEN_RESULTS_LIMIT", "8"))  # Paged results kept open at once; each holds a pooled connection
+OPEN_RESULTS_TTL = float(os.getenv("OPEN_RESULTS_TTL", "300"))  # Seconds an unread paged result stays open
+QUERY_TIMEOUT_SECONDS = float(os.getenv("QUERY_TIMEOUT_SECONDS", "15"))  # Wall-clock budget per SQLite statement
+QUERY_MAX_ROWS = int(os.getenv("QUERY_MAX_ROWS", "50000"))  # LIMIT forced onto generated SQL
+FLOAT_SEARCH_LIMIT = int(os.getenv("FLOAT_SEARCH_LIMIT", "50"))  # Float IDs offered per dropdown search
+COMPARISON_CHUNK_SIZE = 500  # Float IDs bound per comparison query (SQLite caps bound parameters)
+QUERY_LOG_PATH = os.getenv("QUERY_LOG_PATH", "./query_log.jsonl")  # Executed SQL for add_indexed.py; empty disables
 MODEL_NAME = "openai/gpt-oss-20b"
-SCHEMA = """
+SCHEMA = f"""
 Table: profiles
 Columns:
 - float_id (text), PRES (float), TEMP (float), PSAL (float),
 - LATITUDE (float), LONGITUDE (float), TIME (datetime), profile_id (integer)
+
+Summary tables, one row per float or per profile (much faster than aggregating profiles):
+Table: float_summary
+Columns:
+- float_key (integer), float_id (text), profile_count (integer), level_count (integer),
+- first_time (datetime), last_time (datetime), LATITUDE (float), LONGITUDE (float) -- latest position
+Table: profile_summary
+Columns:
+- profile_key (integer), level_count (integer), min_pres (float), max_pres (float),
+- mean_temp (float), min_temp (float), max_temp (float), mean_psal (float), min_psal (float), max_psal (float)
+
+For the average temperature or salinity at a given depth, use the standard-depth grid instead of filtering PRES:
+Table: {GRID_TABLE} (one row per profile)
+Columns:
+- profile_key (integer), TEMP (blob), PSAL (blob)
+Aggregate: grid_avg(TEMP or PSAL, depth) returns the mean at that depth in dbar, e.g. `SELECT grid_avg(g.TEMP, 1000) FROM {GRID_TABLE} g`.
+
+For questions about a region or about distance, use the spatial index instead of filtering profiles by LATITUDE/LONGITUDE:
+Table: {SPATIAL_TABLE} (R*Tree, one row per profile)
+Columns:
+- profile_key (integer), min_lat (float), max_lat (float), min_lon (float), max_lon (float)
+Table: profile_headers
+Columns:
+- profile_key (integer), float_key (integer), profile_id (integer), TIME (datetime), LATITUDE (float), LONGITUDE (float)
+Table: floats
+Columns:
+- float_key (integer), float_id (text)
+Table: measurements
+Columns:
+- profile_key (integer), PRES (float), TEMP (float), PSAL (float)
+Join them on profile_key and float_key, and filter a region with
+`p.max_lat >= lat_min AND p.min_lat <= lat_max AND p.max_lon >= lon_min AND p.min_lon <= lon_max` on {SPATIAL_TABLE} p.
+Function: haversine_km(lat1, lon1, lat2, lon2) returns the distance in kilometres between two points.
 """
 
+# --- Database Engine ---
+# One long-lived engine per process. QueuePool hands each request thread an
+# already-open connection instead of building an engine and connecting per call.
+engine = create_engine(
+    DB_PATH,
+    poolclass=QueuePool,
+    pool_size=DB_POOL_SIZE,
+    max_overflow=DB_MAX_OVERFLOW,
+    pool_use_lifo=True,
+    # Template queries keep the same SQL text, so each connection's statement cache reuses their plans.
+    connect_args={"check_same_thread": False, "cached_statements": 256},
+)
+
+@event.listens_for(engine, "connect")
+def apply_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    for pragma, value in SQLITE_PRAGMAS.items():
+        try:
+            cursor.execute(f"PRAGMA {pragma} = {value}")
+        except Exception as e:
+            print(f"⚠️ Could not set PRAGMA {pragma}: {e}")
+    cursor.close()
+    # Lets time_budget() interrupt a runaway statement on this connection.
+    install_time_budget(dbapi_connection)
+    register_spatial_functions(dbapi_connection)
+    register_grid_functions(dbapi_connection)
+
+# --- Paged Table Results ---
+result_pages = ResultPages(max_open=OPEN_RESULTS_LIMIT, ttl=OPEN_RESULTS_TTL)
+
+# --- Workload Log (read by add_indexed.py) ---
+query_log = QueryLog(QUERY_LOG_PATH) if QUERY_LOG_PATH else None
+
+def record_query(query, params, source, started=None):
+    if query_log is not None:
+        query_log.record(query, params, time.perf_counter() - started if started is not None else None, source)
+
+# --- Query Result Cache ---
+result_cache = QueryCache(RESULT_CACHE_MAX_BYTES, RESULT_CACHE_SPILL_DIR, RESULT_CACHE_MAX_SPILL_BYTES)
+
 # --- 1. PRE-DEFINED, GUARANTEED-TO-WORK QUERIES ---
+# Placeholders in a question ({floatid}, {depth}, {depthrange}, {daterange}, {bbox}, {point})
+# are filled from the user's question and bound as named SQL parameters.
+# Region and distance questions go through the R*Tree spatial index instead of scanning profiles.
+_IN_BBOX = bbox_condition('p')
+_NEAR_POINT = window_condition('p') # Also searches the part of the window across ±180°
+# Per-float level queries read casts in time order, levels in order: the same rows, in the same
+# order, as the array store's slices, so both paths return (and cache) identical results.
+_FLOAT_LEVELS = "FROM floats f JOIN profile_headers h ON h.float_key = f.float_key JOIN measurements m ON m.profile_key = h.profile_key"
+_FLOAT_LEVEL_ORDER = "ORDER BY h.TIME, h.profile_key, m.level"
 PREDEFINED_QUERIES = {
-    "plot all float locations": "SELECT float_id, LATITUDE, LONGITUDE FROM profiles GROUP BY float_id;",
-    "how many unique floats are there": "SELECT COUNT(DISTINCT float_id) as unique_floats FROM profiles;",
-    "what is the average temperature": "SELECT AVG(TEMP) as average_temperature FROM profiles;",
+    # Per-float and per-cast questions read the summary tables maintained by main.py.
+    "plot all float locations": "SELECT float_id, LATITUDE, LONGITUDE FROM float_summary;",
+    "how many unique floats are there": "SELECT COUNT(*) as unique_floats FROM float_summary;",
+    "what is the average temperature": "SELECT SUM(mean_temp * level_count) / SUM(level_count) as average_temperature FROM profile_summary;",
     "show me the five deepest measurements": "SELECT * FROM profiles ORDER BY PRES DESC LIMIT 5;",
-    "show temperature and salinity profiles deeper than 1000 dbar": "SELECT PRES, TEMP, PSAL FROM profiles WHERE PRES > 1000 LIMIT 500;",
-    "where is float 1900085": "SELECT float_id, LATITUDE, LONGITUDE FROM profiles WHERE float_id = '1900085' GROUP BY float_id;",
-    "list all data for float 1900085": "SELECT * FROM profiles WHERE float_id = '1900085' LIMIT 500;",
-    "what is the maximum salinity": "SELECT MAX(PSAL) as max_salinity FROM profiles;",
-    "what were the coordinates for the shallowest measurement": "SELECT LATITUDE, LONGITUDE, PRES FROM profiles ORDER BY PRES ASC LIMIT 1;"
+    "show temperature and salinity profiles deeper than {depth}": "SELECT PRES, TEMP, PSAL FROM profiles WHERE PRES > :depth LIMIT 500;",
+    "show temperature and salinity profiles shallower than {depth}": "SELECT PRES, TEMP, PSAL FROM profiles WHERE PRES < :depth LIMIT 500;",
+    "show temperature and salinity profiles {depthrange}": "SELECT PRES, TEMP, PSAL FROM profiles WHERE PRES BETWEEN :depth_min AND :depth_max LIMIT 500;",
+    "where is float {floatid}": "SELECT float_id, LATITUDE, LONGITUDE FROM float_summary WHERE float_id = :float_id;",
+    "list all data for float {floatid}": f"SELECT f.float_id, m.PRES, m.TEMP, m.PSAL, h.LATITUDE, h.LONGITUDE, h.TIME, h.profile_id {_FLOAT_LEVELS} WHERE f.float_id = :float_id {_FLOAT_LEVEL_ORDER} LIMIT 500;",
+    "show the profile of float {floatid}": f"SELECT m.PRES, m.TEMP, m.PSAL {_FLOAT_LEVELS} WHERE f.float_id = :float_id {_FLOAT_LEVEL_ORDER} LIMIT 500;",
+    "show the profile of float {floatid} deeper than {depth}": f"SELECT m.PRES, m.TEMP, m.PSAL {_FLOAT_LEVELS} WHERE f.float_id = :float_id AND m.PRES > :depth {_FLOAT_LEVEL_ORDER} LIMIT 500;",
+    "what is the average temperature of float {floatid}": "SELECT SUM(s.mean_temp * s.level_count) / SUM(s.level_count) as average_temperature FROM float_summary fs JOIN profile_headers h ON h.float_key = fs.float_key JOIN profile_summary s ON s.profile_key = h.profile_key WHERE fs.float_id = :float_id;",
+    "what is the average temperature deeper than {depth}": "SELECT AVG(TEMP) as average_temperature FROM profiles WHERE PRES > :depth;",
+    "what is the average temperature {daterange}": "SELECT AVG(TEMP) as average_temperature FROM profiles WHERE TIME >= :start_date AND TIME < :end_date;",
+    "what is the average temperature in {bbox}": f"SELECT AVG(m.TEMP) as average_temperature FROM {SPATIAL_TABLE} p JOIN measurements m ON m.profile_key = p.profile_key WHERE {_IN_BBOX};",
+    # Depth-slice averages reduce the standard-depth grid (one blob per cast) instead of scanning raw levels.
+    "what is the average temperature at {depth}": f"SELECT grid_avg(TEMP, :depth) as average_temperature FROM {GRID_TABLE};",
+    "what is the average salinity at {depth}": f"SELECT grid_avg(PSAL, :depth) as average_salinity FROM {GRID_TABLE};",
+    "what is the average temperature at {depth} {daterange}": f"SELECT grid_avg(g.TEMP, :depth) as average_temperature FROM {GRID_TABLE} g JOIN profile_headers h ON h.profile_key = g.profile_key WHERE h.TIME >= :start_date AND h.TIME < :end_date;",
+    "what is the average temperature at {depth} in {bbox}": f"SELECT grid_avg(g.TEMP, :depth) as average_temperature FROM {SPATIAL_TABLE} p JOIN {GRID_TABLE} g ON g.profile_key = p.profile_key WHERE {_IN_BBOX};",
+    "what is the maximum salinity": "SELECT MAX(max_psal) as max_salinity FROM profile_summary;",
+    "what were the coordinates for the shallowest measurement": "SELECT h.LATITUDE, h.LONGITUDE, s.min_pres as PRES FROM profile_summary s JOIN profile_headers h ON h.profile_key = s.profile_key ORDER BY s.min_pres ASC LIMIT 1;",
+    "show measurements {daterange}": "SELECT * FROM profiles WHERE TIME >= :start_date AND TIME < :end_date LIMIT 500;",
+    # Each float's latest cast in the range, picked the way float_summary picks its latest position.
+    "plot float locations {daterange}": "SELECT f.float_id, h.LATITUDE, h.LONGITUDE FROM floats f JOIN profile_headers h ON h.profile_key = (SELECT l.profile_key FROM profile_headers l JOIN profile_summary s ON s.profile_key = l.profile_key WHERE l.float_key = f.float_key AND l.TIME >= :start_date AND l.TIME < :end_date ORDER BY l.TIME DESC, l.profile_id DESC LIMIT 1) ORDER BY f.float_id;",
+    "plot float locations in {bbox}": f"SELECT float_id, LATITUDE, LONGITUDE FROM (SELECT f.float_id, h.LATITUDE, h.LONGITUDE, ROW_NUMBER() OVER (PARTITION BY h.float_key ORDER BY h.TIME DESC, h.profile_id DESC) AS recency FROM {SPATIAL_TABLE} p JOIN profile_headers h ON h.profile_key = p.profile_key JOIN floats f ON f.float_key = h.float_key WHERE {_IN_BBOX}) WHERE recency = 1 ORDER BY float_id;",
+    "how many floats are in {bbox}": f"SELECT COUNT(DISTINCT h.float_key) as unique_floats FROM {SPATIAL_TABLE} p JOIN profile_headers h ON h.profile_key = p.profile_key WHERE {_IN_BBOX};",
+    # {point} binds a search window around the point, so only nearby casts are measured; MIN() makes
+    # SQLite report each float's closest position.
+    "which floats are nearest to {point}": f"SELECT f.float_id, h.LATITUDE, h.LONGITUDE, MIN(haversine_km(:lat, :lon, h.LATITUDE, h.LONGITUDE)) as distance_km FROM {SPATIAL_TABLE} p JOIN profile_headers h ON h.profile_key = p.profile_key JOIN floats f ON f.float_key = h.float_key WHERE {_NEAR_POINT} GROUP BY f.float_id ORDER BY distance_km LIMIT 10;",
+    "show profiles near {point}": f"SELECT f.float_id, h.profile_id, h.TIME, h.LATITUDE, h.LONGITUDE, haversine_km(:lat, :lon, h.LATITUDE, h.LONGITUDE) as distance_km FROM {SPATIAL_TABLE} p JOIN profile_headers h ON h.profile_key = p.profile_key JOIN floats f ON f.float_key = h.float_key WHERE {_NEAR_POINT} ORDER BY distance_km LIMIT 50;",
 }
-
-# --- Load API Key ---
-groq_api_key = os.getenv("GROQ_API_KEY")
-if not groq_api_key:
-    raise ValueError("GROQ_API_KEY environment variable not set!")
-
-# --- Pre-load all AI components (for fallback) ---
-print("➡️ Initializing AI models for fallback...")
-llm = ChatGroq(groq_api_key=groq_api_key, model_name=MODEL_NAME, temperature=0)
-embedding_function = HuggingFaceEmbeddings(model_name="all-MiniLM-L6-v2")
-vectorstore = Chroma(persist_directory=CHROMA_PATH, embedding_function=embedding_function)
-# --- THIS IS THE FIX ---
-retriever = vectorstore.as_retriever(search_kwargs={"k": 3})
-# -----------------------
+# Other common phrasings of the spatial questions, answered by the same SQL.
+_TEMPLATE_ALIASES = {
+    "nearest float to {point}": "which floats are nearest to {point}",
+    "floats near {point}": "which floats are nearest to {point}",
+    "floats near {bbox}": "plot float locations in {bbox}",
+    "what is the average temperature between {bbox}": "what is the average temperature in {bbox}",
+}
+PREDEFINED_QUERIES.update({alias: PREDEFINED_QUERIES[template] for alias, template in _TEMPLATE_ALIASES.items()})
+template_engine = TemplateEngine(PREDEFINED_QUERIES)
+
+# --- Lazily-initialized AI components (for fallback) ---
+# Nothing below is built at import time: pure-SQL callers (the dashboards, pre-defined
+# queries) never pay for the LLM client, the embedding model or the Chroma store.
+# The LangChain imports live inside the factories for the same reason.
+_components = {}
+_components_lock = threading.RLock()
+
+def _get_component(name, factory):
+    """Builds a component once, on first use; concurrent first callers wait for the same instance."""
+    component = _components.get(name)
+    if component is None:
+        with _components_lock:
+            component = _components.get(name)
+            if component is None:
+                print(f"➡️ Initializing {name}...")
+                component = factory()
+                _components[name] = component
+                print(f"✅ {name} initialized.")
+    return component
+
+def _create_llm():
+    from langchain_groq import ChatGroq
+    groq_api_key = os.getenv("GROQ_API_KEY")
+    if not groq_api_key:
+        raise ValueError("GROQ_API_KEY environment variable not set!")
+    return ChatGroq(groq_api_key=groq_api_key, model_name=MODEL_NAME, temperature=0)
+
+def _create_embedding_function():
+    from langchain_huggingface import HuggingFaceEmbeddings
+    return HuggingFaceEmbeddings(model_name="all-MiniLM-L6-v2")
+
+def _create_retriever():
+    from langchain_chroma import Chroma
+    from vector_db import COLLECTION_NAME
+    vectorstore = Chroma(collection_name=COLLECTION_NAME, persist_directory=CHROMA_PATH, embedding_function=get_embedding_function())
+    return vectorstore.as_retriever(search_kwargs={"k": 3})
+
+def _create_example_learner():
+    def get_collection():
+        import chromadb
+        from vector_db import COLLECTION_NAME
+        return chromadb.PersistentClient(path=CHROMA_PATH).get_or_create_collection(COLLECTION_NAME, embedding_function=None)
+    # The embedding model is only loaded by the learner's own thread, on its first batch.
+    return ExampleLearner(get_collection, lambda texts: get_embedding_function().embed_documents(texts),
+                          LEARNED_EXAMPLES_MAX, LEARNED_EXAMPLES_HALF_LIFE_DAYS)
+
+def _create_semantic_cache():
+    return SemanticCache(get_embedding_function().embed_query, SEMANTIC_CACHE_THRESHOLD, SEMANTIC_CACHE_CAPACITY)
+
+def get_llm():
+    return _get_component("LLM", _create_llm)
+
+def get_embedding_function():
+    return _get_component("embedding model", _create_embedding_function)
+
+def get_retriever():
+    return _get_component("retriever", _create_retriever)
+
+def get_semantic_cache():
+    return _get_component("semantic cache", _create_semantic_cache)
+
+def get_example_learner():
+    return _get_component("example learner", _create_example_learner)
+
+def get_sql_chain():
+    return _get_component("SQL chain", _create_sql_chain)
+
+def warm_up(background: bool = False):
+    """
+    Builds every AI component ahead of the first question. With background=True this
+    runs in a daemon thread so the server starts accepting pure-SQL requests immediately.
+    """
+    def build_all():
+        try:
+            get_sql_chain()
+            get_semantic_cache()
+        except Exception as e:
+            print(f"⚠️ Warm-up failed: {e}")
+
+    if background:
+        threading.Thread(target=build_all, name="backend-warm-up", daemon=True).start()
+    else:
+        build_all()
 
 # --- AI Chain (Now only used as a fallback) ---
 sql_prompt_template = """
@@ -207,7 +434,6 @@ Return ONLY the SQL query and nothing else.
 Question: {question}
 SQL Query:
 """
-sql_prompt = ChatPromptTemplate.from_template(sql_prompt_template)
 
 def format_retrieved_docs(docs):
     return "\n\n".join(f"Question: {doc.page_content}\nSQL Query: {doc.metadata['sql_query']}" for doc in docs)
@@ -218,33 +444,45 @@ def clean_sql_query(query: str):
         cleaned_query += ';'
     return cleaned_query
 
-sql_chain = (
-    RunnablePassthrough.assign(examples=lambda x: format_retrieved_docs(retriever.get_relevant_documents(x["question"])))
-    | sql_prompt | llm | StrOutputParser() | clean_sql_query
-)
-print("✅ AI models initialized.")
+def _create_sql_chain():
+    from langchain_core.runnables import RunnablePassthrough
+    from langchain_core.output_parsers import StrOutputParser
+    from langchain.prompts import ChatPromptTemplate
+    retriever = get_retriever()
+    sql_prompt = ChatPromptTemplate.from_template(sql_prompt_template)
+    return (
+        RunnablePassthrough.assign(examples=lambda x: format_retrieved_docs(retriever.get_relevant_documents(x["question"])))
+        | sql_prompt | get_llm() | StrOutputParser() | clean_sql_query
+    )
 
 # --- Main Backend Functions ---
-def get_sql_query(user_question: str) -> str:
+def get_sql_query(user_question: str):
     """
     NEW HYBRID LOGIC:
-    1. Tries to find a matching pre-defined query.
-    2. If no good match, falls back to the AI.
+    1. Tries to find a matching pre-defined query, filling its parameters from the question.
+    2. Reuses SQL from a semantically similar question answered before.
+    3. If neither matches, falls back to the AI.
+    Returns (sql_query, params); params is empty unless a parameterized template matched.
     """
     # Sanitize user input
     question = user_question.lower().strip()
 
-    # Use fuzzy matching to find the best pre-defined question
-    best_match, score = process.extractOne(question, PREDEFINED_QUERIES.keys())
+    # Use the indexed fuzzy matcher to find the best pre-defined question
+    match = template_engine.resolve(question, score_cutoff=80)
 
     # If the match is good enough (score > 80), use the guaranteed query.
-    if score > 80:
-        print(f"➡️ Found pre-defined match with score {score}: '{best_match}'")
-        return PREDEFINED_QUERIES[best_match]
+    if match and match[3] > 80:
+        best_match, query, params, score = match
+        print(f"➡️ Found pre-defined match with score {score}: '{best_match}' {params}")
+        return query, params
+
+    cached_query = get_semantic_cache().lookup(question)
+    if cached_query:
+        return guard_query(cached_query), {}
     
     # Otherwise, fall back to the AI
     print("➡️ No pre-defined match found. Falling back to AI model...")
-    query = sql_chain.invoke({"question": question, "schema": SCHEMA})
+    query = get_sql_chain().invoke({"question": question, "schema": SCHEMA})
     
     # Final safety checks on the AI's output
     if "union" in query.lower():
@@ -252,31 +490,288 @@ def get_sql_query(user_question: str) -> str:
     if not query or query.strip() == ';':
         raise ValueError("I could not understand your question. Please try rephrasing it.")
         
+    return guard_query(query), {}
+
+_view_definitions = None
+
+def guard_query(query: str, params: dict = None) -> str:
+    """
+    Pre-execution checks for generated SQL: a single SELECT only, a LIMIT of at most
+    QUERY_MAX_ROWS, and an EXPLAIN QUERY PLAN review that rejects nested full scans of
+    large tables (QueryRejected) and logs other full scans and missing indexes.
+    Returns the query, rewritten with a LIMIT if needed.
+    """
+    global _view_definitions
+    check_statement(query)
+    query = ensure_limit(query, QUERY_MAX_ROWS)
+
+    connection = engine.raw_connection()
+    try:
+        cursor = connection.cursor()
+        if _view_definitions is None:
+            _view_definitions = [row[0] for row in cursor.execute("SELECT sql FROM sqlite_master WHERE type = 'view'")]
+        plan = cursor.execute(f"EXPLAIN QUERY PLAN {query}", params or {}).fetchall()
+    finally:
+        connection.close()
+
+    findings = review_plan(plan, table_aliases(query, *_view_definitions))
+    if findings:
+        print(f"⚠️ Query plan: {'; '.join(findings)}")
     return query
 
-def generate_summary(question: str, df: pd.DataFrame) -> str:
-    if df.empty: return "No data was returned, so no summary can be generated."
+def remember_query(user_question: str, sql_query: str):
+    """
+    Records SQL that executed successfully so semantically similar questions can skip the LLM,
+    and queues the pair as a few-shot example for the retriever (embedded in the background).
+    Pre-defined queries are not stored; fuzzy matching already answers those without a model call.
+    """
+    if sql_query in PREDEFINED_QUERIES.values():
+        return
+    question = user_question.lower().strip()
+    get_semantic_cache().add(question, sql_query)
+    if LEARNED_EXAMPLES_MAX > 0:
+        get_example_learner().submit(question, sql_query)
+
+def stream_summary(question: str, df: pd.DataFrame):
+    """Yields the summary of a result in chunks, as the LLM produces them."""
+    if df.empty:
+        yield "No data was returned, so no summary can be generated."
+        return
 
     if df.shape == (1, 1):
         single_value = df.iloc[0, 0]
         # Use a simple f-string for summaries of single values to avoid another AI call
-        return f"The answer to your question is: {single_value}"
-    else:
-        # For tables, we still use the AI for a nice summary
-        data_string = df.to_string(index=False, max_rows=10)
-        summary_chain = (ChatPromptTemplate.from_template(
-            'You are a helpful oceanography assistant. The user asked: "{question}". The data is:\n{data}\nProvide a brief, insightful summary.'
-        ) | llm | StrOutputParser())
-        return summary_chain.invoke({"question": question, "data": data_string})
-
-def execute_sql_query(query: str) -> pd.DataFrame:
-    engine = sqlalchemy.create_engine(DB_PATH)
+        yield f"The answer to your question is: {single_value}"
+        return
+
+    # For tables, we still use the AI for a nice summary
+    from langchain_core.output_parsers import StrOutputParser
+    from langchain.prompts import ChatPromptTemplate
+    data_string = df.to_string(index=False, max_rows=10)
+    summary_chain = (ChatPromptTemplate.from_template(
+        'You are a helpful oceanography assistant. The user asked: "{question}". The data is:\n{data}\nProvide a brief, insightful summary.'
+    ) | get_llm() | StrOutputParser())
+    yield from summary_chain.stream({"question": question, "data": data_string})
+
+def generate_summary(question: str, df: pd.DataFrame) -> str:
+    return "".join(stream_summary(question, df))
+
+# --- Memory-mapped Array Store ---
+_array_store = None
+_array_store_lock = threading.Lock()
+
+def get_array_store():
+    """
+    The array store snapshot written by `main.py --arrays`, or None when there is none
+    or it predates the latest ingestion (callers then fall back to SQLite).
+    A newer snapshot is picked up on the next call.
+    """
+    global _array_store
+    snapshot = current_snapshot(ARRAY_STORE_PATH)
+    if snapshot is None:
+        return None
+    with _array_store_lock:
+        if _array_store is None or _array_store.path != snapshot:
+            try:
+                _array_store = ArrayStore(snapshot)
+            except (OSError, ValueError) as e:
+                print(f"⚠️ Could not open the array store '{snapshot}': {e}")
+                return None
+        store = _array_store
+    return store if store.data_version == get_data_version() else None
+
+def _array_float_profile(store, params, limit=500):
+    levels = store.float_levels(params['float_id']) or {name: np.empty(0) for name in LEVEL_COLUMNS}
+    if 'depth' in params:
+        deeper = levels['PRES'] > params['depth']
+        levels = {name: values[deeper] for name, values in levels.items()}
+    # Views of the memory-mapped columns; only the rows shown are ever paged in.
+    return pd.DataFrame({name: values[:limit] for name, values in levels.items()}, copy=False)
+
+def _array_float_rows(store, params, limit=500):
+    columns = [column.strip() for column in PROFILE_COLUMNS.split(',')]
+    levels, casts = store.float_levels(params['float_id']), store.float_casts(params['float_id'])
+    if levels is None:
+        return pd.DataFrame(columns=columns)
+    cast_columns, counts = casts
+    needed = int(np.searchsorted(np.cumsum(counts), limit)) + 1
+    frame = {name: values[:limit] for name, values in levels.items()}
+    for name in ('LATITUDE', 'LONGITUDE', 'TIME', 'profile_id'):
+        frame[name] = np.repeat(cast_columns[name][:needed], counts[:needed])[:limit]
+    frame['float_id'] = np.full(len(frame['PRES']), str(params['float_id']), dtype=object)
+    return pd.DataFrame(frame, columns=columns)
+
+# Template queries answered from the array store when it is current: {template SQL: handler(store, params)}.
+ARRAY_STORE_QUERIES = {
+    PREDEFINED_QUERIES["show the profile of float {floatid}"]: _array_float_profile,
+    PREDEFINED_QUERIES["show the profile of float {floatid} deeper than {depth}"]: _array_float_profile,
+    PREDEFINED_QUERIES["list all data for float {floatid}"]: _array_float_rows,
+}
+
+_duckdb_conn = None
+_duckdb_lock = threading.Lock()
+
+def is_analytic_query(query: str) -> bool:
+    """
+    True for aggregate-style SELECTs (AVG/SUM/MIN/MAX/COUNT...) over the `profiles` view alone.
+    Queries filtering on a specific float stay on SQLite, where the index makes them point lookups.
+    """
+    lowered = query.lower()
+    tables = set(re.findall(r"\b(?:from|join)\s+([a-z_][a-z0-9_]*)", lowered))
+    if tables != {'profiles'}:
+        return False
+    if re.search(r"\bfloat_id\s*(=|in\b)", lowered):
+        return False
+    return re.search(r"\b(avg|sum|min|max|count|total|stddev)\s*\(", lowered) is not None
+
+def get_duckdb_cursor():
+    """
+    Returns a cursor on a shared in-memory DuckDB database whose `profiles` view
+    reads the Parquet sidecar. The glob is re-expanded on every query, so newly
+    ingested partitions are picked up without reconnecting.
+    """
+    global _duckdb_conn
+    with _duckdb_lock:
+        if _duckdb_conn is None:
+            conn = duckdb.connect()
+            parquet_glob = os.path.join(PARQUET_PATH, "**", "*.parquet")
+            conn.execute(f"CREATE VIEW profiles AS SELECT {PROFILE_COLUMNS} FROM read_parquet('{parquet_glob}', hive_partitioning = true)")
+            _duckdb_conn = conn
+        return _duckdb_conn.cursor()
+
+def get_data_version():
+    """Returns the data version bumped by `main.py` on every ingestion, or None for older databases."""
     try:
-        return pd.read_sql(query, engine)
+        with engine.connect() as conn:
+            return conn.exec_driver_sql("SELECT version FROM data_version WHERE id = 1").scalar()
+    except Exception:
+        return None
+
+def get_cache_stats() -> dict:
+    stats = {'query_results': result_cache.stats(), 'open_results': result_pages.stats()}
+    # Only report the semantic cache once something has used it; asking must not load the embedding model.
+    if "semantic cache" in _components:
+        stats['sql_translations'] = _components["semantic cache"].stats()
+    if "example learner" in _components:
+        stats['learned_examples'] = _components["example learner"].stats()
+    return stats
+
+_NAMED_PARAM_PATTERN = re.compile(r"(?<![:\w]):([A-Za-z_]\w*)")
+
+def to_duckdb_params(query: str) -> str:
+    """
+    Spells SQLite's `:name` parameters as DuckDB's `$name`. Matches are found in the
+    masked query, so text inside string literals ('12:30:00'), quoted identifiers and
+    comments is left untouched.
+    """
+    parts, end = [], 0
+    for match in _NAMED_PARAM_PATTERN.finditer(mask_sql(query)):
+        parts.append(query[end:match.start()] + "$" + match.group(1))
+        end = match.end()
+    return "".join(parts) + query[end:]
+
+def _uses_columnar_engine(query: str) -> bool:
+    return duckdb is not None and os.path.isdir(PARQUET_PATH) and is_analytic_query(query)
+
+def execute_sql_query(query: str, params: dict = None) -> pd.DataFrame:
+    """
+    Runs a query with optional named parameters (`:name`), serving repeated queries from the result cache.
+    The returned DataFrame may be shared with other requests, so do not modify it in place.
+    """
+    params = params or None
+    result_cache.set_version(get_data_version())
+    cached = result_cache.get(query, params)
+    if cached is not None:
+        return cached
+    return _run_and_cache(query, params)
+
+def _run_and_cache(query, params):
+    result_df = None
+    started = time.perf_counter()
+    store = get_array_store() if query in ARRAY_STORE_QUERIES else None
+    if store is not None:
+        result_df = ARRAY_STORE_QUERIES[query](store, params or {})
+        record_query(query, params, 'arrays', started)
+    elif _uses_columnar_engine(query):
+        try:
+            duckdb_query = to_duckdb_params(query) if params else query
+            result_df = get_duckdb_cursor().execute(duckdb_query, params).df()
+            record_query(query, params, 'duckdb', started)
+        except Exception as e:
+            print(f"⚠️ Columnar engine could not run the query ({e}). Falling back to SQLite.")
+
+    if result_df is None:
+        started = time.perf_counter()
+        try:
+            with time_budget(QUERY_TIMEOUT_SECONDS):
+                result_df = pd.read_sql(query, engine, params=params)
+        except Exception as e:
+            print(f"Error executing SQL query: {e}")
+            raise e
+        record_query(query, params, 'sqlite', started)
+
+    result_cache.put(query, result_df, params)
+    return result_df
+
+def _frame_rows(df: pd.DataFrame) -> list:
+    """DataFrame rows as JSON-friendly lists (NaN becomes None)."""
+    return df.astype(object).where(df.notna(), None).values.tolist()
+
+def execute_sql_paged(query: str, params: dict = None, page_size: int = TABLE_PAGE_SIZE):
+    """
+    Like execute_sql_query, but a result that will be shown as a table is not read
+    in full. Returns (DataFrame, handle): the DataFrame holds the first `page_size`
+    rows and `handle` (None when nothing is left) reads the rest via fetch_result_page,
+    straight from the open SQLite cursor. Results drawn as charts are read completely.
+    """
+    params = params or None
+    result_cache.set_version(get_data_version())
+    result_df = result_cache.get(query, params)
+    if result_df is None and (_uses_columnar_engine(query) or query in ARRAY_STORE_QUERIES):
+        result_df = _run_and_cache(query, params)
+
+    if result_df is not None:
+        if get_visualization_suggestion(result_df) != 'table' or len(result_df) <= page_size:
+            return result_df, None
+        # Already in memory (cached, columnar or array store): page through slices of it.
+        position = [page_size]
+        def fetch_slice(size):
+            rows = _frame_rows(result_df.iloc[position[0]:position[0] + size])
+            position[0] += size
+            return rows
+        return result_df.iloc[:page_size], result_pages.open(result_df.columns, fetch_slice, offset=page_size)
+
+    started = time.perf_counter()
+    connection = engine.raw_connection()
+    try:
+        with time_budget(QUERY_TIMEOUT_SECONDS):
+            cursor = connection.cursor()
+            cursor.execute(query, params or {})
+            columns = [description[0] for description in cursor.description]
+            table = get_visualization_suggestion(pd.DataFrame(columns=columns)) == 'table'
+            rows = cursor.fetchmany(page_size) if table else cursor.fetchall()
     except Exception as e:
+        connection.close()
         print(f"Error executing SQL query: {e}")
         raise e
 
+    record_query(query, params, 'sqlite', started)
+    first_page = pd.DataFrame.from_records(rows, columns=columns)
+    if not table or len(rows) < page_size:
+        connection.close()
+        result_cache.put(query, first_page, params)
+        return first_page, None
+    # The cursor stays open (holding its pooled connection) until the last page is read or the handle expires.
+    return first_page, result_pages.open(columns, cursor.fetchmany, connection.close, offset=page_size)
+
+def fetch_result_page(handle: str, page_size: int = TABLE_PAGE_SIZE) -> dict:
+    """Next page of a paged result: {'columns', 'rows', 'offset', 'done'}. Raises KeyError for unknown or expired handles."""
+    with time_budget(QUERY_TIMEOUT_SECONDS):
+        return result_pages.fetch(handle, page_size)
+
+def close_result(handle: str):
+    result_pages.close(handle)
+
 def get_visualization_suggestion(df: pd.DataFrame) -> str:
     columns = {col.lower() for col in df.columns}
     if 'latitude' in columns and 'longitude' in columns:
@@ -285,29 +780,151 @@ def get_visualization_suggestion(df: pd.DataFrame) -> str:
         return 'profile_plot'
     return 'table'
 
+# Sorted float IDs, reloaded only when ingestion bumps the data version.
+_float_ids = {'version': None, 'ids': None}
+_float_ids_lock = threading.Lock()
+
 def fetch_all_float_ids():
     """
-    Fetch all unique float IDs from the database.
+    Fetch the sorted IDs of all floats with data, from the per-float summary table.
+    The list is cached until the data version changes; do not modify it.
     """
-    engine = create_engine('sqlite:///argo.db')
-    query = "SELECT DISTINCT float_id FROM profiles"
-    df = pd.read_sql(query, engine)
-    return df['float_id'].tolist()
+    version = get_data_version()
+    with _float_ids_lock:
+        if _float_ids['ids'] is None or _float_ids['version'] != version:
+            df = pd.read_sql("SELECT float_id FROM float_summary ORDER BY float_id", engine)
+            _float_ids['ids'] = df['float_id'].tolist()
+            _float_ids['version'] = version
+        return _float_ids['ids']
+
+def search_float_ids(search: str = None, limit: int = FLOAT_SEARCH_LIMIT):
+    """
+    Up to `limit` float IDs matching what the user has typed: IDs starting with it
+    first (found by bisection), then IDs containing it elsewhere.
+    """
+    float_ids = fetch_all_float_ids()
+    search = (search or "").strip()
+    start = bisect.bisect_left(float_ids, search)
+    matches = []
+    for fid in float_ids[start:]:
+        if len(matches) >= limit or not fid.startswith(search):
+            break
+        matches.append(fid)
+    if search and len(matches) < limit:
+        for fid in float_ids:
+            if search in fid and not fid.startswith(search):
+                matches.append(fid)
+                if len(matches) >= limit:
+                    break
+    return matches
 
 def fetch_comparison_data(float_ids):
     """
     Fetch temperature, salinity, and pressure data for given float IDs.
     float_ids: List of float IDs or a single float ID.
+    Each chunk of COMPARISON_CHUNK_SIZE IDs is one query that walks the float,
+    cast and measurement keys, so no table is scanned.
     """
-    engine = create_engine('sqlite:///argo.db')
     if not isinstance(float_ids, list):
         float_ids = [float_ids]
-    placeholders = '?' * len(float_ids)
+    float_ids = list(dict.fromkeys(str(fid) for fid in float_ids))
+    frames = []
+    for start in range(0, len(float_ids), COMPARISON_CHUNK_SIZE):
+        chunk = float_ids[start:start + COMPARISON_CHUNK_SIZE]
+        query = f"""
+        SELECT f.float_id, m.PRES, m.TEMP, m.PSAL
+        FROM floats f
+        JOIN profile_headers h ON h.float_key = f.float_key
+        JOIN measurements m ON m.profile_key = h.profile_key
+        WHERE f.float_id IN ({', '.join('?' * len(chunk))})
+        """
+        frames.append(pd.read_sql(query, engine, params=tuple(chunk)))
+    if not frames:
+        return pd.DataFrame(columns=['float_id', 'PRES', 'TEMP', 'PSAL'])
+    return pd.concat(frames, ignore_index=True)
+
+def fetch_float_profiles(float_ids) -> dict:
+    """
+    Measurements of several floats grouped per float, for overlaying them:
+    {float_id: {'PRES': array, 'TEMP': array, 'PSAL': array}}, each float's levels
+    sorted by pressure. Grouping is one sort over all rows, not a mask per float.
+    Floats without data are left out. With a current array store each float is a
+    memory-mapped slice, so no SQL runs at all.
+    """
+    store = get_array_store()
+    if store is not None:
+        profiles = {}
+        for float_id in dict.fromkeys(str(fid) for fid in (float_ids if isinstance(float_ids, list) else [float_ids])):
+            levels = store.float_levels(float_id)
+            if levels is not None and len(levels['PRES']):
+                order = np.argsort(levels['PRES'], kind='stable')
+                profiles[float_id] = {name: values[order] for name, values in levels.items()}
+        return profiles
+
+    df = fetch_comparison_data(float_ids)
+    if df.empty:
+        return {}
+    codes, names = pd.factorize(df['float_id'])
+    columns = {name: df[name].to_numpy(dtype=np.float64) for name in ('PRES', 'TEMP', 'PSAL')}
+    order = np.lexsort((columns['PRES'], codes))
+    bounds = np.flatnonzero(np.diff(codes[order])) + 1
+    groups = np.split(order, bounds)
+    return {
+        names[codes[rows[0]]]: {name: values[rows] for name, values in columns.items()}
+        for rows in groups
+    }
+
+# --- Standard-Depth Grid ---
+def load_depth_grid(variable: str = 'TEMP', float_ids=None, start_date: str = None, end_date: str = None):
+    """
+    Gridded casts matching the filters, as (casts DataFrame with float_id, profile_id,
+    TIME, LATITUDE and LONGITUDE, float array of shape (casts, len(STANDARD_DEPTHS))).
+    """
+    if variable not in ('TEMP', 'PSAL'):
+        raise ValueError(f"Unknown grid variable: {variable}")
+    conditions, params = [], {}
+    if float_ids:
+        names = [f"fid{i}" for i in range(len(float_ids))]
+        conditions.append(f"f.float_id IN ({', '.join(':' + name for name in names)})")
+        params.update(zip(names, map(str, float_ids)))
+    if start_date:
+        conditions.append("h.TIME >= :start_date")
+        params['start_date'] = start_date
+    if end_date:
+        conditions.append("h.TIME < :end_date")
+        params['end_date'] = end_date
     query = f"""
-    SELECT float_id, PRES AS PRES, TEMP AS TEMP, PSAL AS PSAL
-    FROM profiles
-    WHERE float_id IN ({placeholders})
+        SELECT f.float_id, h.profile_id, h.TIME, h.LATITUDE, h.LONGITUDE, g.{variable} AS grid
+        FROM {GRID_TABLE} g
+        JOIN profile_headers h ON h.profile_key = g.profile_key
+        JOIN floats f ON f.float_key = h.float_key
+        {'WHERE ' + ' AND '.join(conditions) if conditions else ''}
+    """
+    with time_budget(QUERY_TIMEOUT_SECONDS):
+        df = pd.read_sql(sqlalchemy.text(query), engine, params=params)
+    grid = from_blobs(df.pop('grid'))
+    return df, grid
+
+def grid_depth_slice(depth: float, variable: str = 'TEMP', **filters) -> pd.DataFrame:
+    """One row per cast with its `variable` value at `depth` dbar; casts that do not reach it are dropped."""
+    casts, grid = load_depth_grid(variable, **filters)
+    casts[variable] = depth_slice(grid, depth)
+    return casts.dropna(subset=[variable]).reset_index(drop=True)
+
+def grid_mean_profile(variable: str = 'TEMP', **filters) -> pd.DataFrame:
+    """Mean `variable` at each standard depth over the matching casts, with the number of casts behind each mean."""
+    _, grid = load_depth_grid(variable, **filters)
+    means, counts = mean_profile(grid)
+    return pd.DataFrame({'PRES': STANDARD_DEPTHS, variable: means, 'profiles': counts})
+
+def grid_anomalies(variable: str = 'TEMP', reference_filters: dict = None, **filters):
+    """
+    Each matching cast's departure from a reference mean profile, as (casts DataFrame,
+    anomaly array with one column per standard depth). The reference is the mean of the
+    casts selected by `reference_filters`, or of the matching casts themselves.
     """
-    params = tuple(float_ids)
-    df = pd.read_sql(query, engine, params=params)
-    return df
\ No newline at end of file
+    casts, grid = load_depth_grid(variable, **filters)
+    reference = None
+    if reference_filters is not None:
+        reference, _ = mean_profile(load_depth_grid(variable, **reference_filters)[1])
+    return casts, anomalies(grid, reference)
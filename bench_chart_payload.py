@@ -0,0 +1,45 @@
+import time
+import numpy as np
+import pandas as pd
+import plotly.express as px
+from chart_encoding import encode_figure
+
+# --- Configuration ---
+NUM_POINTS = 100_000 # Points in the synthetic map / profile charts
+NUM_FLOATS = 3000 # Distinct float IDs among the map points
+REPEATS = 5 # Timed encodings per format (best is reported)
+
+def make_figures():
+    rng = np.random.default_rng(0)
+    float_ids = rng.integers(1_000_000, 8_000_000, NUM_FLOATS).astype(str)
+    map_df = pd.DataFrame({
+        'float_id': float_ids[rng.integers(0, NUM_FLOATS, NUM_POINTS)],
+        'LATITUDE': rng.uniform(-60, 60, NUM_POINTS),
+        'LONGITUDE': rng.uniform(-180, 180, NUM_POINTS),
+    })
+    pres = np.tile(np.linspace(0, 2000, 1000), NUM_POINTS // 1000)
+    profile_df = pd.DataFrame({'PRES': pres, 'TEMP': 20 * np.exp(-pres / 500) + rng.normal(0, 0.1, len(pres))})
+    return {
+        'map': px.scatter_geo(map_df, lat='LATITUDE', lon='LONGITUDE', hover_name='float_id', template='plotly_dark'),
+        'profile': px.line(profile_df, x='TEMP', y='PRES', template='plotly_dark'),
+    }
+
+def best_time(fig, compact):
+    timings = []
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        payload = encode_figure(fig, compact=compact)
+        timings.append(time.perf_counter() - start)
+    return min(timings) * 1000, len(payload)
+
+def run_benchmark():
+    print(f"➡️ Benchmarking chart payload encoding ({NUM_POINTS:,} points)...\n")
+    print(f"{'chart':>8} {'json (ms)':>10} {'compact (ms)':>13} {'json (KB)':>10} {'compact (KB)':>13} {'smaller':>8}")
+    for name, fig in make_figures().items():
+        json_ms, json_size = best_time(fig, compact=False)
+        compact_ms, compact_size = best_time(fig, compact=True)
+        print(f"{name:>8} {json_ms:>10.1f} {compact_ms:>13.1f} {json_size / 1024:>10.0f} {compact_size / 1024:>13.0f} {json_size / compact_size:>7.1f}x")
+    print("\n✅ Benchmark complete.")
+
+if __name__ == '__main__':
+    run_benchmark()
@@ -0,0 +1,63 @@
+import time
+import numpy as np
+import pandas as pd
+import xarray as xr
+import main
+
+# --- Configuration ---
+PROFILE_COUNTS = [100, 500, 2000] # N_PROF sizes to benchmark
+N_LEVELS = 500 # Depth levels per profile, similar to a real _prof.nc file
+MISSING_FRACTION = 0.1 # Share of measurements set to the fill value
+REPEATS = 3 # Best-of-N timing
+
+def make_synthetic_dataset(n_prof, n_levels, seed=0):
+    """Builds an in-memory dataset with the same variables and dimensions as an ARGO _prof.nc file."""
+    rng = np.random.default_rng(seed)
+    shape = (n_prof, n_levels)
+    pres = np.sort(rng.uniform(0, 2000, shape), axis=1).astype('float32')
+    temp = (25 - pres / 100 + rng.normal(0, 0.1, shape)).astype('float32')
+    psal = (35 + rng.normal(0, 0.1, shape)).astype('float32')
+    for values in (pres, temp, psal):
+        values[rng.random(shape) < MISSING_FRACTION] = np.nan
+
+    juld = pd.Timestamp('2024-01-01') + pd.to_timedelta(rng.uniform(0, 365, n_prof), unit='D')
+    platforms = np.array([f"{1900000 + i % 50:<8d}".encode() for i in range(n_prof)], dtype='S8')
+    return xr.Dataset({
+        main.PRES_VAR: (('N_PROF', 'N_LEVELS'), pres),
+        main.TEMP_VAR: (('N_PROF', 'N_LEVELS'), temp),
+        main.SAL_VAR: (('N_PROF', 'N_LEVELS'), psal),
+        main.TIME_VAR: (('N_PROF',), juld.values),
+        main.LAT_VAR: (('N_PROF',), rng.uniform(-30, 30, n_prof)),
+        main.LON_VAR: (('N_PROF',), rng.uniform(40, 100, n_prof)),
+        main.FLOAT_ID_VAR: (('N_PROF',), platforms),
+    })
+
+def best_time(func, *args):
+    """Returns (best wall-clock seconds over REPEATS runs, last result)."""
+    best = float('inf')
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        result = func(*args)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+def flatten_to_frame(ds):
+    return pd.DataFrame(main.flatten_profiles(ds), columns=main.PROFILE_COLUMNS)
+
+def run_benchmark():
+    print(f"➡️ Benchmarking profile flattening ({N_LEVELS} levels, best of {REPEATS})...\n")
+    print(f"{'N_PROF':>8} {'rows':>10} {'merge (s)':>10} {'numpy (s)':>10} {'speedup':>8}")
+    for n_prof in PROFILE_COUNTS:
+        ds = make_synthetic_dataset(n_prof, N_LEVELS)
+        merge_seconds, merged = best_time(main.merge_profiles, ds)
+        numpy_seconds, flattened = best_time(flatten_to_frame, ds)
+
+        if len(merged) != len(flattened):
+            print(f"❌ Row count mismatch for N_PROF={n_prof}: {len(merged)} vs {len(flattened)}")
+            return
+        print(f"{n_prof:>8} {len(flattened):>10} {merge_seconds:>10.4f} {numpy_seconds:>10.4f} {merge_seconds / numpy_seconds:>7.1f}x")
+
+    print("\n✅ Benchmark complete.")
+
+if __name__ == '__main__':
+    run_benchmark()
@@ -0,0 +1,59 @@
+import random
+import time
+from thefuzz import process
+from template_matcher import TemplateMatcher
+
+# --- Configuration ---
+LIBRARY_SIZES = [10, 100, 1000, 10000, 50000] # Template library sizes to benchmark
+QUERIES_PER_SIZE = 200 # Questions timed per library size
+SCORE_CUTOFF = 80 # Same threshold get_sql_query uses
+
+VERBS = ["show", "plot", "list", "what is", "give me", "find", "display", "tell me"]
+MEASURES = ["the average temperature", "the maximum salinity", "all float locations", "the deepest measurements",
+            "the salinity profile", "the temperature profile", "the number of unique floats", "the shallowest measurement"]
+QUALIFIERS = ["", "for float {n}", "deeper than {n} dbar", "in {year}", "near the equator", "in the indian ocean",
+              "between {n} and {m} dbar", "since {year}", "for the last month", "north of {lat} degrees"]
+
+def make_template(rng):
+    qualifier = rng.choice(QUALIFIERS).format(n=rng.randint(1900000, 7900000), m=rng.randint(100, 2000),
+                                              year=rng.randint(2000, 2025), lat=rng.randint(-60, 60))
+    return " ".join(part for part in [rng.choice(VERBS), rng.choice(MEASURES), qualifier] if part)
+
+def make_question(rng, templates):
+    """A template with a small typo or word drop, like real user input."""
+    words = rng.choice(templates).split()
+    if len(words) > 3 and rng.random() < 0.5:
+        words.pop(rng.randrange(len(words)))
+    question = " ".join(words)
+    i = rng.randrange(len(question))
+    return question[:i] + question[i + 1:]
+
+def run_benchmark():
+    rng = random.Random(0)
+    print(f"➡️ Benchmarking predefined-query matching ({QUERIES_PER_SIZE} questions per size)...\n")
+    print(f"{'templates':>10} {'thefuzz (ms)':>13} {'indexed (ms)':>13} {'speedup':>8} {'agreement':>10}")
+    for size in LIBRARY_SIZES:
+        templates = list(dict.fromkeys(make_template(rng) for _ in range(size * 2)))[:size]
+        questions = [make_question(rng, templates) for _ in range(QUERIES_PER_SIZE)]
+        matcher = TemplateMatcher(templates)
+
+        start = time.perf_counter()
+        baseline = [process.extractOne(q, templates) for q in questions]
+        baseline_ms = (time.perf_counter() - start) * 1000 / len(questions)
+
+        start = time.perf_counter()
+        indexed = [matcher.match(q, score_cutoff=SCORE_CUTOFF) for q in questions]
+        indexed_ms = (time.perf_counter() - start) * 1000 / len(questions)
+
+        # Agreement: both accept the same template, or both reject the question.
+        agree = sum(
+            (b[1] > SCORE_CUTOFF) == (m is not None and m[1] > SCORE_CUTOFF)
+            and (b[1] <= SCORE_CUTOFF or b[0] == m[0] or b[1] == m[1])
+            for b, m in zip(baseline, indexed)
+        )
+        print(f"{size:>10} {baseline_ms:>13.3f} {indexed_ms:>13.3f} {baseline_ms / indexed_ms:>7.1f}x {agree / len(questions):>9.1%}")
+
+    print("\n✅ Benchmark complete.")
+
+if __name__ == '__main__':
+    run_benchmark()
@@ -0,0 +1,73 @@
+import base64
+import json
+import numpy as np
+import pandas as pd
+import plotly.utils
+
+# dtypes Plotly.js can read from a typed-array spec ({"dtype": ..., "bdata": base64}).
+_INT_DTYPES = [np.int8, np.uint8, np.int16, np.uint16, np.int32, np.uint32]
+
+def _b64(values: np.ndarray) -> str:
+    return base64.b64encode(np.ascontiguousarray(values).tobytes()).decode('ascii')
+
+def _typed_array(values: np.ndarray) -> dict:
+    """Typed-array spec for a numeric array: floats as float32, integers in the smallest dtype that fits."""
+    if values.dtype.kind in 'iu' and len(values):
+        low, high = values.min(), values.max()
+        for dtype in _INT_DTYPES:
+            if np.iinfo(dtype).min <= low and high <= np.iinfo(dtype).max:
+                values = values.astype(dtype)
+                break
+        else:
+            values = values.astype(np.float64)
+    elif values.dtype.kind in 'iub':
+        values = values.astype(np.uint8)
+    else:
+        values = values.astype(np.float32)
+    spec = {'dtype': values.dtype.str.lstrip('<>|='), 'bdata': _b64(values)}
+    if values.ndim > 1:
+        spec['shape'] = ",".join(str(n) for n in values.shape)
+    return spec
+
+def _dictionary_array(values: np.ndarray):
+    """
+    A repetitive string array (e.g. one float_id per point) as
+    {"dictionary": [distinct values], "codes": typed array of indices}, or None if it does not repeat enough.
+    """
+    if values.ndim != 1:
+        return None
+    codes, uniques = pd.factorize(values, use_na_sentinel=False)
+    if len(uniques) > len(values) // 2:
+        return None
+    return {'dictionary': [str(v) for v in uniques], 'codes': _typed_array(codes)}
+
+def _compact(node):
+    if isinstance(node, dict):
+        if 'bdata' in node and 'dtype' in node:
+            # Plotly already encoded this array; re-encode doubles as float32.
+            values = np.frombuffer(base64.b64decode(node['bdata']), dtype=node['dtype'])
+            if 'shape' in node:
+                values = values.reshape([int(n) for n in node['shape'].split(',')])
+            return _typed_array(values)
+        return {key: _compact(value) for key, value in node.items()}
+    if isinstance(node, (list, tuple)):
+        return [_compact(value) for value in node]
+    if isinstance(node, np.ndarray):
+        if node.dtype.kind in 'iufb':
+            return _typed_array(node)
+        return _dictionary_array(node) or node.tolist()
+    return node
+
+def encode_figure(fig, compact: bool = True) -> str:
+    """
+    Serializes a Plotly figure to JSON. With `compact`, trace arrays are sent as
+    base64 float32 / small-integer typed arrays, which Plotly.js reads directly,
+    and repetitive string arrays are dictionary-encoded; the dashboard's
+    decodeChart() expands those before plotting.
+    """
+    if not compact:
+        return json.dumps(fig, cls=plotly.utils.PlotlyJSONEncoder)
+    # fig.to_plotly_json() deep-copies every array; _compact builds new containers
+    # instead, so the figure's own trace dicts can be read without copying.
+    figure = {'data': [_compact(trace) for trace in fig._data], 'layout': fig.layout.to_plotly_json()}
+    return json.dumps(figure, cls=plotly.utils.PlotlyJSONEncoder, separators=(',', ':'))
@@ -0,0 +1,99 @@
+import warnings
+import numpy as np
+
+# Standard pressure levels (dbar) that every cast is interpolated onto, stored per cast
+# as float32 blobs in GRID_TABLE so cross-float questions reduce whole arrays at once.
+STANDARD_DEPTHS = np.array([
+    5, 10, 20, 30, 50, 75, 100, 125, 150, 200, 250, 300, 400, 500,
+    600, 700, 800, 900, 1000, 1100, 1200, 1300, 1400, 1500, 1750, 2000,
+], dtype=np.float64)
+GRID_TABLE = 'profile_grid'
+GRID_VARIABLES = ('TEMP', 'PSAL')
+GRID_DTYPE = np.dtype('<f4')
+
+def interpolate_profile(pres, values, depths=STANDARD_DEPTHS):
+    """
+    Linearly interpolates one cast onto `depths`. Levels outside the sampled
+    pressure range are NaN rather than extrapolated; repeated pressures keep their first value.
+    """
+    pres = np.asarray(pres, dtype=np.float64)
+    values = np.asarray(values, dtype=np.float64)
+    valid = ~(np.isnan(pres) | np.isnan(values))
+    pres, values = pres[valid], values[valid]
+    if pres.size == 0:
+        return np.full(len(depths), np.nan, dtype=GRID_DTYPE)
+    pres, first = np.unique(pres, return_index=True)
+    return np.interp(depths, pres, values[first], left=np.nan, right=np.nan).astype(GRID_DTYPE)
+
+def grid_records(df, profile_keys: dict) -> list:
+    """
+    Gridded blobs for every cast in `df` (columns profile_id, PRES and GRID_VARIABLES):
+    one {'profile_key', 'TEMP', 'PSAL'} dict per cast, keyed through `profile_keys` (profile_id -> key).
+    """
+    ids = df['profile_id'].to_numpy()
+    order = np.argsort(ids, kind='stable')
+    starts = np.flatnonzero(np.r_[True, ids[order][1:] != ids[order][:-1]])
+    pres = df['PRES'].to_numpy(dtype=np.float64)[order]
+    columns = {name: df[name].to_numpy(dtype=np.float64)[order] for name in GRID_VARIABLES}
+    records = []
+    for start, end in zip(starts, np.r_[starts[1:], len(order)]):
+        record = {'profile_key': profile_keys[ids[order[start]]]}
+        for name, values in columns.items():
+            record[name] = interpolate_profile(pres[start:end], values[start:end]).tobytes()
+        records.append(record)
+    return records
+
+def from_blobs(blobs) -> np.ndarray:
+    """Stacks stored grid blobs into a (casts, len(STANDARD_DEPTHS)) float32 array."""
+    return np.frombuffer(b"".join(blobs), dtype=GRID_DTYPE).reshape(-1, len(STANDARD_DEPTHS))
+
+def depth_slice(grid: np.ndarray, depth: float) -> np.ndarray:
+    """Every cast's value at `depth`, interpolated between the neighbouring standard levels (NaN off the grid)."""
+    if not STANDARD_DEPTHS[0] <= depth <= STANDARD_DEPTHS[-1]:
+        return np.full(len(grid), np.nan)
+    upper = min(int(np.searchsorted(STANDARD_DEPTHS, depth)), len(STANDARD_DEPTHS) - 1)
+    lower = max(upper - 1, 0)
+    if STANDARD_DEPTHS[upper] == depth or upper == lower:
+        return grid[:, upper].astype(np.float64)
+    weight = (depth - STANDARD_DEPTHS[lower]) / (STANDARD_DEPTHS[upper] - STANDARD_DEPTHS[lower])
+    return grid[:, lower] * (1 - weight) + grid[:, upper] * weight
+
+def mean_profile(grid: np.ndarray):
+    """Mean value and number of contributing casts at each standard depth."""
+    counts = np.count_nonzero(~np.isnan(grid), axis=0)
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)  # Levels no cast reaches average to NaN
+        means = np.nanmean(grid, axis=0, dtype=np.float64)
+    return means, counts
+
+def anomalies(grid: np.ndarray, reference=None) -> np.ndarray:
+    """Each cast minus `reference` (default: the mean profile of `grid`), level by level."""
+    if reference is None:
+        reference, _ = mean_profile(grid)
+    return grid - np.asarray(reference, dtype=np.float64)
+
+class GridAverage:
+    """
+    SQLite aggregate grid_avg(blob, depth): mean value at `depth` over the grouped casts.
+    Blobs are only collected per row; the reduction runs once, vectorized, at the end.
+    """
+
+    def __init__(self):
+        self.blobs = []
+        self.depth = None
+
+    def step(self, blob, depth):
+        if blob is not None and depth is not None:
+            self.blobs.append(blob)
+            self.depth = float(depth)
+
+    def finalize(self):
+        if not self.blobs:
+            return None
+        values = depth_slice(from_blobs(self.blobs), self.depth)
+        values = values[~np.isnan(values)]
+        return float(values.mean()) if values.size else None
+
+def register_grid_functions(dbapi_connection):
+    """Makes grid_avg(blob, depth) available to SQL on a sqlite3 connection."""
+    dbapi_connection.create_aggregate('grid_avg', 2, GridAverage)
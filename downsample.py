@@ -0,0 +1,97 @@
+import numpy as np
+import pandas as pd
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, n_out: int) -> np.ndarray:
+    """
+    Largest-Triangle-Three-Buckets: indices of `n_out` points that keep the visual
+    shape of the polyline (x[i], y[i]) in its given order. The first and last points
+    are always kept; from each bucket in between, the point forming the largest
+    triangle with the previously kept point and the next bucket's mean is kept.
+    """
+    n = len(x)
+    if n_out >= n:
+        return np.arange(n)
+    if n_out < 3:
+        return np.array([0, n - 1])[:max(n_out, 0)]
+
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    keep = np.empty(n_out, dtype=np.int64)
+    keep[0], keep[-1] = 0, n - 1
+    a = 0
+    for i in range(n_out - 2):
+        start, end = edges[i], edges[i + 1]
+        next_end = edges[i + 2] if i + 2 < len(edges) else n
+        mean_x = x[end:next_end].mean()
+        mean_y = y[end:next_end].mean()
+        areas = np.abs((x[a] - mean_x) * (y[start:end] - y[a]) - (x[a] - x[start:end]) * (mean_y - y[a]))
+        a = start + int(np.argmax(areas))
+        keep[i + 1] = a
+    return keep
+
+def downsample_profile(df: pd.DataFrame, value_col: str, depth_col: str = 'PRES', budget: int = 2000) -> pd.DataFrame:
+    """Reduces a depth-profile result to at most `budget` rows with LTTB, keeping row order."""
+    if len(df) <= budget:
+        return df
+    finite = df[np.isfinite(df[depth_col].to_numpy(dtype=float)) & np.isfinite(df[value_col].to_numpy(dtype=float))]
+    keep = lttb_indices(finite[depth_col].to_numpy(dtype=float), finite[value_col].to_numpy(dtype=float), budget)
+    return finite.iloc[keep]
+
+def _occupied_cells(lat, lon, cell):
+    """First row index and row count of every occupied cell of a `cell`-degree grid, in row order."""
+    rows = np.floor((lat - lat.min()) / cell).astype(np.int64)
+    cols = np.floor((lon - lon.min()) / cell).astype(np.int64)
+    codes, _ = pd.factorize(rows * (cols.max() + 1) + cols)
+    first = np.flatnonzero(np.r_[True, np.diff(np.maximum.accumulate(codes)) > 0])
+    return first, np.bincount(codes)
+
+def bin_map_points(df: pd.DataFrame, budget: int = 5000, lat_col: str = 'LATITUDE', lon_col: str = 'LONGITUDE',
+                   min_cell: float = 1e-6, max_steps: int = 24, fill: float = 0.95) -> pd.DataFrame:
+    """
+    Reduces a map result to at most `budget` rows by snapping points to a lat/lon grid
+    and keeping the first row in each occupied cell. Starting from the cell size that
+    would fit uniformly spread points, the size is stepped (by the same uniform-density
+    estimate, or by bisection once the budget is bracketed) until the occupied cells
+    fill `fill` of the budget, so clustered data still gets about `budget` points. A `points` column holds how many
+    rows each kept row stands for.
+    """
+    if len(df) <= budget:
+        return df
+    lat = df[lat_col].to_numpy(dtype=float)
+    lon = df[lon_col].to_numpy(dtype=float)
+    finite = np.isfinite(lat) & np.isfinite(lon)
+    df, lat, lon = df[finite], lat[finite], lon[finite]
+    if len(df) <= budget:
+        return df
+
+    # Smaller cells only split occupied cells, so (up to grid alignment) the count grows as
+    # the cell shrinks; the fullest grid seen that fits the budget is kept.
+    extent = max(np.ptp(lat), np.ptp(lon), min_cell)
+    cell = max(np.sqrt(np.ptp(lat) * np.ptp(lon) / budget), extent / budget, min_cell)
+    best, small, large = None, None, None
+    for _ in range(max_steps):
+        first, counts = _occupied_cells(lat, lon, cell)
+        if len(first) > budget:
+            small = cell
+        else:
+            large = cell
+            if best is None or len(first) > len(best[0]):
+                best = (first, counts)
+            if len(first) >= budget * fill or cell <= min_cell:
+                break
+        # Next size as if the points were spread evenly (count ~ 1 / cell^2), aiming just
+        # inside the budget; bisect instead when that guess leaves the bracket.
+        guess = cell * np.sqrt(max(len(first), 1) / (budget * (1 + fill) / 2))
+        if large is None:
+            cell = max(guess, small * 1.1)
+        elif small is None:
+            cell = max(min(guess, large / 1.1), min_cell)
+        else:
+            cell = guess if small < guess < large else np.sqrt(small * large)
+    if best is None:
+        best = _occupied_cells(lat, lon, extent * 2)
+    first, counts = best
+    binned = df.iloc[first].copy()
+    binned['points'] = counts
+    return binned
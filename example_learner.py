@@ -0,0 +1,125 @@
+import queue
+import threading
+import time
+from vector_db import example_id
+
+class ExampleLearner:
+    """
+    Grows the few-shot example collection from traffic. Question/SQL pairs that ran
+    successfully are queued by request threads and written by one background thread:
+    new pairs are embedded in batches and added with source "learned"; pairs already
+    stored get their `count` and `last_used` bumped. Once more than `max_learned`
+    learned examples exist, those with the lowest count * 0.5 ** (age / half-life),
+    age being the time since `last_used`, are deleted. Curated examples are never evicted.
+    """
+
+    def __init__(self, get_collection, embed_documents, max_learned: int = 2000, half_life_days: float = 30.0,
+                 batch_size: int = 32, queue_size: int = 1000):
+        self.get_collection = get_collection
+        self.embed_documents = embed_documents
+        self.max_learned = max_learned
+        self.half_life = half_life_days * 86400
+        self.batch_size = batch_size
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._collection = None
+        self._thread = None
+        self._lock = threading.Lock()
+        self._counters = {'queued': 0, 'dropped': 0, 'added': 0, 'reinforced': 0, 'evicted': 0, 'errors': 0}
+
+    def submit(self, question: str, query: str) -> bool:
+        """Queues a pair without blocking; returns False if the queue is full and the pair was dropped."""
+        self._start()
+        try:
+            self._queue.put_nowait((question, query, time.time()))
+        except queue.Full:
+            self._count('dropped')
+            return False
+        self._count('queued')
+        return True
+
+    def flush(self):
+        """Blocks until every queued pair has been written."""
+        self._queue.join()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {**self._counters, 'pending': self._queue.qsize(), 'max_learned': self.max_learned}
+
+    def _count(self, name, n=1):
+        with self._lock:
+            self._counters[name] += n
+
+    def _start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="example-learner", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                self._write(batch)
+            except Exception as e:
+                self._count('errors')
+                print(f"⚠️ Could not learn from {len(batch)} queries: {e}")
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    def _write(self, batch):
+        if self._collection is None:
+            self._collection = self.get_collection()
+        collection = self._collection
+
+        # The same pair may arrive several times in one batch.
+        pairs = {}
+        for question, query, seen_at in batch:
+            key = example_id(question, query)
+            entry = pairs.setdefault(key, {'question': question, 'query': query, 'count': 0,
+                                           'first_seen': seen_at, 'last_used': seen_at})
+            entry['count'] += 1
+            entry['first_seen'] = min(entry['first_seen'], seen_at)
+            entry['last_used'] = max(entry['last_used'], seen_at)
+
+        stored = collection.get(ids=list(pairs), include=['metadatas'])
+        if stored['ids']:
+            metadatas = []
+            for key, metadata in zip(stored['ids'], stored['metadatas']):
+                pair = pairs.pop(key)
+                metadata = dict(metadata or {})
+                metadata['count'] = int(metadata.get('count', 1)) + pair['count']
+                metadata['last_used'] = max(float(metadata.get('last_used', 0)), pair['last_used'])
+                metadatas.append(metadata)
+            collection.update(ids=stored['ids'], metadatas=metadatas)
+            self._count('reinforced', len(stored['ids']))
+
+        if pairs:
+            keys = list(pairs)
+            collection.add(
+                ids=keys,
+                embeddings=self.embed_documents([pairs[key]['question'] for key in keys]),
+                documents=[pairs[key]['question'] for key in keys],
+                metadatas=[{'sql_query': pairs[key]['query'], 'source': 'learned', 'count': pairs[key]['count'],
+                            'first_seen': pairs[key]['first_seen'], 'last_used': pairs[key]['last_used']} for key in keys],
+            )
+            self._count('added', len(keys))
+            self._evict(collection)
+
+    def _evict(self, collection):
+        learned = collection.get(where={'source': 'learned'}, include=['metadatas'])
+        excess = len(learned['ids']) - self.max_learned
+        if excess <= 0:
+            return
+        now = time.time()
+        def value(metadata):
+            age = max(now - float(metadata.get('last_used', now)), 0.0)
+            return int(metadata.get('count', 1)) * 0.5 ** (age / self.half_life)
+        ranked = sorted(zip(learned['ids'], learned['metadatas']), key=lambda item: value(item[1] or {}))
+        collection.delete(ids=[key for key, _ in ranked[:excess]])
+        self._count('evicted', excess)
@@ -1,91 +1,708 @@
 import xarray as xr
 import pandas as pd
-from sqlalchemy import create_engine
+import numpy as np
+from sqlalchemy import create_engine, text
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from datetime import datetime, timezone
+import argparse
+import hashlib
 import os
 import glob
+import json
+import shutil
+import uuid
+from spatial import SPATIAL_TABLE
+from depth_grid import GRID_TABLE, STANDARD_DEPTHS, grid_records
+from array_store import CURRENT_FILE, LEVEL_COLUMNS, META_FILE, current_snapshot
 
 # --- Configuration ---
 DB_FILE_PATH = 'argo.db'
 NC_FILE_PATTERN = '*.nc' # Pattern to find all NetCDF files
+NUM_WORKERS = os.cpu_count() or 1 # Processes used to decode NetCDF files
+BATCH_SIZE = 50_000 # Max rows sent to SQLite per INSERT batch
+MAX_PENDING_PER_WORKER = 2 # Decoded files allowed in flight per worker
+MANIFEST_TABLE = 'ingest_manifest' # One row per ingested NetCDF file
+HASH_CHUNK_SIZE = 1 << 20 # Bytes read at a time when hashing files
+PARQUET_DIR = 'argo_parquet' # Columnar sidecar store, partitioned by year/month
+ARRAY_STORE_DIR = 'argo_arrays' # Memory-mapped column-per-file snapshot of measurements
+ARRAY_STORE_CHUNK = 5000 # Casts read from SQLite at a time when writing the array store
+
+# --- NetCDF Variable Names ---
+TIME_VAR = 'JULD'
+LAT_VAR = 'LATITUDE'
+LON_VAR = 'LONGITUDE'
+PRES_VAR = 'PRES_ADJUSTED'
+TEMP_VAR = 'TEMP_ADJUSTED'
+SAL_VAR = 'PSAL_ADJUSTED'
+FLOAT_ID_VAR = 'PLATFORM_NUMBER'
+PROFILE_COLUMNS = ['float_id', 'PRES', 'TEMP', 'PSAL', 'LATITUDE', 'LONGITUDE', 'TIME', 'profile_id']
+
+TIME_FORMAT = '%Y-%m-%d %H:%M:%S.%f' # Text format of TIME values stored in SQLite
+
+# Normalized layout: one row per float, one per cast, and a narrow table of
+# depth levels clustered by cast. The `profiles` view keeps the original flat
+# table shape for PREDEFINED_QUERIES and LLM-generated SQL.
+SCHEMA_DDL = [
+    """
+    CREATE TABLE IF NOT EXISTS floats (
+        float_key INTEGER PRIMARY KEY,
+        float_id TEXT NOT NULL UNIQUE
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS profile_headers (
+        profile_key INTEGER PRIMARY KEY,
+        float_key INTEGER NOT NULL REFERENCES floats (float_key),
+        profile_id INTEGER NOT NULL,
+        TIME TIMESTAMP NOT NULL,
+        LATITUDE REAL NOT NULL,
+        LONGITUDE REAL NOT NULL,
+        source_file TEXT,
+        UNIQUE (float_key, profile_id, TIME)
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_headers_source_file ON profile_headers (source_file)",
+    # R*Tree of cast positions (one point box per cast) for bounding-box and nearest-float queries.
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {SPATIAL_TABLE} USING rtree(profile_key, min_lat, max_lat, min_lon, max_lon)",
+    """
+    CREATE TABLE IF NOT EXISTS measurements (
+        profile_key INTEGER NOT NULL REFERENCES profile_headers (profile_key),
+        level INTEGER NOT NULL,
+        PRES REAL NOT NULL, TEMP REAL NOT NULL, PSAL REAL NOT NULL,
+        PRIMARY KEY (profile_key, level)
+    ) WITHOUT ROWID
+    """,
+    # Rollups kept current by upsert_file_rows, so per-float and per-cast
+    # questions read one row per float or cast instead of every depth level.
+    """
+    CREATE TABLE IF NOT EXISTS profile_summary (
+        profile_key INTEGER PRIMARY KEY REFERENCES profile_headers (profile_key),
+        level_count INTEGER NOT NULL,
+        min_pres REAL, max_pres REAL,
+        mean_temp REAL, min_temp REAL, max_temp REAL,
+        mean_psal REAL, min_psal REAL, max_psal REAL
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS float_summary (
+        float_key INTEGER PRIMARY KEY REFERENCES floats (float_key),
+        float_id TEXT NOT NULL UNIQUE,
+        profile_count INTEGER NOT NULL,
+        level_count INTEGER NOT NULL,
+        first_time TIMESTAMP, last_time TIMESTAMP,
+        LATITUDE REAL, LONGITUDE REAL -- Position of the latest cast
+    )
+    """,
+    # Each cast's TEMP and PSAL interpolated onto STANDARD_DEPTHS, as float32 blobs
+    # (see depth_grid.py); standard_depths records the levels the blobs were built with.
+    f"""
+    CREATE TABLE IF NOT EXISTS {GRID_TABLE} (
+        profile_key INTEGER PRIMARY KEY REFERENCES profile_headers (profile_key),
+        TEMP BLOB, PSAL BLOB
+    )
+    """,
+    "CREATE TABLE IF NOT EXISTS standard_depths (level INTEGER PRIMARY KEY, PRES REAL NOT NULL)",
+    """
+    CREATE VIEW IF NOT EXISTS profiles AS
+    SELECT f.float_id, m.PRES, m.TEMP, m.PSAL, h.LATITUDE, h.LONGITUDE, h.TIME, h.profile_id
+    FROM measurements m
+    JOIN profile_headers h ON h.profile_key = m.profile_key
+    JOIN floats f ON f.float_key = h.float_key
+    """,
+]
+# Counter bumped whenever ingestion changes the data; readers use it to invalidate caches.
+# It is never dropped, so a full refresh can not make an old version number come back.
+DATA_VERSION_DDL = [
+    "CREATE TABLE IF NOT EXISTS data_version (id INTEGER PRIMARY KEY CHECK (id = 1), version INTEGER NOT NULL)",
+    "INSERT OR IGNORE INTO data_version (id, version) VALUES (1, 0)",
+]
+MANIFEST_DDL = f"""
+CREATE TABLE IF NOT EXISTS {MANIFEST_TABLE} (
+    path TEXT PRIMARY KEY, size INTEGER, mtime REAL, sha256 TEXT,
+    row_count INTEGER, ingested_at TEXT
+)
+"""
+
+def _valid_values(da):
+    """
+    Returns a DataArray's values with a boolean mask of usable entries.
+    xarray already turns _FillValue into NaN when decoding, but files opened
+    without mask_and_scale still carry the raw fill value, so both are masked.
+    """
+    values = da.values
+    if values.dtype.kind == 'M':
+        return values, ~np.isnat(values)
+    valid = np.isfinite(values)
+    fill_value = da.attrs.get('_FillValue')
+    if fill_value is not None:
+        valid &= values != fill_value
+    return values, valid
+
+def _decode_float_ids(values):
+    """Turns PLATFORM_NUMBER (fixed-width, space-padded bytes) into clean strings."""
+    if values.dtype.kind == 'S':
+        values = np.char.decode(values, 'ascii', errors='ignore')
+    return np.char.strip(values.astype(str))
+
+def flatten_profiles(ds):
+    """
+    Flattens the N_PROF x N_LEVELS measurement arrays of an ARGO dataset into
+    columnar arrays with one entry per valid measurement.
+    Per-profile variables (time, position, float ID) are broadcast to the levels
+    by indexing with each measurement's profile number, and rows with any missing
+    value are dropped with a single boolean mask, so no pandas merge is needed.
+    Returns a dict of NumPy arrays keyed by PROFILE_COLUMNS, plus `level`
+    (the N_LEVELS index of each measurement).
+    """
+    pres, pres_ok = _valid_values(ds[PRES_VAR])
+    temp, temp_ok = _valid_values(ds[TEMP_VAR])
+    psal, psal_ok = _valid_values(ds[SAL_VAR])
+    juld, juld_ok = _valid_values(ds[TIME_VAR])
+    lat, lat_ok = _valid_values(ds[LAT_VAR])
+    lon, lon_ok = _valid_values(ds[LON_VAR])
+
+    profile_ok = juld_ok & lat_ok & lon_ok
+    mask = pres_ok & temp_ok & psal_ok & profile_ok[:, np.newaxis]
+    profile_idx, level_idx = np.nonzero(mask)
+
+    float_ids = _decode_float_ids(ds[FLOAT_ID_VAR].values)
+    return {
+        'float_id': float_ids[profile_idx],
+        'PRES': pres[mask],
+        'TEMP': temp[mask],
+        'PSAL': psal[mask],
+        'LATITUDE': lat[profile_idx],
+        'LONGITUDE': lon[profile_idx],
+        'TIME': juld[profile_idx],
+        'profile_id': profile_idx.astype(np.int64),
+        'level': level_idx.astype(np.int64),
+    }
+
+def merge_profiles(ds):
+    """
+    The original DataFrame-based flattening (to_dataframe + merge on N_PROF + dropna).
+    Kept only as the reference implementation for bench_flatten.py.
+    """
+    df = ds[[PRES_VAR, TEMP_VAR, SAL_VAR]].to_dataframe()
+    df_meta = ds[[TIME_VAR, LAT_VAR, LON_VAR, FLOAT_ID_VAR]].to_dataframe()
+
+    df_full = pd.merge(df, df_meta, on='N_PROF', how='left')
+    df_full = df_full.reset_index()
+
+    rename_map = {
+        'N_PROF': 'profile_id',
+        PRES_VAR: 'PRES',
+        TEMP_VAR: 'TEMP',
+        SAL_VAR: 'PSAL',
+        LAT_VAR: 'LATITUDE',
+        LON_VAR: 'LONGITUDE',
+        FLOAT_ID_VAR: 'float_id',
+        TIME_VAR: 'TIME'
+    }
+    df_final = df_full.rename(columns=rename_map)
+    df_final['float_id'] = df_final['float_id'].astype(str)
+    return df_final[PROFILE_COLUMNS].dropna()
+
+def load_profile_file(nc_file):
+    """
+    Decodes a single ARGO NetCDF file into a flat DataFrame of measurements.
+    Runs inside a worker process, so it must only return picklable data.
+    Returns None if the file could not be processed, and an empty DataFrame
+    if it was readable but held no usable rows.
+    """
+    print(f"➡️ Loading NetCDF dataset from '{nc_file}'...")
+    try:
+        with xr.open_dataset(nc_file, decode_times=True) as ds:
+            df_final = pd.DataFrame(flatten_profiles(ds))
+    except Exception as e:
+        print(f"❌ Error processing {nc_file}: {e}")
+        return None
+
+    if df_final.empty:
+        print(f"⚠️ Warning: No data extracted from {nc_file}.")
+    return df_final
+
+def hash_file(path):
+    """Returns the SHA-256 hex digest of a file, read in fixed-size chunks."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def load_manifest(engine):
+    """Returns {path: manifest row} for every file already ingested."""
+    with engine.connect() as conn:
+        rows = conn.execute(text(f"SELECT path, size, mtime, sha256 FROM {MANIFEST_TABLE}")).mappings().all()
+    return {row['path']: dict(row) for row in rows}
+
+def find_changed_files(engine, nc_files):
+    """
+    Compares the files on disk against the manifest and returns
+    {path: (size, mtime, sha256)} for files that are new or whose content changed.
+    Files whose size and mtime match the manifest are skipped without hashing;
+    touched-but-identical files only get their mtime refreshed.
+    """
+    manifest = load_manifest(engine)
+    changed = {}
+    for nc_file in nc_files:
+        path = os.path.abspath(nc_file)
+        stat = os.stat(path)
+        known = manifest.get(path)
+        if known and known['size'] == stat.st_size and known['mtime'] == stat.st_mtime:
+            continue
+
+        sha256 = hash_file(path)
+        if known and known['sha256'] == sha256:
+            with engine.begin() as conn:
+                conn.execute(text(f"UPDATE {MANIFEST_TABLE} SET mtime = :mtime WHERE path = :path"),
+                             {'mtime': stat.st_mtime, 'path': path})
+            continue
+        changed[path] = (stat.st_size, stat.st_mtime, sha256)
+    return changed
+
+def upsert_file_rows(engine, path, fingerprint, df, batch_size):
+    """
+    Replaces the measurements of every cast in `df`, keyed by (float_id, profile_id, TIME),
+    and records the file in the manifest, all in one transaction.
+    Casts loaded from an earlier version of the same file are removed first, so
+    casts dropped from a changed file do not linger. New floats and casts get
+    integer keys; existing casts keep theirs. The summary rows of every cast
+    and float the file touches are recomputed, and the data version bumped, in the
+    same transaction, so no reader sees the new rows under the old version.
+    Returns {other source file: DataFrame of float_id, profile_id, TIME} for casts that
+    were stored under another file until now, so copies outside SQLite can drop them there.
+    """
+    size, mtime, sha256 = fingerprint
+    moved = {}
+    with engine.begin() as conn:
+        touched_floats = set(conn.execute(text("SELECT DISTINCT float_key FROM profile_headers WHERE source_file = :path"),
+                                          {'path': path}).scalars())
+        for table in ['measurements', 'profile_summary', GRID_TABLE, SPATIAL_TABLE]:
+            conn.execute(text(f"""
+                DELETE FROM {table} WHERE profile_key IN
+                    (SELECT profile_key FROM profile_headers WHERE source_file = :path)
+            """), {'path': path})
+        conn.execute(text("DELETE FROM profile_headers WHERE source_file = :path"), {'path': path})
+
+        if not df.empty:
+            float_ids = df['float_id'].unique()
+            conn.execute(text("INSERT OR IGNORE INTO floats (float_id) VALUES (:float_id)"),
+                         [{'float_id': fid} for fid in float_ids])
+            float_keys = dict(conn.execute(text("SELECT float_id, float_key FROM floats")).all())
+            touched_floats.update(float_keys[fid] for fid in float_ids)
+
+            headers = df.drop_duplicates('profile_id')[['float_id', 'profile_id', 'TIME', 'LATITUDE', 'LONGITUDE']].copy()
+            headers['float_key'] = headers.pop('float_id').map(float_keys)
+            headers['TIME'] = pd.to_datetime(headers['TIME']).dt.strftime(TIME_FORMAT)
+            headers['source_file'] = path
+            headers.to_sql('_incoming_headers', conn, if_exists='replace', index=False)
+            # This file's own casts were deleted above, so any match now belongs to another file.
+            rehomed = pd.read_sql(text("""
+                SELECT h.source_file, f.float_id, h.profile_id, h.TIME FROM _incoming_headers i
+                JOIN profile_headers h USING (float_key, profile_id, TIME)
+                JOIN floats f ON f.float_key = h.float_key
+            """), conn)
+            moved = {source: casts.drop(columns='source_file') for source, casts in rehomed.groupby('source_file')}
+            conn.execute(text("""
+                INSERT INTO profile_headers (float_key, profile_id, TIME, LATITUDE, LONGITUDE, source_file)
+                SELECT float_key, profile_id, TIME, LATITUDE, LONGITUDE, source_file FROM _incoming_headers WHERE true
+                ON CONFLICT (float_key, profile_id, TIME) DO UPDATE SET
+                    LATITUDE = excluded.LATITUDE, LONGITUDE = excluded.LONGITUDE, source_file = excluded.source_file
+            """))
+            profile_keys = dict(conn.execute(text("""
+                SELECT i.profile_id, h.profile_key FROM _incoming_headers i
+                JOIN profile_headers h USING (float_key, profile_id, TIME)
+            """)).all())
+            conn.execute(text("DROP TABLE _incoming_headers"))
+
+            key_list = ','.join(map(str, profile_keys.values()))
+            conn.execute(text(f"""
+                INSERT OR REPLACE INTO {SPATIAL_TABLE} (profile_key, min_lat, max_lat, min_lon, max_lon)
+                SELECT profile_key, LATITUDE, LATITUDE, LONGITUDE, LONGITUDE FROM profile_headers
+                WHERE profile_key IN ({key_list})
+            """))
+
+            conn.execute(text(f"DELETE FROM measurements WHERE profile_key IN ({key_list})"))
+            measurements = df[['profile_id', 'level', 'PRES', 'TEMP', 'PSAL']].copy()
+            measurements.insert(0, 'profile_key', measurements.pop('profile_id').map(profile_keys))
+            measurements.to_sql('measurements', conn, if_exists='append', index=False, chunksize=batch_size)
+            refresh_profile_summary(conn, profile_keys.values())
+            conn.execute(text(f"INSERT OR REPLACE INTO {GRID_TABLE} (profile_key, TEMP, PSAL) VALUES (:profile_key, :TEMP, :PSAL)"),
+                         grid_records(df, profile_keys))
+
+        refresh_float_summary(conn, touched_floats)
+
+        conn.execute(text(f"""
+            INSERT INTO {MANIFEST_TABLE} (path, size, mtime, sha256, row_count, ingested_at)
+            VALUES (:path, :size, :mtime, :sha256, :row_count, :ingested_at)
+            ON CONFLICT(path) DO UPDATE SET
+                size = excluded.size, mtime = excluded.mtime, sha256 = excluded.sha256,
+                row_count = excluded.row_count, ingested_at = excluded.ingested_at
+        """), {
+            'path': path, 'size': size, 'mtime': mtime, 'sha256': sha256,
+            'row_count': len(df), 'ingested_at': datetime.now(timezone.utc).isoformat()
+        })
+        bump_data_version(conn)
+    return moved
+
+def _parquet_part_name(path):
+    """Parquet file name used for one NetCDF file's rows inside each partition."""
+    stem = os.path.splitext(os.path.basename(path))[0]
+    return f"{stem}-{hashlib.sha1(path.encode()).hexdigest()[:12]}.parquet"
+
+def write_parquet_parts(parquet_dir, path, df):
+    """
+    Mirrors one NetCDF file's rows into the Parquet sidecar store, split into
+    Hive-style year=YYYY/month=MM partitions by TIME. Parts from an earlier
+    version of the same file are removed first.
+    """
+    part_name = _parquet_part_name(path)
+    for old_part in glob.glob(os.path.join(parquet_dir, '*', '*', part_name)):
+        os.remove(old_part)
+    if df.empty:
+        return
+
+    # Stored at the microsecond precision of TIME_FORMAT, so both stores hold the same TIME.
+    times = pd.to_datetime(df['TIME']).dt.floor('us')
+    for (year, month), part in df[PROFILE_COLUMNS].assign(TIME=times).groupby([times.dt.year, times.dt.month]):
+        partition_dir = os.path.join(parquet_dir, f"year={year}", f"month={month:02d}")
+        os.makedirs(partition_dir, exist_ok=True)
+        part.to_parquet(os.path.join(partition_dir, part_name), index=False)
+
+def remove_parquet_casts(parquet_dir, path, casts):
+    """
+    Drops the given casts (float_id, profile_id, TIME) from one NetCDF file's Parquet parts,
+    after they were re-ingested from another file. Emptied parts are deleted.
+    """
+    def identities(df):
+        # TIME is compared as SQLite stores it, so sub-microsecond JULD digits cannot split a cast.
+        return pd.MultiIndex.from_arrays([df['float_id'].astype(str), df['profile_id'].astype(np.int64),
+                                          pd.to_datetime(df['TIME']).dt.strftime(TIME_FORMAT)])
+    drop = identities(casts)
+    for part_path in glob.glob(os.path.join(parquet_dir, '*', '*', _parquet_part_name(path))):
+        part = pd.read_parquet(part_path)
+        stale = identities(part).isin(drop)
+        if not stale.any():
+            continue
+        if stale.all():
+            os.remove(part_path)
+            continue
+        part[~stale].to_parquet(part_path + ".tmp", index=False)
+        os.replace(part_path + ".tmp", part_path)
+
+def write_array_store(engine, root, chunk_size=ARRAY_STORE_CHUNK):
+    """
+    Writes a memory-mapped, column-per-file snapshot of every measurement (layout in
+    array_store.py) unless the current one already matches the data version. The new
+    snapshot is built in its own directory and published by atomically replacing CURRENT;
+    older snapshots are then deleted (readers that have them mapped keep working).
+    """
+    with engine.connect() as conn:
+        version = conn.execute(text("SELECT version FROM data_version WHERE id = 1")).scalar()
+        snapshot = current_snapshot(root)
+        if snapshot:
+            with open(os.path.join(snapshot, META_FILE), encoding='utf-8') as f:
+                if json.load(f).get('data_version') == version:
+                    return
+
+        casts = pd.read_sql(text("""
+            SELECT f.float_id, h.profile_key, h.profile_id, h.TIME, h.LATITUDE, h.LONGITUDE, s.level_count
+            FROM profile_headers h
+            JOIN profile_summary s ON s.profile_key = h.profile_key
+            JOIN floats f ON f.float_key = h.float_key
+            ORDER BY f.float_id, h.TIME, h.profile_key
+        """), conn)
+        if casts.empty:
+            print("⚠️ Warning: No measurements to write to the array store.")
+            return
+
+        name = f"v{version}-{uuid.uuid4().hex[:8]}"
+        building = os.path.join(root, name + ".tmp")
+        os.makedirs(building)
+        profile_offsets = np.concatenate([[0], np.cumsum(casts['level_count'].to_numpy(dtype=np.int64))])
+        levels = {column: np.lib.format.open_memmap(os.path.join(building, f"{column}.npy"), mode='w+',
+                                                    dtype=np.float64, shape=(int(profile_offsets[-1]),))
+                  for column in LEVEL_COLUMNS}
+        profile_keys = casts['profile_key'].to_numpy(dtype=np.int64)
+        for start in range(0, len(casts), chunk_size):
+            keys = profile_keys[start:start + chunk_size]
+            chunk = pd.read_sql(text(f"""
+                SELECT profile_key, PRES, TEMP, PSAL FROM measurements
+                WHERE profile_key IN ({','.join(map(str, keys))}) ORDER BY profile_key, level
+            """), conn)
+            # Back into storage order (float, time); the stable sort keeps levels in order.
+            order = np.argsort(chunk['profile_key'].map(pd.Series(np.arange(len(keys)), index=keys)).to_numpy(), kind='stable')
+            first, last = profile_offsets[start], profile_offsets[min(start + chunk_size, len(casts))]
+            for column in LEVEL_COLUMNS:
+                levels[column][first:last] = chunk[column].to_numpy(dtype=np.float64)[order]
+        for array in levels.values():
+            array.flush()
+        del levels
+
+    float_ids = casts['float_id'].to_numpy(dtype=str)
+    float_starts = np.flatnonzero(np.r_[True, float_ids[1:] != float_ids[:-1]])
+    float_profile_offsets = np.r_[float_starts, len(casts)].astype(np.int64)
+    arrays = {
+        'profile_key': profile_keys,
+        'profile_id': casts['profile_id'].to_numpy(dtype=np.int64),
+        'TIME': casts['TIME'].astype(str).to_numpy(dtype=str),
+        'LATITUDE': casts['LATITUDE'].to_numpy(dtype=np.float64),
+        'LONGITUDE': casts['LONGITUDE'].to_numpy(dtype=np.float64),
+        'float_ids': float_ids[float_starts],
+        'float_offsets': profile_offsets[float_profile_offsets],
+        'float_profile_offsets': float_profile_offsets,
+        'profile_offsets': profile_offsets,
+        'profile_order': np.argsort(profile_keys, kind='stable'),
+    }
+    for column, values in arrays.items():
+        np.save(os.path.join(building, f"{column}.npy"), values)
+    with open(os.path.join(building, META_FILE), 'w', encoding='utf-8') as f:
+        json.dump({'data_version': version, 'rows': int(profile_offsets[-1]), 'profiles': len(casts),
+                   'floats': len(float_starts), 'written_at': datetime.now(timezone.utc).isoformat()}, f)
+
+    os.replace(building, os.path.join(root, name))
+    with open(os.path.join(root, CURRENT_FILE + ".tmp"), 'w', encoding='utf-8') as f:
+        f.write(name)
+    os.replace(os.path.join(root, CURRENT_FILE + ".tmp"), os.path.join(root, CURRENT_FILE))
+    for old in os.listdir(root):
+        if old != name and old.startswith('v'):
+            shutil.rmtree(os.path.join(root, old), ignore_errors=True)
+    print(f"✅ Wrote the array store '{root}' ({int(profile_offsets[-1])} measurements, {len(casts)} profiles).")
+
+def prepare_database(engine, full_refresh):
+    """
+    Creates the normalized tables, the `profiles` view and the manifest,
+    dropping them first on a full refresh. A database still using the old flat
+    `profiles` table is dropped too, since its rows cannot be upserted in place.
+    Returns True if the database was rebuilt from scratch.
+    """
+    # WAL lets the backend keep serving reads while ingestion writes.
+    with engine.connect() as conn:
+        conn.exec_driver_sql("PRAGMA journal_mode = WAL")
+
+    with engine.begin() as conn:
+        profiles_type = conn.execute(text("SELECT type FROM sqlite_master WHERE name = 'profiles'")).scalar()
+        if profiles_type == 'table' and not full_refresh:
+            print("⚠️ Warning: Found the old flat 'profiles' table. Rebuilding the database with the normalized schema.")
+            full_refresh = True
+
+        if full_refresh:
+            conn.execute(text(f"DROP {profiles_type or 'VIEW'} IF EXISTS profiles"))
+            for table in ['measurements', 'profile_summary', 'float_summary', GRID_TABLE, 'standard_depths',
+                          SPATIAL_TABLE, 'profile_headers', 'floats', MANIFEST_TABLE]:
+                conn.execute(text(f"DROP TABLE IF EXISTS {table}"))
+        for statement in SCHEMA_DDL + DATA_VERSION_DDL:
+            conn.execute(text(statement))
+        conn.execute(text(MANIFEST_DDL))
+        backfill_spatial_index(conn)
+        backfill_rollups(conn)
+        backfill_depth_grid(conn)
+        if full_refresh:
+            bump_data_version(conn)
+    return full_refresh
+
+def backfill_spatial_index(conn):
+    """Fills the spatial index of a database ingested before it existed; a no-op once it has rows."""
+    if conn.execute(text(f"SELECT EXISTS (SELECT 1 FROM {SPATIAL_TABLE})")).scalar():
+        return
+    inserted = conn.execute(text(f"""
+        INSERT INTO {SPATIAL_TABLE} (profile_key, min_lat, max_lat, min_lon, max_lon)
+        SELECT profile_key, LATITUDE, LATITUDE, LONGITUDE, LONGITUDE FROM profile_headers
+    """)).rowcount
+    if inserted:
+        print(f"✅ Built the spatial index for {inserted} existing profiles.")
+
+def _key_filter(column, keys):
+    """SQL condition restricting `column` to integer `keys`; None means no restriction."""
+    if keys is None:
+        return "1"
+    return f"{column} IN ({','.join(str(int(k)) for k in keys) or 'NULL'})"
+
+def refresh_profile_summary(conn, profile_keys=None):
+    """Recomputes the depth range, means, extremes and level count of the given casts (all casts if None)."""
+    conn.execute(text(f"""
+        INSERT OR REPLACE INTO profile_summary
+            (profile_key, level_count, min_pres, max_pres, mean_temp, min_temp, max_temp, mean_psal, min_psal, max_psal)
+        SELECT profile_key, COUNT(*), MIN(PRES), MAX(PRES), AVG(TEMP), MIN(TEMP), MAX(TEMP), AVG(PSAL), MIN(PSAL), MAX(PSAL)
+        FROM measurements WHERE {_key_filter('profile_key', profile_keys)}
+        GROUP BY profile_key
+    """))
+
+def refresh_float_summary(conn, float_keys=None):
+    """
+    Recomputes the cast count, time span and latest position of the given floats
+    (all floats if None) from the casts that have measurements.
+    """
+    conn.execute(text(f"DELETE FROM float_summary WHERE {_key_filter('float_key', float_keys)}"))
+    conn.execute(text(f"""
+        INSERT INTO float_summary
+            (float_key, float_id, profile_count, level_count, first_time, last_time, LATITUDE, LONGITUDE)
+        SELECT g.float_key, f.float_id, g.profile_count, g.level_count, g.first_time, g.last_time, last.LATITUDE, last.LONGITUDE
+        FROM (
+            SELECT h.float_key, COUNT(*) AS profile_count, SUM(s.level_count) AS level_count,
+                   MIN(h.TIME) AS first_time, MAX(h.TIME) AS last_time
+            FROM profile_headers h JOIN profile_summary s ON s.profile_key = h.profile_key
+            WHERE {_key_filter('h.float_key', float_keys)}
+            GROUP BY h.float_key
+        ) g
+        JOIN floats f ON f.float_key = g.float_key
+        JOIN profile_headers last ON last.profile_key = (
+            SELECT h.profile_key FROM profile_headers h JOIN profile_summary s ON s.profile_key = h.profile_key
+            WHERE h.float_key = g.float_key ORDER BY h.TIME DESC, h.profile_id DESC LIMIT 1
+        )
+    """))
+
+def backfill_rollups(conn):
+    """Builds the summary tables of a database ingested before they existed; a no-op once they have rows."""
+    if conn.execute(text("SELECT EXISTS (SELECT 1 FROM float_summary)")).scalar():
+        return
+    if not conn.execute(text("SELECT EXISTS (SELECT 1 FROM measurements)")).scalar():
+        return
+    refresh_profile_summary(conn)
+    refresh_float_summary(conn)
+    print("✅ Built the per-float and per-profile summary tables.")
+
+def backfill_depth_grid(conn, chunk_size=5000):
+    """
+    Grids every cast when the depth grid is empty, or was built with different
+    standard depths than STANDARD_DEPTHS; a no-op otherwise.
+    """
+    stored = conn.execute(text("SELECT PRES FROM standard_depths ORDER BY level")).scalars().all()
+    if stored != STANDARD_DEPTHS.tolist():
+        conn.execute(text(f"DELETE FROM {GRID_TABLE}"))
+        conn.execute(text("DELETE FROM standard_depths"))
+        conn.execute(text("INSERT INTO standard_depths (level, PRES) VALUES (:level, :PRES)"),
+                     [{'level': i, 'PRES': pres} for i, pres in enumerate(STANDARD_DEPTHS.tolist())])
+    elif conn.execute(text(f"SELECT EXISTS (SELECT 1 FROM {GRID_TABLE})")).scalar():
+        return
+
+    keys = conn.execute(text("SELECT profile_key FROM profile_summary ORDER BY profile_key")).scalars().all()
+    for start in range(0, len(keys), chunk_size):
+        chunk = keys[start:start + chunk_size]
+        df = pd.read_sql(text("""
+            SELECT profile_key AS profile_id, PRES, TEMP, PSAL FROM measurements
+            WHERE profile_key BETWEEN :first AND :last
+        """), conn, params={'first': chunk[0], 'last': chunk[-1]})
+        conn.execute(text(f"INSERT OR REPLACE INTO {GRID_TABLE} (profile_key, TEMP, PSAL) VALUES (:profile_key, :TEMP, :PSAL)"),
+                     grid_records(df, {key: key for key in chunk}))
+    if keys:
+        print(f"✅ Interpolated {len(keys)} profiles onto {len(STANDARD_DEPTHS)} standard depths.")
+
+def bump_data_version(conn):
+    """
+    Marks the stored data as changed so the backend drops cached query results.
+    Call it inside the transaction that changes the data.
+    """
+    conn.execute(text("UPDATE data_version SET version = version + 1 WHERE id = 1"))
+
+def iter_decoded_files(nc_files, workers):
+    """
+    Yields (nc_file, DataFrame) pairs as files finish decoding.
+    At most `workers * MAX_PENDING_PER_WORKER` files are in flight at once,
+    so memory use does not grow with the number of files.
+    """
+    if workers <= 1:
+        for nc_file in nc_files:
+            yield nc_file, load_profile_file(nc_file)
+        return
+
+    max_pending = workers * MAX_PENDING_PER_WORKER
+    remaining = iter(nc_files)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = {}
+        for nc_file in remaining:
+            pending[executor.submit(load_profile_file, nc_file)] = nc_file
+            if len(pending) >= max_pending:
+                break
+
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                nc_file = pending.pop(future)
+                next_file = next(remaining, None)
+                if next_file is not None:
+                    pending[executor.submit(load_profile_file, next_file)] = next_file
+                yield nc_file, future.result()
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Process ARGO NetCDF files into the SQLite database.")
+    parser.add_argument('--pattern', default=NC_FILE_PATTERN, help="Glob pattern used to find NetCDF files.")
+    parser.add_argument('--db', default=DB_FILE_PATH, help="Path to the SQLite database file.")
+    parser.add_argument('--workers', type=int, default=NUM_WORKERS, help="Number of decoding processes (1 = serial).")
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help="Rows per INSERT batch.")
+    parser.add_argument('--full-refresh', action='store_true', help="Drop existing data and re-ingest every file.")
+    parser.add_argument('--parquet', nargs='?', const=PARQUET_DIR, default=None, metavar='DIR',
+                        help=f"Also write a partitioned Parquet copy of the data (default directory: {PARQUET_DIR}). "
+                             "Enabled automatically when the default directory already exists.")
+    parser.add_argument('--arrays', nargs='?', const=ARRAY_STORE_DIR, default=None, metavar='DIR',
+                        help=f"Also write a memory-mapped array copy of the measurements (default directory: {ARRAY_STORE_DIR}). "
+                             "Enabled automatically when the default directory already exists.")
+    return parser.parse_args()
 
 def main():
     """
     Main function to process NetCDF files and store them in an SQLite database.
-    This version now processes all .nc files in the directory.
+    Only files that are new or changed since the last run (per the manifest table)
+    are decoded; their rows are upserted so unchanged data is left untouched.
+    Files are decoded in a process pool and streamed into the database in bounded batches.
     """
-    nc_files = glob.glob(NC_FILE_PATTERN)
+    args = parse_args()
+    nc_files = sorted(glob.glob(args.pattern))
     if not nc_files:
-        print(f"❌ Error: No data files found matching '{NC_FILE_PATTERN}'")
+        print(f"❌ Error: No data files found matching '{args.pattern}'")
         return
 
-    print(f"➡️ Found {len(nc_files)} NetCDF files to process.")
-    
-    all_dfs = []
-    for nc_file in nc_files:
-        print(f"➡️ Loading NetCDF dataset from '{nc_file}'...")
-        try:
-            ds = xr.open_dataset(nc_file, decode_times=True)
-            
-            # --- Define Correct Variable Names ---
-            time_var = 'JULD'
-            lat_var = 'LATITUDE'
-            lon_var = 'LONGITUDE'
-            pres_var = 'PRES_ADJUSTED'
-            temp_var = 'TEMP_ADJUSTED'
-            sal_var = 'PSAL_ADJUSTED'
-            float_id_var = 'PLATFORM_NUMBER'
-            
-            print("➡️ Manually constructing DataFrame from profile data...")
-            df = ds[[pres_var, temp_var, sal_var]].to_dataframe()
-            
-            profile_meta_vars = [time_var, lat_var, lon_var, float_id_var]
-            df_meta = ds[profile_meta_vars].to_dataframe()
-
-            df_full = pd.merge(df, df_meta, on='N_PROF', how='left')
-            df_full = df_full.reset_index()
-
-            print("➡️ Processing and cleaning data...")
-
-            rename_map = {
-                'N_PROF': 'profile_id',
-                pres_var: 'PRES',
-                temp_var: 'TEMP',
-                sal_var: 'PSAL',
-                lat_var: 'LATITUDE',
-                lon_var: 'LONGITUDE',
-                float_id_var: 'float_id',
-                time_var: 'TIME'
-            }
-            df_final = df_full.rename(columns=rename_map)
-
-            df_final['float_id'] = df_final['float_id'].astype(str)
-
-            required_columns = ['float_id', 'PRES', 'TEMP', 'PSAL', 'LATITUDE', 'LONGITUDE', 'TIME', 'profile_id']
-            df_final = df_final[required_columns].dropna()
-            
-            if not df_final.empty:
-                all_dfs.append(df_final)
-            else:
-                print(f"⚠️ Warning: No data extracted from {nc_file}.")
-
-        except Exception as e:
-            print(f"❌ Error processing {nc_file}: {e}")
-            continue
+    engine = create_engine(f'sqlite:///{args.db}')
+    full_refresh = prepare_database(engine, args.full_refresh)
+
+    parquet_dir = args.parquet or (PARQUET_DIR if os.path.isdir(PARQUET_DIR) else None)
+    if parquet_dir and not full_refresh and not os.path.isdir(parquet_dir) and load_manifest(engine):
+        print(f"⚠️ Warning: Parquet store '{parquet_dir}' does not exist yet. Re-ingesting all files to build it.")
+        full_refresh = prepare_database(engine, True)
+    if parquet_dir and full_refresh:
+        shutil.rmtree(parquet_dir, ignore_errors=True)
 
-    if not all_dfs:
-        print("❌ Error: After processing all files, no data was available.")
+    arrays_dir = args.arrays or (ARRAY_STORE_DIR if os.path.isdir(ARRAY_STORE_DIR) else None)
+
+    changed = find_changed_files(engine, nc_files)
+    if not changed:
+        print(f"✅ All {len(nc_files)} NetCDF files are already ingested. Nothing to do.")
+        if arrays_dir:
+            write_array_store(engine, arrays_dir)
         return
-        
-    combined_df = pd.concat(all_dfs, ignore_index=True)
 
-    print(f"➡️ Storing {len(combined_df)} total measurements into SQLite database at '{DB_FILE_PATH}'...")
-    engine = create_engine(f'sqlite:///{DB_FILE_PATH}')
-    combined_df.to_sql('profiles', engine, if_exists='replace', index=False)
+    workers = max(1, min(args.workers, len(changed)))
+    print(f"➡️ Found {len(changed)} new or changed NetCDF files (of {len(nc_files)}) to process with {workers} worker(s).")
+
+    total_rows = 0
+    for path, df in iter_decoded_files(list(changed), workers):
+        if df is None:
+            continue
+        moved = upsert_file_rows(engine, path, changed[path], df, args.batch_size)
+        if parquet_dir:
+            write_parquet_parts(parquet_dir, path, df)
+            # Casts that moved here from another file must not stay in that file's parts too.
+            for old_path, casts in moved.items():
+                remove_parquet_casts(parquet_dir, old_path, casts)
+            # The parts change after the upsert commits; drop DuckDB results cached from the old ones.
+            with engine.begin() as conn:
+                bump_data_version(conn)
+        total_rows += len(df)
+        print(f"✅ Stored {len(df)} measurements from '{path}' ({total_rows} total).")
+
+    # Written once per run rather than per file: a snapshot is a full rewrite.
+    if arrays_dir:
+        write_array_store(engine, arrays_dir)
+
+    if total_rows == 0:
+        print("⚠️ Warning: The new files did not contain any usable data.")
+        return
 
-    print("\n✅ Success! Database 'argo.db' has been created with data from all files.")
+    print(f"\n✅ Success! Database '{args.db}' has been updated with {total_rows} measurements.")
     print("\nSample of the stored data:")
-    print(combined_df.head())
+    print(pd.read_sql("SELECT * FROM profiles LIMIT 5", engine))
 
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main()
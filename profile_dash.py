@@ -1,6 +1,8 @@
-from dash import Dash, html, dcc, Input, Output
+from dash import Dash, html, dcc, Input, Output, State
 import dash_bootstrap_components as dbc
 import plotly.graph_objects as go
+from plotly.colors import qualitative
+from plotly.subplots import make_subplots
 import backend
 
 # Initialize Dash app with Bootstrap and Google Fonts
@@ -29,8 +31,8 @@ app.layout = html.Div([
             html.Div([
                 dcc.Dropdown(
                     id='float-dropdown',
-                    multi=False,
-                    placeholder="Select a Float ID...",
+                    multi=True,
+                    placeholder="Type or select Float IDs to compare...",
                     style={
                         'width': '100%', 'maxWidth': '400px', 'marginBottom': '25px', 'backgroundColor': '#2E4057',
                         'color': "#030303", 'border': '1px solid #465C71', 'borderRadius': '8px', 'padding': '12px',
@@ -56,35 +58,57 @@ app.layout = html.Div([
     )
 ], style={'backgroundColor': '#152238', 'minHeight': '100vh', 'display': 'flex', 'flexDirection': 'column'})
 
-# Callback to update dropdown options and plot
+# Load the float list once at startup; backend keeps it cached until new data is ingested.
+try:
+    backend.fetch_all_float_ids()
+except Exception as e:
+    print(f"⚠️ Could not load float IDs: {e}")
+
+# Callback to offer float IDs matching what has been typed, searched on the server
+# so the browser never receives the full list.
 @app.callback(
-    [Output('float-dropdown', 'options'),
-     Output('profile-graph', 'figure'),
+    Output('float-dropdown', 'options'),
+    Input('float-dropdown', 'search_value'),
+    State('float-dropdown', 'value')
+)
+def update_float_options(search_value, selected_floats):
+    try:
+        float_ids = backend.search_float_ids(search_value)
+    except Exception as e:
+        print(f"❌ Float search failed: {e}")
+        float_ids = []
+    # Keep the current selection among the options, or the dropdown would clear it.
+    selected = [fid for fid in (selected_floats or []) if fid not in float_ids]
+    return [{'label': fid, 'value': fid} for fid in selected + float_ids]
+
+# Callback to plot the selected floats: temperature and salinity side by side, one color per float
+@app.callback(
+    [Output('profile-graph', 'figure'),
      Output('profile-status', 'children')],
     Input('float-dropdown', 'value')
 )
-def update_profile_page(selected_float):
+def update_profile_page(selected_floats):
     try:
-        float_ids = backend.fetch_all_float_ids()
-        options = [{'label': fid, 'value': fid} for fid in float_ids] if float_ids else []
-
-        if not selected_float:
-            return options, go.Figure(), "Please select a Float ID to view profiles."
+        if not selected_floats:
+            return go.Figure(), "Please select one or more Float IDs to view profiles."
 
-        df = backend.fetch_comparison_data([selected_float])
-        if df.empty:
-            return options, go.Figure(), f"No data available for Float {selected_float}."
+        # One bulk query; each float's arrays arrive already grouped and sorted by pressure.
+        profiles = backend.fetch_float_profiles(selected_floats)
+        if not profiles:
+            return go.Figure(), f"No data available for Float {', '.join(selected_floats)}."
 
-        fig = go.Figure()
-        float_data = df[df['float_id'] == selected_float]
-        fig.add_trace(go.Scatter(x=float_data['TEMP'], y=float_data['PRES'], mode='lines+markers',
-                                name='Temperature', line=dict(color='#FF6B6B')))
-        fig.add_trace(go.Scatter(x=float_data['PSAL'], y=float_data['PRES'], mode='lines+markers',
-                                name='Salinity', line=dict(color='#4ECDC4')))
+        fig = make_subplots(rows=1, cols=2, shared_yaxes=True, horizontal_spacing=0.05,
+                            subplot_titles=('Temperature (°C)', 'Salinity (PSU)'))
+        for i, (float_id, data) in enumerate(profiles.items()):
+            color = qualitative.Plotly[i % len(qualitative.Plotly)]
+            fig.add_trace(go.Scattergl(x=data['TEMP'], y=data['PRES'], mode='lines+markers', name=float_id,
+                                       legendgroup=float_id, line=dict(color=color)), row=1, col=1)
+            fig.add_trace(go.Scattergl(x=data['PSAL'], y=data['PRES'], mode='lines+markers', name=float_id,
+                                       legendgroup=float_id, showlegend=False, line=dict(color=color)), row=1, col=2)
 
+        title = f'Depth Profiles for Float {float_id}' if len(profiles) == 1 else f'Depth Profiles for {len(profiles)} Floats'
         fig.update_layout(
-            title=f'Depth Profiles for Float {selected_float}',
-            xaxis_title='Value',
+            title=title,
             yaxis_title='Pressure (dbar)',
             template='plotly_dark',
             yaxis=dict(autorange="reversed"),
@@ -95,9 +119,13 @@ def update_profile_page(selected_float):
             paper_bgcolor='rgba(46,64,87,0.8)'
         )
 
-        return options, fig, f"Displaying profile for Float {selected_float}."
+        missing = [fid for fid in selected_floats if fid not in profiles]
+        status = f"Displaying profiles for {len(profiles)} float(s)."
+        if missing:
+            status += f" No data available for Float {', '.join(missing)}."
+        return fig, status
     except Exception as e:
-        return [], go.Figure(), f"Error: {str(e)}. Please check the database or contact support."
+        return go.Figure(), f"Error: {str(e)}. Please check the database or contact support."
 
 if __name__ == '__main__':
     app.run(debug=True, port=5500)
\ No newline at end of file
@@ -0,0 +1,228 @@
+import hashlib
+import json
+import os
+import pickle
+import re
+import threading
+from collections import OrderedDict
+
+# SQL keywords whose case does not change a query's result. Function names are
+# left alone because an un-aliased `AVG(TEMP)` becomes the result column name.
+SQL_KEYWORDS = {
+    'select', 'from', 'where', 'group', 'order', 'by', 'having', 'limit', 'offset',
+    'and', 'or', 'not', 'in', 'is', 'null', 'like', 'between', 'as', 'asc', 'desc',
+    'distinct', 'join', 'left', 'inner', 'on', 'using', 'case', 'when', 'then', 'else', 'end',
+}
+_LITERAL_PATTERN = re.compile(r"('(?:[^']|'')*')")
+_WORD_PATTERN = re.compile(r"\b[A-Za-z_]+\b")
+
+def normalize_sql(query: str) -> str:
+    """
+    Canonical form of a query used as the cache key: collapses whitespace,
+    drops trailing semicolons and upper-cases keywords, leaving string literals intact.
+    """
+    parts = _LITERAL_PATTERN.split(query.strip().rstrip(';').strip())
+    normalized = []
+    for i, part in enumerate(parts):
+        if i % 2 == 0:
+            part = re.sub(r"\s+", " ", part)
+            part = _WORD_PATTERN.sub(lambda m: m.group(0).upper() if m.group(0).lower() in SQL_KEYWORDS else m.group(0), part)
+        normalized.append(part)
+    return "".join(normalized).strip()
+
+def cache_key(query: str, params: dict = None) -> str:
+    """Normalized SQL, plus the bound parameters when there are any."""
+    key = normalize_sql(query)
+    if params:
+        key += " -- " + json.dumps(params, sort_keys=True, default=str)
+    return key
+
+def _frame_size(df) -> int:
+    return int(df.memory_usage(index=True, deep=True).sum())
+
+class QueryCache:
+    """
+    In-process LRU cache of query results (DataFrames), bounded by total size in bytes.
+    Entries evicted from memory are optionally pickled to `spill_dir` and promoted back on a hit.
+    All entries belong to one data version; a new version clears memory and any
+    spilled files written under another version.
+    Cached DataFrames are shared between callers and must not be modified in place.
+
+    Spill bookkeeping (which files this process wrote, and their total size) is kept in
+    memory; file I/O happens outside the lock. Several processes may share `spill_dir`,
+    each keeping its own files within `max_spill_bytes`, and a spilled file that another
+    process already removed is treated as evicted.
+    """
+
+    def __init__(self, max_bytes: int, spill_dir: str = None, max_spill_bytes: int = 0):
+        self.max_bytes = max_bytes
+        self.spill_dir = spill_dir
+        self.max_spill_bytes = max_spill_bytes
+        self.version = None
+        self._entries = OrderedDict()  # key -> (DataFrame, size in bytes)
+        self._bytes = 0
+        self._spilled = OrderedDict()  # spill file path -> size in bytes, oldest first
+        self._spill_bytes = 0
+        self._lock = threading.Lock()
+        self._counters = {'hits': 0, 'disk_hits': 0, 'misses': 0, 'evictions': 0, 'spills': 0, 'invalidations': 0}
+        if spill_dir:
+            os.makedirs(spill_dir, exist_ok=True)
+
+    def set_version(self, version):
+        """Drops every cached result if the data version changed since the last call."""
+        with self._lock:
+            if version == self.version:
+                return
+            if self.version is not None:
+                self._counters['invalidations'] += 1
+            self.version = version
+            self._entries.clear()
+            self._bytes = 0
+            self._spilled.clear()
+            self._spill_bytes = 0
+        for name in self._spill_files():
+            if not name.startswith(f"{version}-"):
+                _remove(os.path.join(self.spill_dir, name))
+
+    def get(self, query: str, params: dict = None):
+        """Returns the cached DataFrame for `query` with `params`, or None on a miss."""
+        key = cache_key(query, params)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self._counters['hits'] += 1
+                return entry[0]
+            version = self.version
+
+        df = self._load_spilled(key, version)
+        with self._lock:
+            if df is None:
+                self._counters['misses'] += 1
+                return None
+            self._counters['disk_hits'] += 1
+            evicted = self._store(key, df) if version == self.version else []
+        self._spill(evicted, version)
+        return df
+
+    def put(self, query: str, df, params: dict = None):
+        """Caches a result; results larger than the whole budget are not cached."""
+        key = cache_key(query, params)
+        with self._lock:
+            evicted = self._store(key, df)
+            version = self.version
+        self._spill(evicted, version)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self._counters['hits'] + self._counters['disk_hits'] + self._counters['misses']
+            hit_rate = (self._counters['hits'] + self._counters['disk_hits']) / lookups if lookups else 0.0
+            return {
+                **self._counters,
+                'hit_rate': round(hit_rate, 4),
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+                'spilled_entries': len(self._spilled),
+                'spill_bytes': self._spill_bytes,
+                'data_version': self.version,
+            }
+
+    # --- Internal helpers ---
+    def _store(self, key, df):
+        """Adds an entry (caller holds the lock); returns the evicted (key, DataFrame, size) to spill."""
+        size = _frame_size(df)
+        if size > self.max_bytes:
+            return []
+        if key in self._entries:
+            self._bytes -= self._entries.pop(key)[1]
+        self._entries[key] = (df, size)
+        self._bytes += size
+        evicted = []
+        while self._bytes > self.max_bytes:
+            old_key, (old_df, old_size) = self._entries.popitem(last=False)
+            self._bytes -= old_size
+            self._counters['evictions'] += 1
+            evicted.append((old_key, old_df, old_size))
+        return evicted
+
+    def _spill_path(self, key, version):
+        digest = hashlib.sha256(key.encode()).hexdigest()
+        return os.path.join(self.spill_dir, f"{version}-{digest}.pkl")
+
+    def _spill_files(self):
+        if not self.spill_dir or not os.path.isdir(self.spill_dir):
+            return []
+        return [name for name in os.listdir(self.spill_dir) if name.endswith(('.pkl', '.tmp'))]
+
+    def _spill(self, evicted, version):
+        """Pickles evicted entries to disk (without the lock), dropping this process's oldest files to stay in budget."""
+        if not self.spill_dir:
+            return
+        for key, df, size in evicted:
+            if size > self.max_spill_bytes:
+                continue
+            path = self._spill_path(key, version)
+            # Written under a temporary name, then renamed, so readers never see a partial file.
+            temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            try:
+                with open(temp_path, 'wb') as f:
+                    pickle.dump(df, f, protocol=pickle.HIGHEST_PROTOCOL)
+                size = os.path.getsize(temp_path)
+            except FileNotFoundError:
+                continue  # Removed by a worker that already moved to a newer data version
+            except OSError as e:
+                print(f"⚠️ Could not spill a cached result: {e}")
+                _remove(temp_path)
+                continue
+
+            dropped = []
+            with self._lock:
+                stale = version != self.version or size > self.max_spill_bytes
+                if not stale:
+                    self._spill_bytes -= self._spilled.pop(path, 0)
+                    while self._spilled and self._spill_bytes + size > self.max_spill_bytes:
+                        oldest, oldest_size = self._spilled.popitem(last=False)
+                        self._spill_bytes -= oldest_size
+                        dropped.append(oldest)
+                    self._spilled[path] = size
+                    self._spill_bytes += size
+                    self._counters['spills'] += 1
+            for old_path in dropped:
+                _remove(old_path)
+            if stale:
+                _remove(temp_path)
+                continue
+            try:
+                os.replace(temp_path, path)
+            except FileNotFoundError:
+                pass  # Cleared by a worker on a newer data version
+            except OSError as e:
+                print(f"⚠️ Could not spill a cached result: {e}")
+                _remove(temp_path)
+
+    def _load_spilled(self, key, version):
+        """Reads and removes a spilled entry (without the lock); None if there is none."""
+        if not self.spill_dir:
+            return None
+        path = self._spill_path(key, version)
+        try:
+            with open(path, 'rb') as f:
+                df = pickle.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, pickle.UnpicklingError, EOFError) as e:
+            print(f"⚠️ Could not read a spilled result: {e}")
+            return None
+        finally:
+            with self._lock:
+                self._spill_bytes -= self._spilled.pop(path, 0)
+        _remove(path)
+        return df
+
+def _remove(path):
+    """Deletes a file; one that is already gone (e.g. removed by another worker) counts as removed."""
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
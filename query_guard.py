@@ -0,0 +1,138 @@
+import re
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+# Tables big enough that scanning them in full is worth flagging.
+LARGE_TABLES = {'measurements', 'profile_headers'}
+
+_MASK_PATTERN = re.compile(r"'(?:[^']|'')*'|\"(?:[^\"]|\"\")*\"|--[^\n]*|/\*.*?\*/", re.DOTALL)
+_LIMIT_PATTERN = re.compile(r"\bLIMIT\s+(\d+)(?:\s*,\s*(\d+))?", re.IGNORECASE)
+_TABLE_REF_PATTERN = re.compile(r"\b(?:FROM|JOIN)\s+(\w+)(?:\s+(?:AS\s+)?(?!(?:WHERE|JOIN|ON|USING|GROUP|ORDER|LIMIT|LEFT|INNER|CROSS|NATURAL)\b)(\w+))?", re.IGNORECASE)
+# A scan through a (covering) index still visits every row of the table, just in index order.
+_SCAN_PATTERN = re.compile(r"^SCAN (\w+)(?: AS (\w+))?(?: USING (?:COVERING )?INDEX (\w+))?$")
+
+class QueryRejected(ValueError):
+    """Raised for SQL the guard refuses to run."""
+
+class QueryTimeout(ValueError):
+    """Raised when a query runs past its time budget."""
+
+def _blank(match):
+    return " " * len(match.group(0))
+
+def mask_sql(query: str) -> str:
+    """The query with string literals, quoted identifiers and comments blanked out (same length)."""
+    return _MASK_PATTERN.sub(_blank, query)
+
+def top_level_sql(query: str) -> str:
+    """Like mask_sql, but also blanks everything inside parentheses (subqueries, function arguments)."""
+    masked = list(mask_sql(query))
+    depth = 0
+    for i, char in enumerate(masked):
+        if char == ')':
+            depth = max(depth - 1, 0)
+        if depth:
+            masked[i] = ' '
+        if char == '(':
+            depth += 1
+    return "".join(masked)
+
+def check_statement(query: str):
+    """Rejects anything but a single SELECT statement."""
+    masked = mask_sql(query).strip().rstrip(';').strip()
+    if ';' in masked:
+        raise QueryRejected("Only a single SQL statement can be run. Please ask a simpler question.")
+    if not re.match(r"(?:SELECT|WITH)\b", masked, re.IGNORECASE):
+        raise QueryRejected("Only SELECT queries can be run against the ARGO database.")
+
+def ensure_limit(query: str, max_rows: int) -> str:
+    """Adds `LIMIT max_rows` to a query without one, and lowers a larger literal LIMIT to `max_rows`."""
+    top = top_level_sql(query)
+    match = _LIMIT_PATTERN.search(top)
+    if match is None:
+        query = query.strip().rstrip(';').rstrip()
+        # A trailing "-- comment" would swallow a LIMIT appended on the same line.
+        separator = "\n" if "--" in query.splitlines()[-1] else " "
+        return query + f"{separator}LIMIT {max_rows};"
+    # SQLite also accepts "LIMIT offset, count".
+    group = 2 if match.group(2) else 1
+    if int(match.group(group)) <= max_rows:
+        return query
+    return query[:match.start(group)] + str(max_rows) + query[match.end(group):]
+
+def table_aliases(*sql_texts) -> dict:
+    """Maps each name or alias used after FROM/JOIN in the given SQL texts to its table."""
+    aliases = {}
+    for sql in sql_texts:
+        for table, alias in _TABLE_REF_PATTERN.findall(mask_sql(sql)):
+            aliases[table] = table
+            if alias:
+                aliases[alias] = table
+    return aliases
+
+def review_plan(plan_rows, aliases: dict, large_tables=LARGE_TABLES) -> list:
+    """
+    Findings from `EXPLAIN QUERY PLAN` rows (id, parent, notused, detail):
+    full scans of large tables (including scans of a whole index), automatic (missing)
+    indexes and temporary sorts.
+    Raises QueryRejected for a nested loop over two full scans of large tables,
+    whose cost grows with the product of their sizes.
+    """
+    findings = []
+    scans_by_parent = {}
+    for _, parent, _, detail in plan_rows:
+        scan = _SCAN_PATTERN.match(detail)
+        if scan:
+            table = aliases.get(scan.group(2) or scan.group(1), scan.group(1))
+            if table in large_tables:
+                scans_by_parent.setdefault(parent, []).append(table)
+                findings.append(f"full scan of {table}" + (f" (via index {scan.group(3)})" if scan.group(3) else ""))
+        elif 'AUTOMATIC' in detail:
+            findings.append(f"missing index ({detail})")
+        elif detail.startswith('USE TEMP B-TREE'):
+            findings.append(detail.lower())
+    for tables in scans_by_parent.values():
+        if len(tables) > 1:
+            raise QueryRejected(
+                f"This query would compare every row of {tables[0]} with every row of {tables[1]}, which is too slow to run. "
+                "Please narrow it down, e.g. to a float, a depth or a date range."
+            )
+    return findings
+
+# --- Per-query time budget ---
+_deadline = threading.local()
+
+def _past_deadline():
+    deadline = getattr(_deadline, 'value', None)
+    return 1 if deadline is not None and time.monotonic() > deadline else 0
+
+def install_time_budget(dbapi_connection, steps: int = 10000):
+    """Lets time_budget() interrupt statements on this sqlite3 connection (checked every `steps` VM instructions)."""
+    dbapi_connection.set_progress_handler(_past_deadline, steps)
+
+def _interrupted(error) -> bool:
+    """True if `error`, or an error it wraps (SQLAlchemy, pandas), is SQLite's 'interrupted'."""
+    while error is not None:
+        if isinstance(error, sqlite3.OperationalError) and 'interrupted' in str(error):
+            return True
+        error = getattr(error, 'orig', None) or error.__cause__
+    return False
+
+@contextmanager
+def time_budget(seconds: float):
+    """Interrupts SQLite statements run by this thread after `seconds`, raising QueryTimeout."""
+    previous = getattr(_deadline, 'value', None)
+    _deadline.value = time.monotonic() + seconds
+    try:
+        yield
+    except Exception as e:
+        if _interrupted(e):
+            raise QueryTimeout(
+                f"The query took longer than {seconds:g} seconds and was stopped. "
+                "Please narrow it down, e.g. to a float, a depth or a date range."
+            ) from e
+        raise
+    finally:
+        _deadline.value = previous
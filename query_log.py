@@ -0,0 +1,44 @@
+import json
+import os
+import threading
+import time
+
+class QueryLog:
+    """
+    Append-only JSONL record of executed SQL, one {"ts", "sql", "params", "ms", "source"}
+    object per line, replayed by add_indexed.py to pick indexes for the real workload.
+    When the file grows past `max_bytes` it is rotated to `<path>.1`, replacing the previous rotation.
+    """
+
+    def __init__(self, path: str, max_bytes: int = 50 * 1024 * 1024):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+
+    def record(self, query: str, params: dict = None, seconds: float = None, source: str = 'sqlite'):
+        entry = {'ts': round(time.time(), 3), 'sql': query, 'params': params or {}, 'source': source}
+        if seconds is not None:
+            entry['ms'] = round(seconds * 1000, 3)
+        line = json.dumps(entry, default=str) + "\n"
+        with self._lock:
+            try:
+                if os.path.exists(self.path) and os.path.getsize(self.path) + len(line) > self.max_bytes:
+                    os.replace(self.path, self.path + ".1")
+                with open(self.path, 'a', encoding='utf-8') as f:
+                    f.write(line)
+            except OSError as e:
+                print(f"⚠️ Could not record query: {e}")
+
+def read_query_log(path: str) -> list:
+    """Entries of a query log and its rotated predecessor, oldest first; malformed lines are skipped."""
+    entries = []
+    for name in (path + ".1", path):
+        if not os.path.exists(name):
+            continue
+        with open(name, encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entries.append(json.loads(line))
+                except json.JSONDecodeError:
+                    continue
+    return entries
@@ -0,0 +1,207 @@
+import re
+from datetime import date, timedelta
+from template_matcher import TemplateMatcher
+from spatial import point_window
+
+# Placeholders used in template questions, and the SQL parameters each one binds.
+SLOT_PARAMS = {
+    'floatid': ['float_id'],
+    'depth': ['depth'],
+    'depthrange': ['depth_min', 'depth_max'],
+    'daterange': ['start_date', 'end_date'],
+    'bbox': ['lat_min', 'lat_max', 'lon_min', 'lon_max'],
+    # A point also binds the search window used to narrow the nearest-float lookup,
+    # whose second longitude range covers the part of the window across ±180°.
+    'point': ['lat', 'lon', 'lat_min', 'lat_max', 'lon_min', 'lon_max', 'lon_min_wrap', 'lon_max_wrap'],
+}
+# Named sea areas accepted as a {bbox}: (lat_min, lat_max, lon_min, lon_max).
+REGION_BOXES = {
+    'bay of bengal': (5.0, 23.0, 80.0, 95.0),
+    'arabian sea': (5.0, 25.0, 50.0, 77.0),
+    'andaman sea': (5.0, 17.0, 92.0, 99.0),
+    'laccadive sea': (5.0, 15.0, 70.0, 80.0),
+    'red sea': (12.0, 30.0, 32.0, 44.0),
+    'persian gulf': (23.0, 31.0, 47.0, 57.0),
+    'indian ocean': (-60.0, 30.0, 20.0, 147.0),
+    'southern ocean': (-90.0, -60.0, -180.0, 180.0),
+}
+_PLACEHOLDER_PATTERN = re.compile(r"\{(\w+)\}")
+
+_NUM = r"-?\d+(?:\.\d+)?"
+_DEPTH_UNIT = r"(?:dbar|decibars?|db|m|meters?|metres?)\b"
+_DEPTH_PATTERN = re.compile(rf"({_NUM})\s*{_DEPTH_UNIT}", re.IGNORECASE)
+# A number without a unit is only read as a depth where the wording says so, e.g.
+# "deeper than 1000", "at a depth of 500" or "at 500 depth".
+_BARE_DEPTH_PATTERNS = [ # Group 1 is replaced by {depth}, group 2 is the value
+    re.compile(rf"\b(?:deeper|shallower)\s+than\s+(({_NUM}))(?![\d.])", re.IGNORECASE),
+    re.compile(rf"\bat\s+((?:an?\s+)?depth\s+(?:of\s+)?({_NUM}))(?![\d.])", re.IGNORECASE),
+    re.compile(rf"\bat\s+(({_NUM})\s+depth)\b", re.IGNORECASE),
+]
+_DEPTH_RANGE_PATTERN = re.compile(rf"\b(?:between|from)\s+({_NUM})\s*(?:{_DEPTH_UNIT})?\s+(?:and|to)\s+({_NUM})\s*{_DEPTH_UNIT}", re.IGNORECASE)
+_FLOAT_ID_PATTERN = re.compile(r"\b(?:float|platform|wmo)\s*(?:id|number|no\.?)?\s*#?\s*(\d{5,8})\b|(?<![\d.])(\d{7})(?![\d.])", re.IGNORECASE)
+_DATE = r"(?:19|20)\d{2}(?:-\d{2}(?:-\d{2})?)?"
+_DATE_RANGE_PATTERNS = [
+    re.compile(rf"\b(?:between|from)\s+({_DATE})\s+(?:and|to|until)\s+({_DATE})\b", re.IGNORECASE),
+    re.compile(rf"\b(?:since|after)\s+({_DATE})\b()", re.IGNORECASE),
+    re.compile(rf"\b(?:in|during)\s+({_DATE})\b()", re.IGNORECASE),
+]
+_LAT_LON_RANGE_PATTERN = re.compile(
+    rf"\blat(?:itude)?s?\s+(?:between|from)\s+({_NUM})\s+(?:and|to)\s+({_NUM})\s*,?\s*(?:and\s+)?"
+    rf"lon(?:gitude)?s?\s+(?:between|from)\s+({_NUM})\s+(?:and|to)\s+({_NUM})\b", re.IGNORECASE)
+_HEMISPHERE_PATTERN = re.compile(r"(\d+(?:\.\d+)?)\s*°?\s*([NSEW])\b", re.IGNORECASE)
+_LAT_LON_POINT_PATTERN = re.compile(rf"\blat(?:itude)?\s*=?\s*({_NUM})\s*,?\s*(?:and\s+)?lon(?:gitude)?\s*=?\s*({_NUM})\b", re.IGNORECASE)
+_REGION_PATTERN = re.compile(r"\b(?:the\s+)?(" + "|".join(map(re.escape, REGION_BOXES)) + r")\b", re.IGNORECASE)
+
+def _date_bounds(value: str):
+    """Start (inclusive) and end (exclusive) of a YYYY, YYYY-MM or YYYY-MM-DD date, as TIME-comparable text."""
+    parts = [int(p) for p in value.split('-')]
+    if len(parts) == 1:
+        return f"{parts[0]:04d}-01-01", f"{parts[0] + 1:04d}-01-01"
+    if len(parts) == 2:
+        year, month = parts
+        next_year, next_month = (year + 1, 1) if month == 12 else (year, month + 1)
+        return f"{year:04d}-{month:02d}-01", f"{next_year:04d}-{next_month:02d}-01"
+    day = date(*parts)
+    return day.isoformat(), (day + timedelta(days=1)).isoformat()
+
+def _mask(text, start, end, placeholder):
+    return text[:start] + "{" + placeholder + "}" + text[end:]
+
+def _extract_depth_range(question, params):
+    match = _DEPTH_RANGE_PATTERN.search(question)
+    if not match:
+        return question
+    params['depth_min'], params['depth_max'] = sorted(float(v) for v in match.group(1, 2))
+    return _mask(question, match.start(), match.end(), 'depthrange')
+
+def _extract_depth(question, params):
+    match = _DEPTH_PATTERN.search(question)
+    if not match:
+        return question
+    params['depth'] = float(match.group(1))
+    return _mask(question, match.start(), match.end(), 'depth')
+
+def _extract_bare_depth(question, params):
+    if 'depth' in params:
+        return question
+    for pattern in _BARE_DEPTH_PATTERNS:
+        match = pattern.search(question)
+        if match:
+            params['depth'] = float(match.group(2))
+            return _mask(question, match.start(1), match.end(1), 'depth')
+    return question
+
+def _extract_float_id(question, params):
+    match = _FLOAT_ID_PATTERN.search(question)
+    if not match:
+        return question
+    if match.group(1):
+        params['float_id'] = match.group(1)
+        return _mask(question, match.start(1), match.end(1), 'floatid')
+    params['float_id'] = match.group(2)
+    return _mask(question, match.start(), match.end(), 'floatid')
+
+def _extract_date_range(question, params):
+    for pattern in _DATE_RANGE_PATTERNS:
+        match = pattern.search(question)
+        if not match:
+            continue
+        start, _ = _date_bounds(match.group(1))
+        if match.group(2):
+            _, end = _date_bounds(match.group(2))
+        elif pattern is _DATE_RANGE_PATTERNS[1]:
+            end = "9999-12-31"
+        else:
+            _, end = _date_bounds(match.group(1))
+        params['start_date'], params['end_date'] = start, end
+        return _mask(question, match.start(), match.end(), 'daterange')
+    return question
+
+def _extract_bbox(question, params):
+    match = _LAT_LON_RANGE_PATTERN.search(question)
+    if match:
+        lats = sorted(float(v) for v in match.group(1, 2))
+        lons = sorted(float(v) for v in match.group(3, 4))
+        span = (match.start(), match.end())
+    else:
+        coords = list(_HEMISPHERE_PATTERN.finditer(question))
+        lats = [float(m.group(1)) * (-1 if m.group(2).upper() == 'S' else 1) for m in coords if m.group(2).upper() in 'NS']
+        lons = [float(m.group(1)) * (-1 if m.group(2).upper() == 'W' else 1) for m in coords if m.group(2).upper() in 'EW']
+        if len(lats) == 2 and len(lons) == 2:
+            lats, lons = sorted(lats), sorted(lons)
+            span = (coords[0].start(), coords[-1].end())
+        else:
+            region = _REGION_PATTERN.search(question)
+            if not region:
+                return question
+            lat_min, lat_max, lon_min, lon_max = REGION_BOXES[region.group(1).lower()]
+            lats, lons = [lat_min, lat_max], [lon_min, lon_max]
+            span = (region.start(), region.end())
+    params['lat_min'], params['lat_max'] = lats
+    params['lon_min'], params['lon_max'] = lons
+    return _mask(question, span[0], span[1], 'bbox')
+
+def _extract_point(question, params):
+    match = _LAT_LON_POINT_PATTERN.search(question)
+    if match:
+        lat, lon = float(match.group(1)), float(match.group(2))
+        span = (match.start(), match.end())
+    else:
+        coords = list(_HEMISPHERE_PATTERN.finditer(question))
+        lats = [float(m.group(1)) * (-1 if m.group(2).upper() == 'S' else 1) for m in coords if m.group(2).upper() in 'NS']
+        lons = [float(m.group(1)) * (-1 if m.group(2).upper() == 'W' else 1) for m in coords if m.group(2).upper() in 'EW']
+        if len(lats) != 1 or len(lons) != 1:
+            return question
+        lat, lon = lats[0], lons[0]
+        span = (coords[0].start(), coords[-1].end())
+    if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+        return question
+    params['lat'], params['lon'] = lat, lon
+    params.update(point_window(lat, lon))
+    return _mask(question, span[0], span[1], 'point')
+
+def extract_slots(question: str):
+    """
+    Pulls typed values out of a question and replaces each with its placeholder.
+    Returns (masked question, params), e.g. "where is float 2902746" ->
+    ("where is float {floatid}", {'float_id': '2902746'}).
+    Depths are extracted before float IDs and dates so their numbers are not reused,
+    and a bounding box before a single point. A depth given without a unit is only
+    taken last, from a number no other slot has claimed.
+    """
+    params = {}
+    masked = question
+    for extract in (_extract_depth_range, _extract_depth, _extract_bbox, _extract_point, _extract_float_id, _extract_date_range, _extract_bare_depth):
+        masked = extract(masked, params)
+    return masked, params
+
+class TemplateEngine:
+    """
+    Answers questions from a {template question: SQL} library whose questions may
+    contain placeholders ({floatid}, {depth}, {depthrange}, {daterange}, {bbox}, {point}). The incoming
+    question is masked with extract_slots, fuzzy-matched against the templates with the
+    same placeholders, and the extracted values are returned as named parameters for the template's SQL.
+    """
+
+    def __init__(self, templates: dict):
+        self.templates = templates
+        self._placeholders = {q: frozenset(_PLACEHOLDER_PATTERN.findall(q)) for q in templates}
+        # One matcher per placeholder set: a question is only scored against templates that use
+        # exactly the slots extracted from it, so "... between 10N and 20N, 60E and 70E" can never
+        # lose to the unbounded "what is the average temperature" and silently drop its bbox.
+        groups = {}
+        for question, slots in self._placeholders.items():
+            groups.setdefault(slots, []).append(question)
+        self.matchers = {slots: TemplateMatcher(questions) for slots, questions in groups.items()}
+
+    def resolve(self, question: str, score_cutoff: float = 80):
+        """Returns (template question, SQL, params, score), or None if no template fits."""
+        masked, extracted = extract_slots(question)
+        slots = frozenset(_PLACEHOLDER_PATTERN.findall(masked))
+        matcher = self.matchers.get(slots)
+        match = matcher.match(masked, score_cutoff=score_cutoff) if matcher is not None else None
+        if match is None:
+            return None
+        template, score = match
+        names = [name for slot in slots for name in SLOT_PARAMS[slot]]
+        return template, self.templates[template], {name: extracted[name] for name in names}, score
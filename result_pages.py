@@ -0,0 +1,100 @@
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+class ResultPages:
+    """
+    Query results that clients read page by page through an opaque handle.
+    Each entry wraps a `fetch(n)` callable, typically the `fetchmany` of a
+    still-open SQLite cursor, so only the page being sent is ever in memory.
+    Entries idle for more than `ttl` seconds are closed, as is the least
+    recently used entry once more than `max_open` are open (each may hold a pooled connection).
+    """
+
+    def __init__(self, max_open: int = 8, ttl: float = 300):
+        self.max_open = max_open
+        self.ttl = ttl
+        self._entries = OrderedDict()  # handle -> entry dict
+        self._lock = threading.Lock()
+        self._counters = {'opened': 0, 'pages': 0, 'rows': 0, 'expired': 0, 'evicted': 0}
+
+    def open(self, columns, fetch, close=None, offset: int = 0) -> str:
+        """Registers a partially read result whose first `offset` rows were already sent, and returns its handle."""
+        handle = uuid.uuid4().hex
+        entry = {'columns': list(columns), 'fetch': fetch, 'close': close, 'offset': offset,
+                 'last_used': time.monotonic(), 'lock': threading.RLock(), 'closed': False}
+        with self._lock:
+            stale = self._expire()
+            self._entries[handle] = entry
+            while len(self._entries) > self.max_open:
+                stale.append(self._entries.popitem(last=False)[1])
+                self._counters['evicted'] += 1
+            self._counters['opened'] += 1
+        for old in stale:
+            _close(old)
+        return handle
+
+    def fetch(self, handle: str, size: int) -> dict:
+        """
+        Next page of a result: {'columns', 'rows', 'offset', 'done'}; `offset` is the
+        position of the page's first row. Raises KeyError for unknown or expired handles.
+        A handle is closed as soon as its last page has been read.
+        """
+        with self._lock:
+            stale = self._expire()
+            entry = self._entries.get(handle)
+            if entry is not None:
+                entry['last_used'] = time.monotonic()
+                self._entries.move_to_end(handle)
+        for old in stale:
+            _close(old)
+        if entry is None:
+            raise KeyError(handle)
+
+        with entry['lock']:
+            if entry['closed']:
+                raise KeyError(handle)
+            try:
+                rows = [list(row) for row in entry['fetch'](size)]
+            except Exception:
+                self.close(handle)
+                raise
+            offset = entry['offset']
+            entry['offset'] += len(rows)
+        done = len(rows) < size
+        if done:
+            self.close(handle)
+        with self._lock:
+            self._counters['pages'] += 1
+            self._counters['rows'] += len(rows)
+        return {'columns': entry['columns'], 'rows': rows, 'offset': offset, 'done': done}
+
+    def close(self, handle: str):
+        with self._lock:
+            entry = self._entries.pop(handle, None)
+        if entry is not None:
+            _close(entry)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {**self._counters, 'open': len(self._entries), 'max_open': self.max_open}
+
+    def _expire(self):
+        """Removes idle entries and returns them for closing outside the lock (caller holds the lock)."""
+        cutoff = time.monotonic() - self.ttl
+        stale = [handle for handle, entry in self._entries.items() if entry['last_used'] < cutoff]
+        self._counters['expired'] += len(stale)
+        return [self._entries.pop(handle) for handle in stale]
+
+def _close(entry):
+    # Waits for a fetch in progress on the same entry before closing its cursor.
+    with entry['lock']:
+        if entry['closed']:
+            return
+        entry['closed'] = True
+        if entry['close'] is not None:
+            try:
+                entry['close']()
+            except Exception as e:
+                print(f"⚠️ Could not close result cursor: {e}")
@@ -0,0 +1,99 @@
+import re
+import threading
+from collections import OrderedDict
+import numpy as np
+
+_NUMBER_PATTERN = re.compile(r"-?\d+(?:\.\d+)?")
+
+def _numbers(question: str) -> tuple:
+    """Numeric literals in a question (float IDs, depths, dates), which embeddings barely distinguish."""
+    return tuple(sorted(_NUMBER_PATTERN.findall(question)))
+
+class SemanticCache:
+    """
+    Remembers SQL generated for past questions and returns it for new questions
+    whose embedding is close enough (cosine similarity >= `threshold`) and that
+    mention exactly the same numbers, so "float 2902746" never reuses the SQL for another float.
+    Vectors live in a fixed-size ring buffer, so lookup is one matrix-vector
+    product and the oldest entry is overwritten once `capacity` is reached.
+    `embed` is any callable mapping a string to a vector, e.g. HuggingFaceEmbeddings.embed_query.
+    """
+
+    def __init__(self, embed, threshold: float = 0.92, capacity: int = 5000, recent_embeddings: int = 256):
+        self.embed = embed
+        self.threshold = threshold
+        self.capacity = capacity
+        self._vectors = None  # (capacity, dim) float32, allocated on first add
+        self._questions = [None] * capacity
+        self._numbers = [None] * capacity
+        self._queries = [None] * capacity
+        self._size = 0
+        self._next = 0
+        # Embeddings computed during lookup, reused by add() for the same question.
+        self._recent = OrderedDict()
+        self._recent_limit = recent_embeddings
+        self._lock = threading.Lock()
+        self._counters = {'hits': 0, 'misses': 0, 'stored': 0}
+
+    def _embedding(self, question: str) -> np.ndarray:
+        with self._lock:
+            vector = self._recent.get(question)
+        if vector is not None:
+            return vector
+
+        vector = np.asarray(self.embed(question), dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        if norm > 0:
+            vector /= norm
+        with self._lock:
+            self._recent[question] = vector
+            if len(self._recent) > self._recent_limit:
+                self._recent.popitem(last=False)
+        return vector
+
+    def lookup(self, question: str):
+        """Returns the cached SQL for the most similar past question, or None."""
+        vector = self._embedding(question)
+        with self._lock:
+            if self._size == 0:
+                self._counters['misses'] += 1
+                return None
+            scores = self._vectors[:self._size] @ vector
+            numbers = _numbers(question)
+            candidates = np.flatnonzero(scores >= self.threshold)
+            for slot in candidates[np.argsort(-scores[candidates])]:
+                if self._numbers[slot] == numbers:
+                    self._counters['hits'] += 1
+                    print(f"➡️ Semantic cache hit ({scores[slot]:.3f}) for '{self._questions[slot]}'")
+                    return self._queries[slot]
+            self._counters['misses'] += 1
+            return None
+
+    def add(self, question: str, sql_query: str):
+        """Stores the SQL that answered `question`, replacing an identical question's entry."""
+        vector = self._embedding(question)
+        with self._lock:
+            if self._vectors is None:
+                self._vectors = np.zeros((self.capacity, vector.shape[0]), dtype=np.float32)
+            try:
+                slot = self._questions.index(question, 0, self._size)
+            except ValueError:
+                slot = self._next
+                self._next = (self._next + 1) % self.capacity
+                self._size = min(self._size + 1, self.capacity)
+            self._vectors[slot] = vector
+            self._questions[slot] = question
+            self._numbers[slot] = _numbers(question)
+            self._queries[slot] = sql_query
+            self._counters['stored'] += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self._counters['hits'] + self._counters['misses']
+            return {
+                **self._counters,
+                'hit_rate': round(self._counters['hits'] / lookups, 4) if lookups else 0.0,
+                'entries': self._size,
+                'capacity': self.capacity,
+                'threshold': self.threshold,
+            }
@@ -0,0 +1,57 @@
+import math
+
+# R*Tree over profile positions, written by main.py; each profile is a point box (min = max).
+SPATIAL_TABLE = 'profile_positions'
+EARTH_RADIUS_KM = 6371.0088
+NEAREST_WINDOW_DEG = 10.0 # Half-height of the window searched for nearest-profile questions
+_NO_LONGITUDES = (181.0, 181.0) # Longitude range no profile can overlap
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    """Great-circle distance in kilometres; None if any coordinate is missing."""
+    if None in (lat1, lon1, lat2, lon2):
+        return None
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+def register_spatial_functions(dbapi_connection):
+    """Makes haversine_km(lat1, lon1, lat2, lon2) available to SQL on a sqlite3 connection."""
+    dbapi_connection.create_function('haversine_km', 4, haversine_km, deterministic=True)
+
+def bbox_condition(alias: str = 'p', lon_min: str = 'lon_min', lon_max: str = 'lon_max') -> str:
+    """
+    R*Tree filter for profiles inside :lat_min/:lat_max and the longitude range named by
+    `lon_min`/`lon_max`. Written as an overlap test because the R*Tree rounds stored
+    coordinates outward to 32-bit floats.
+    """
+    return (f"{alias}.max_lat >= :lat_min AND {alias}.min_lat <= :lat_max "
+            f"AND {alias}.max_lon >= :{lon_min} AND {alias}.min_lon <= :{lon_max}")
+
+def window_condition(alias: str = 'p') -> str:
+    """
+    R*Tree filter for the profiles inside a point_window: its main range, or the part of
+    the window across the antimeridian. Each side of the OR is a full R*Tree query.
+    """
+    return f"(({bbox_condition(alias)}) OR ({bbox_condition(alias, 'lon_min_wrap', 'lon_max_wrap')}))"
+
+def point_window(lat: float, lon: float, radius_deg: float = NEAREST_WINDOW_DEG) -> dict:
+    """
+    Bounding-box params around a point, `radius_deg` tall and correspondingly wider
+    at high latitudes so it spans roughly the same distance east-west.
+    A window crossing ±180° is split in two longitude ranges; the second
+    (lon_min_wrap/lon_max_wrap) is empty when it does not.
+    """
+    lon_radius = min(radius_deg / max(math.cos(math.radians(min(abs(lat) + radius_deg, 89.0))), 1e-6), 180.0)
+    west, east = lon - lon_radius, lon + lon_radius
+    wrap = _NO_LONGITUDES
+    if lon_radius >= 180.0:
+        west, east = -180.0, 180.0
+    elif west < -180.0:
+        wrap = (west + 360.0, 180.0)
+    elif east > 180.0:
+        wrap = (-180.0, east - 360.0)
+    return {
+        'lat_min': max(lat - radius_deg, -90.0), 'lat_max': min(lat + radius_deg, 90.0),
+        'lon_min': max(west, -180.0), 'lon_max': min(east, 180.0),
+        'lon_min_wrap': wrap[0], 'lon_max_wrap': wrap[1],
+    }
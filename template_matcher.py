@@ -0,0 +1,63 @@
+from collections import defaultdict
+import numpy as np
+from rapidfuzz import fuzz, process
+from rapidfuzz.utils import default_process
+
+def _trigrams(text: str) -> set:
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+class TemplateMatcher:
+    """
+    Fuzzy matcher for a large library of template questions.
+    A character-trigram inverted index shortlists the `max_candidates` templates that
+    share the most trigrams with the question; only those are scored with rapidfuzz
+    WRatio (the same scorer thefuzz.process.extractOne uses, with scores rounded to
+    integers the same way). Exact matches skip scoring.
+    """
+
+    def __init__(self, templates, max_candidates: int = 64):
+        self.templates = list(templates)
+        self.max_candidates = max_candidates
+        self._processed = [default_process(t) for t in self.templates]
+        self._exact = {p: i for i, p in enumerate(self._processed)}
+
+        postings = defaultdict(list)
+        for i, text in enumerate(self._processed):
+            for gram in _trigrams(text):
+                postings[gram].append(i)
+        self._postings = {gram: np.array(ids, dtype=np.int32) for gram, ids in postings.items()}
+
+    def __len__(self):
+        return len(self.templates)
+
+    def candidates(self, processed_question: str) -> np.ndarray:
+        """Indices of the templates sharing the most trigrams with the question."""
+        lists = [self._postings[g] for g in _trigrams(processed_question) if g in self._postings]
+        if not lists:
+            return np.empty(0, dtype=np.int32)
+        counts = np.bincount(np.concatenate(lists), minlength=len(self.templates))
+        hit = np.flatnonzero(counts)
+        if len(hit) <= self.max_candidates:
+            return hit
+        top = np.argpartition(counts[hit], -self.max_candidates)[-self.max_candidates:]
+        return hit[top]
+
+    def match(self, question: str, score_cutoff: float = 0):
+        """Returns (template, score) for the best-scoring template, or None if nothing reaches `score_cutoff`."""
+        processed = default_process(question)
+        exact = self._exact.get(processed)
+        if exact is not None:
+            return self.templates[exact], 100
+
+        shortlist = self.candidates(processed)
+        if len(shortlist) == 0:
+            return None
+        result = process.extractOne(
+            processed, [self._processed[i] for i in shortlist],
+            scorer=fuzz.WRatio, processor=None, score_cutoff=score_cutoff,
+        )
+        if result is None:
+            return None
+        _, score, position = result
+        return self.templates[shortlist[position]], int(round(score))
@@ -0,0 +1,54 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import create_engine
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import add_indexed
+import backend
+import main
+from query_log import QueryLog
+
+def _casts(float_id, casts=20, levels=10):
+    rng = np.random.default_rng(int(float_id))
+    return pd.DataFrame({
+        'float_id': float_id,
+        'profile_id': np.repeat(np.arange(casts), levels),
+        'level': np.tile(np.arange(levels), casts),
+        'PRES': np.tile(np.linspace(5, 1500, levels), casts),
+        'TEMP': rng.uniform(2, 30, casts * levels), 'PSAL': rng.uniform(33, 37, casts * levels),
+        'LATITUDE': np.repeat(rng.uniform(-10, 20, casts), levels),
+        'LONGITUDE': np.repeat(rng.uniform(60, 95, casts), levels),
+        'TIME': np.repeat(pd.date_range('2020-01-01', periods=casts, freq='10D'), levels),
+    })
+
+def test_advisor_replays_a_log_with_spatial_queries(tmp_path, capsys):
+    db_path = str(tmp_path / 'argo.db')
+    engine = create_engine(f"sqlite:///{db_path}")
+    main.prepare_database(engine, full_refresh=True)
+    for n, float_id in enumerate(['1900101', '1900102']):
+        main.upsert_file_rows(engine, f"f{n}.nc", (0, 0.0, str(n)), _casts(float_id), main.BATCH_SIZE)
+    engine.dispose()
+
+    log = QueryLog(str(tmp_path / 'query_log.jsonl'))
+    bbox = {'lat_min': -5.0, 'lat_max': 15.0, 'lon_min': 65.0, 'lon_max': 90.0}
+    log.record(backend.PREDEFINED_QUERIES["what is the average temperature in {bbox}"], bbox)
+    log.record(backend.PREDEFINED_QUERIES["which floats are nearest to {point}"], {'lat': 5.0, 'lon': 75.0, **bbox})
+    log.record("SELECT AVG(TEMP) FROM profiles WHERE TEMP > 25")
+
+    add_indexed.advise(db_path, log.path)
+    out = capsys.readouterr().out
+    assert 'idx_auto_profile_positions' not in out
+    assert 'idx_auto_measurements_temp' in out
+
+def test_describe_schema_skips_the_rtree(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'argo.db'}")
+    main.prepare_database(engine, full_refresh=True)
+    with engine.connect() as conn:
+        columns, _, _, _ = add_indexed.describe_schema(conn.connection.dbapi_connection)
+    engine.dispose()
+    assert 'measurements' in columns
+    assert not [table for table in columns if table.startswith('profile_positions')]
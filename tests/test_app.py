@@ -0,0 +1,86 @@
+import json
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+from sqlalchemy import create_engine, event
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app
+import backend
+import main
+from query_cache import QueryCache
+
+CASTS, LEVELS = 9, 50
+TABLE_SQL = "SELECT float_id, profile_id, PRES FROM profiles ORDER BY profile_id, PRES"
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    db_path = str(tmp_path / 'argo.db')
+    engine = create_engine(f"sqlite:///{db_path}")
+    main.prepare_database(engine, full_refresh=True)
+    df = pd.DataFrame({
+        'float_id': '1900101', 'profile_id': np.repeat(np.arange(CASTS), LEVELS), 'level': np.tile(np.arange(LEVELS), CASTS),
+        'PRES': np.tile(np.linspace(5, 2000, LEVELS), CASTS), 'TEMP': 20.0, 'PSAL': 35.0, 'LATITUDE': 10.0, 'LONGITUDE': 70.0,
+        'TIME': np.repeat(pd.date_range('2020-01-01', periods=CASTS, freq='10D'), LEVELS),
+    })
+    main.upsert_file_rows(engine, 'f0.nc', (0, 0.0, '0'), df, main.BATCH_SIZE)
+    engine.dispose()
+
+    engine = create_engine(f"sqlite:///{db_path}", connect_args={"check_same_thread": False})
+    event.listen(engine, "connect", backend.apply_sqlite_pragmas)
+    monkeypatch.setattr(backend, 'engine', engine)
+    monkeypatch.setattr(backend, 'result_cache', QueryCache(64 * 1024 * 1024))
+    monkeypatch.setattr(backend, 'query_log', None)
+    monkeypatch.setattr(backend, 'PARQUET_PATH', str(tmp_path / 'no_parquet'))
+    monkeypatch.setattr(backend, 'get_sql_query', lambda question: (TABLE_SQL, {}))
+    monkeypatch.setattr(backend, 'remember_query', lambda question, sql: None)
+    monkeypatch.setattr(backend, 'generate_summary', lambda question, df: "summary")
+    yield app.app.test_client()
+    engine.dispose()
+
+def test_table_pages_until_done_then_the_handle_is_gone(client):
+    first = client.post('/chat', json={'question': 'list the levels'}).get_json()
+    assert first['response_type'] == 'table' and first['has_more']
+    handle, page_size = first['result_handle'], first['page_size']
+    assert page_size == backend.TABLE_PAGE_SIZE
+
+    pages = []
+    while not (pages and pages[-1]['done']):
+        response = client.get(f"/results/{handle}?page_size={page_size}")
+        assert response.status_code == 200
+        pages.append(response.get_json())
+    total = CASTS * LEVELS
+    assert [page['offset'] for page in pages] == list(range(page_size, total, page_size))
+    assert sum(len(page['rows']) for page in pages) == total - page_size
+    assert pages[-1]['rows'][-1] == ['1900101', CASTS - 1, 2000.0]
+
+    assert client.get(f"/results/{handle}").status_code == 404
+    assert backend.result_pages.stats()['open'] == 0
+
+def _events(response):
+    return [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+
+def test_stream_sends_sql_result_summary_then_done(client, monkeypatch):
+    monkeypatch.setattr(backend, 'stream_summary', lambda question, df: iter(["The float ", "dived ", "to 2000 dbar."]))
+    response = client.post('/chat/stream', json={'question': 'list the levels'})
+    assert response.mimetype == 'application/x-ndjson'
+    events = _events(response)
+    assert [event['event'] for event in events] == ['sql', 'result', 'summary', 'summary', 'summary', 'done']
+    assert events[0]['sql_query'] == TABLE_SQL
+    assert events[1]['response_type'] == 'table' and events[1]['has_more']
+    assert "".join(event['delta'] for event in events[2:5]) == "The float dived to 2000 dbar."
+    client.delete(f"/results/{events[1]['result_handle']}")
+
+def test_stream_failure_before_the_result_releases_the_handle(client, monkeypatch):
+    def fail(*args):
+        raise RuntimeError("chart failed")
+    monkeypatch.setattr(backend, 'stream_summary', lambda question, df: iter([]))
+    monkeypatch.setattr(app, 'build_result_payload', fail)
+    events = _events(client.post('/chat/stream', json={'question': 'list the levels'}))
+    assert [event['event'] for event in events] == ['sql', 'error']
+    assert 'chart failed' in events[1]['message']
+    assert backend.result_pages.stats()['open'] == 0
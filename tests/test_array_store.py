@@ -0,0 +1,70 @@
+import os
+import sqlite3
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+from sqlalchemy import create_engine
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import backend
+import main
+from array_store import ArrayStore, current_snapshot
+
+FLOAT_ID = '1900101'
+CASTS = 12
+LEVELS = 60 # 720 rows, so LIMIT 500 cuts the float's history short
+
+def _casts(float_id, times, first_profile_id=1):
+    rng = np.random.default_rng(int(float_id))
+    frames = []
+    for i, time in enumerate(times):
+        pres = np.sort(rng.uniform(5, 2000, LEVELS))
+        frames.append(pd.DataFrame({
+            'float_id': float_id, 'profile_id': first_profile_id + i, 'level': np.arange(LEVELS),
+            'PRES': pres, 'TEMP': rng.uniform(2, 30, LEVELS), 'PSAL': rng.uniform(33, 37, LEVELS),
+            'LATITUDE': rng.uniform(-10, 20), 'LONGITUDE': rng.uniform(60, 95), 'TIME': pd.Timestamp(time),
+        }))
+    return pd.concat(frames, ignore_index=True)
+
+@pytest.fixture(scope='module')
+def database(tmp_path_factory):
+    root = tmp_path_factory.mktemp('argo')
+    db_path = str(root / 'argo.db')
+    engine = create_engine(f"sqlite:///{db_path}")
+    main.prepare_database(engine, full_refresh=True)
+    # Newer casts are ingested first, so profile_key order is the reverse of time order.
+    times = pd.date_range('2020-01-01', periods=CASTS, freq='10D')
+    for n, chunk in enumerate(np.array_split(np.arange(CASTS)[::-1], 3)):
+        df = _casts(FLOAT_ID, times[chunk], first_profile_id=int(chunk[0]) + 1)
+        main.upsert_file_rows(engine, f"file{n}.nc", (0, 0.0, str(n)), df, main.BATCH_SIZE)
+    main.upsert_file_rows(engine, "other.nc", (0, 0.0, 'o'), _casts('1900102', times[:3]), main.BATCH_SIZE)
+    main.write_array_store(engine, str(root / 'arrays'))
+    store = ArrayStore(current_snapshot(str(root / 'arrays')))
+    conn = sqlite3.connect(db_path)
+    yield store, conn
+    conn.close()
+    engine.dispose()
+
+@pytest.mark.parametrize('template, params', [
+    ("show the profile of float {floatid}", {}),
+    ("show the profile of float {floatid} deeper than {depth}", {'depth': 500.0}),
+    ("list all data for float {floatid}", {}),
+])
+def test_array_store_matches_sql(database, template, params):
+    store, conn = database
+    query = backend.PREDEFINED_QUERIES[template]
+    params = {'float_id': FLOAT_ID, **params}
+    from_arrays = backend.ARRAY_STORE_QUERIES[query](store, params)
+    from_sql = pd.read_sql(query, conn, params=params)
+    assert len(from_sql) == 500
+    pd.testing.assert_frame_equal(from_arrays, from_sql)
+
+def test_array_store_unknown_float_is_empty(database):
+    store, conn = database
+    query = backend.PREDEFINED_QUERIES["show the profile of float {floatid}"]
+    from_arrays = backend.ARRAY_STORE_QUERIES[query](store, {'float_id': '1'})
+    assert from_arrays.empty
+    assert pd.read_sql(query, conn, params={'float_id': '1'}).empty
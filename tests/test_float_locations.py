@@ -0,0 +1,42 @@
+import os
+import sqlite3
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+from sqlalchemy import create_engine
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import backend
+import main
+
+# (TIME, LATITUDE, LONGITUDE) of each cast, stored out of time order.
+CASTS = {
+    '1900101': [('2020-01-15', 11.0, 81.0), ('2021-03-01', 40.0, 150.0), ('2020-02-01', 12.0, 82.0), ('2020-01-01', 10.0, 80.0)],
+    '1900102': [('2020-01-20', 15.0, 85.0), ('2020-01-10', 14.0, 84.0)],
+}
+
+@pytest.fixture(scope='module')
+def conn(tmp_path_factory):
+    db_path = str(tmp_path_factory.mktemp('argo') / 'argo.db')
+    engine = create_engine(f"sqlite:///{db_path}")
+    main.prepare_database(engine, full_refresh=True)
+    for n, (float_id, casts) in enumerate(CASTS.items()):
+        df = pd.concat([pd.DataFrame({'float_id': float_id, 'profile_id': i, 'level': np.arange(3), 'PRES': [5.0, 50.0, 500.0],
+                                      'TEMP': 20.0, 'PSAL': 35.0, 'LATITUDE': lat, 'LONGITUDE': lon, 'TIME': pd.Timestamp(time)})
+                        for i, (time, lat, lon) in enumerate(casts)], ignore_index=True)
+        main.upsert_file_rows(engine, f"f{n}.nc", (0, 0.0, str(n)), df, main.BATCH_SIZE)
+    engine.dispose()
+    conn = sqlite3.connect(db_path)
+    yield conn
+    conn.close()
+
+@pytest.mark.parametrize('template, params', [
+    ("plot float locations {daterange}", {'start_date': '2020-01-01', 'end_date': '2020-03-01'}),
+    ("plot float locations in {bbox}", {'lat_min': 0.0, 'lat_max': 20.0, 'lon_min': 70.0, 'lon_max': 90.0}),
+])
+def test_float_locations_are_each_floats_latest_matching_cast(conn, template, params):
+    found = pd.read_sql(backend.PREDEFINED_QUERIES[template], conn, params=params)
+    assert found.values.tolist() == [['1900101', 12.0, 82.0], ['1900102', 15.0, 85.0]]
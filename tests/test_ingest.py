@@ -0,0 +1,71 @@
+import os
+import sqlite3
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+from sqlalchemy import create_engine
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import main
+
+def _casts(float_id, casts=4, levels=6):
+    rng = np.random.default_rng(int(float_id))
+    return pd.DataFrame({
+        'float_id': float_id,
+        'profile_id': np.repeat(np.arange(casts), levels),
+        'level': np.tile(np.arange(levels), casts),
+        'PRES': np.tile(np.linspace(5, 1000, levels), casts),
+        'TEMP': rng.uniform(2, 30, casts * levels), 'PSAL': rng.uniform(33, 37, casts * levels),
+        'LATITUDE': np.repeat(rng.uniform(-10, 20, casts), levels),
+        'LONGITUDE': np.repeat(rng.uniform(60, 95, casts), levels),
+        'TIME': np.repeat(pd.date_range('2020-01-01', periods=casts, freq='10D'), levels),
+    })
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'argo.db'}")
+    main.prepare_database(engine, full_refresh=True)
+    yield engine
+    engine.dispose()
+
+def _version(engine):
+    with engine.connect() as conn:
+        return conn.exec_driver_sql("SELECT version FROM data_version WHERE id = 1").scalar()
+
+def test_upsert_bumps_the_data_version_with_the_rows(engine):
+    before = _version(engine)
+    main.upsert_file_rows(engine, 'f0.nc', (0, 0.0, '0'), _casts('1900101'), main.BATCH_SIZE)
+    assert _version(engine) == before + 1
+
+def test_failed_upsert_keeps_rows_and_version(engine):
+    main.upsert_file_rows(engine, 'f0.nc', (0, 0.0, '0'), _casts('1900101'), main.BATCH_SIZE)
+    before = _version(engine)
+    with pytest.raises(KeyError):
+        main.upsert_file_rows(engine, 'f0.nc', (0, 0.0, '1'), _casts('1900101').drop(columns='PSAL'), main.BATCH_SIZE)
+    assert _version(engine) == before
+    with engine.connect() as conn:
+        assert conn.exec_driver_sql("SELECT COUNT(*) FROM profiles").scalar() == len(_casts('1900101'))
+
+def _profiles(engine):
+    df = pd.read_sql("SELECT * FROM profiles", engine)
+    df['TIME'] = pd.to_datetime(df['TIME'])
+    return df[main.PROFILE_COLUMNS].sort_values(['float_id', 'profile_id', 'PRES']).reset_index(drop=True)
+
+def _expected(*frames):
+    df = pd.concat(frames, ignore_index=True)[main.PROFILE_COLUMNS]
+    df['TIME'] = df['TIME'].astype('datetime64[us]')
+    return df.sort_values(['float_id', 'profile_id', 'PRES']).reset_index(drop=True)
+
+def test_profiles_view_matches_the_ingested_rows(engine):
+    first, second = _casts('1900101'), _casts('1900102', casts=3)
+    main.upsert_file_rows(engine, 'f0.nc', (0, 0.0, '0'), first, main.BATCH_SIZE)
+    main.upsert_file_rows(engine, 'f1.nc', (0, 0.0, '1'), second, main.BATCH_SIZE)
+    pd.testing.assert_frame_equal(_profiles(engine), _expected(first, second), check_dtype=False)
+
+    # A changed file replaces its rows: the dropped cast and old values must not linger.
+    changed = first[first['profile_id'] != 3].assign(TEMP=lambda df: df['TEMP'] + 1)
+    main.upsert_file_rows(engine, 'f0.nc', (0, 0.0, '2'), changed, main.BATCH_SIZE)
+    pd.testing.assert_frame_equal(_profiles(engine), _expected(changed, second), check_dtype=False)
@@ -0,0 +1,53 @@
+import os
+import sqlite3
+import sys
+
+import duckdb
+import numpy as np
+import pandas as pd
+from sqlalchemy import create_engine
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import main
+
+# JULD is days since 1950-01-01; decoding this one leaves nanosecond digits (…59.999423956).
+JULD = 27394.354166660
+
+def _casts(float_id, casts=3, levels=5):
+    time = pd.Timestamp('1950-01-01') + pd.to_timedelta(JULD, 'D')
+    return pd.DataFrame({
+        'float_id': float_id,
+        'profile_id': np.repeat(np.arange(casts), levels),
+        'level': np.tile(np.arange(levels), casts),
+        'PRES': np.tile(np.linspace(5, 500, levels), casts),
+        'TEMP': 20.0, 'PSAL': 35.0, 'LATITUDE': 10.0, 'LONGITUDE': 70.0,
+        'TIME': np.repeat([time + pd.Timedelta(days=i) for i in range(casts)], levels),
+    })
+
+def _ingest(engine, parquet_dir, path, df):
+    moved = main.upsert_file_rows(engine, path, (0, 0.0, path), df, main.BATCH_SIZE)
+    main.write_parquet_parts(parquet_dir, path, df)
+    for old_path, casts in moved.items():
+        main.remove_parquet_casts(parquet_dir, old_path, casts)
+    return moved
+
+def test_rehomed_casts_with_sub_microsecond_time_leave_old_parts(tmp_path):
+    db_path = str(tmp_path / 'argo.db')
+    parquet_dir = str(tmp_path / 'parquet')
+    engine = create_engine(f"sqlite:///{db_path}")
+    main.prepare_database(engine, full_refresh=True)
+    df = _casts('1900101')
+    assert df['TIME'].dt.nanosecond.iloc[0] != 0
+
+    _ingest(engine, parquet_dir, '/data/f0.nc', df)
+    moved = _ingest(engine, parquet_dir, '/data/f4.nc', df)
+    engine.dispose()
+    assert list(moved) == ['/data/f0.nc']
+
+    with sqlite3.connect(db_path) as conn:
+        sqlite_times = sorted(t for (t,) in conn.execute("SELECT DISTINCT TIME FROM profiles"))
+        assert conn.execute("SELECT COUNT(*) FROM profiles").fetchone()[0] == len(df)
+    parquet = duckdb.sql(f"SELECT TIME FROM read_parquet('{parquet_dir}/*/*/*.parquet')").df()
+    assert len(parquet) == len(df)
+    assert sorted(parquet['TIME'].dt.strftime(main.TIME_FORMAT).unique()) == sqlite_times
@@ -0,0 +1,40 @@
+import os
+import sqlite3
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from main import SCHEMA_DDL
+from query_guard import QueryRejected, review_plan, table_aliases
+
+@pytest.fixture
+def conn():
+    conn = sqlite3.connect(':memory:')
+    for statement in SCHEMA_DDL:
+        conn.execute(statement)
+    conn.execute("CREATE INDEX idx_measurements_temp_pres ON measurements (TEMP, PRES)")
+    yield conn
+    conn.close()
+
+def _review(conn, query):
+    plan = conn.execute(f"EXPLAIN QUERY PLAN {query}").fetchall()
+    return plan, review_plan(plan, table_aliases(query))
+
+def test_covering_index_scan_is_a_full_scan(conn):
+    plan, findings = _review(conn, "SELECT AVG(TEMP) FROM measurements m")
+    assert [row[3] for row in plan] == ['SCAN m USING COVERING INDEX idx_measurements_temp_pres']
+    assert findings == ['full scan of measurements (via index idx_measurements_temp_pres)']
+
+def test_nested_covering_index_scans_are_rejected(conn):
+    with pytest.raises(QueryRejected):
+        _review(conn, "SELECT a.TEMP FROM measurements a JOIN measurements b ON a.PRES + b.PRES > 3")
+
+def test_index_search_is_not_flagged(conn):
+    _, findings = _review(conn, "SELECT PRES FROM measurements WHERE TEMP > 20")
+    assert findings == []
+
+def test_plain_scan_of_large_table(conn):
+    plan = [(2, 0, 0, 'SCAN h')]
+    assert review_plan(plan, {'h': 'profile_headers'}) == ['full scan of profile_headers']
@@ -0,0 +1,51 @@
+import os
+import sqlite3
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+from sqlalchemy import create_engine
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import backend
+import main
+from query_templates import TemplateEngine
+from spatial import point_window, register_spatial_functions
+
+FLOATS = {'1900101': (10.0, 179.5), '1900102': (10.0, -179.5), '1900103': (10.0, 0.0)}
+
+@pytest.fixture(scope='module')
+def conn(tmp_path_factory):
+    db_path = str(tmp_path_factory.mktemp('argo') / 'argo.db')
+    engine = create_engine(f"sqlite:///{db_path}")
+    main.prepare_database(engine, full_refresh=True)
+    for n, (float_id, (lat, lon)) in enumerate(FLOATS.items()):
+        df = pd.DataFrame({'float_id': float_id, 'profile_id': 0, 'level': np.arange(3), 'PRES': [5.0, 50.0, 500.0],
+                           'TEMP': 20.0, 'PSAL': 35.0, 'LATITUDE': lat, 'LONGITUDE': lon, 'TIME': pd.Timestamp('2020-01-01')})
+        main.upsert_file_rows(engine, f"f{n}.nc", (0, 0.0, str(n)), df, main.BATCH_SIZE)
+    engine.dispose()
+    conn = sqlite3.connect(db_path)
+    register_spatial_functions(conn)
+    yield conn
+    conn.close()
+
+def test_window_across_the_antimeridian_is_split():
+    east = point_window(10.0, 178.0)
+    assert east['lon_max'] == 180.0 and east['lon_min_wrap'] == -180.0 and -180.0 < east['lon_max_wrap'] < 0
+    west = point_window(10.0, -178.0)
+    assert west['lon_min'] == -180.0 and west['lon_max_wrap'] == 180.0 and 0 < west['lon_min_wrap'] < 180.0
+
+def test_window_inside_the_map_has_an_empty_second_range():
+    window = point_window(10.0, 80.0)
+    assert -180.0 < window['lon_min'] < window['lon_max'] < 180.0
+    assert window['lon_min_wrap'] > 180.0
+
+@pytest.mark.parametrize('question', ["which floats are nearest to 10N 179.8E", "which floats are nearest to 10N 179.8W"])
+def test_nearest_floats_across_the_antimeridian(conn, question):
+    template, sql, params, _ = TemplateEngine(backend.PREDEFINED_QUERIES).resolve(question)
+    assert template == "which floats are nearest to {point}"
+    found = pd.read_sql(sql, conn, params=params)
+    assert sorted(found['float_id']) == ['1900101', '1900102']
+    assert (found['distance_km'] < 100).all()
@@ -0,0 +1,40 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import vector_db
+
+class MemoryCollection:
+    """The part of a Chroma collection's API load_examples uses, kept in a dict."""
+
+    def __init__(self, entries):
+        self.entries = dict(entries) # id -> metadata
+
+    def get(self, ids=None, where=None, include=None):
+        keys = [key for key in (ids if ids is not None else self.entries) if key in self.entries]
+        if where:
+            keys = [key for key in keys if all(self.entries[key].get(k) == v for k, v in where.items())]
+        return {'ids': keys}
+
+    def delete(self, ids):
+        for key in ids:
+            self.entries.pop(key, None)
+
+def _stored(examples, source):
+    return {vector_db.example_id(e['question'], e['query']): {'sql_query': e['query'], 'source': source} for e in examples}
+
+def test_load_removes_outdated_curated_examples_only():
+    current = vector_db.EXAMPLES
+    outdated = [{'question': "List all data for float with ID 1900085.", 'query': "SELECT * FROM profiles_old;"}]
+    learned = [{'question': "How deep does float 1900085 go?", 'query': "SELECT MAX(PRES) FROM profiles;"}]
+    collection = MemoryCollection({**_stored(current, 'curated'), **_stored(outdated, 'curated'), **_stored(learned, 'learned')})
+
+    stats = vector_db.load_examples(collection, iter(current))
+    assert stats['removed'] == 1 and stats['embedded'] == 0
+    assert set(collection.entries) == set(_stored(current, 'curated')) | set(_stored(learned, 'learned'))
+
+def test_keep_missing_leaves_the_stored_examples():
+    collection = MemoryCollection(_stored(vector_db.EXAMPLES, 'curated'))
+    stats = vector_db.load_examples(collection, iter(vector_db.EXAMPLES[:2]), prune=False)
+    assert stats['removed'] == 0 and len(collection.entries) == len(vector_db.EXAMPLES)
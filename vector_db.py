@@ -1,18 +1,30 @@
-import chromadb
-from langchain_community.embeddings import HuggingFaceEmbeddings
+import argparse
+import hashlib
+import json
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from datetime import datetime, timezone
 
-print("Initializing vector store...")
+# --- Configuration ---
+CHROMA_PATH = "./chroma_db"
+COLLECTION_NAME = "float-chat-rag-examples" # Collection the backend's retriever reads
+EMBEDDING_MODEL = "all-MiniLM-L6-v2"
+BATCH_SIZE = 256 # Questions embedded per call
+MAX_PENDING_PER_WORKER = 2 # Batches allowed in flight per embedding process
+LEGACY_IDS = [str(i) for i in range(8)] # Sequential IDs used by the first version of this script
 
 # These are high-quality examples of natural language questions and their corresponding SQL queries.
 # This is the "knowledge" our RAG system will draw from.
-examples = [
+EXAMPLES = [
     {
         "question": "Show me the five deepest measurements.",
         "query": "SELECT * FROM profiles ORDER BY PRES DESC LIMIT 5;"
     },
     {
         "question": "What is the average temperature?",
-        "query": "SELECT AVG(TEMP) as average_temperature FROM profiles;"
+        "query": "SELECT SUM(mean_temp * level_count) / SUM(level_count) as average_temperature FROM profile_summary;"
     },
     {
         "question": "List all data for float with ID 1900085.",
@@ -20,11 +32,11 @@ examples = [
     },
     {
         "question": "Find the maximum salinity recorded.",
-        "query": "SELECT MAX(PSAL) as max_salinity FROM profiles;"
+        "query": "SELECT MAX(max_psal) as max_salinity FROM profile_summary;"
     },
     {
         "question": "How many unique floats are there?",
-        "query": "SELECT COUNT(DISTINCT float_id) as unique_floats FROM profiles;"
+        "query": "SELECT COUNT(*) as unique_floats FROM float_summary;"
     },
     {
         "question": "Show me temperature and salinity profiles deeper than 1000 dbar.",
@@ -32,40 +44,177 @@ examples = [
     },
     {
         "question": "Plot all float locations.",
-        "query": "SELECT float_id, LATITUDE, LONGITUDE FROM profiles GROUP BY float_id;"
+        "query": "SELECT float_id, LATITUDE, LONGITUDE FROM float_summary;"
     },
     {
         "question": "What were the coordinates for the shallowest measurement?",
         "query": "SELECT LATITUDE, LONGITUDE, PRES FROM profiles ORDER BY PRES ASC LIMIT 1;"
+    },
+    {
+        "question": "What is the average salinity between 10N and 20N, 60E and 70E?",
+        "query": "SELECT AVG(m.PSAL) as average_salinity FROM profile_positions p JOIN measurements m ON m.profile_key = p.profile_key WHERE p.max_lat >= 10 AND p.min_lat <= 20 AND p.max_lon >= 60 AND p.min_lon <= 70;"
+    },
+    {
+        "question": "Which floats have been within 200 km of 12N 80E?",
+        "query": "SELECT f.float_id, MIN(haversine_km(12, 80, h.LATITUDE, h.LONGITUDE)) as distance_km FROM profile_positions p JOIN profile_headers h ON h.profile_key = p.profile_key JOIN floats f ON f.float_key = h.float_key WHERE p.max_lat >= 10 AND p.min_lat <= 14 AND p.max_lon >= 78 AND p.min_lon <= 82 GROUP BY f.float_id HAVING distance_km <= 200 ORDER BY distance_km;"
     }
 ]
 
-# Use a local embedding model
-embedding_function = HuggingFaceEmbeddings(model_name="all-MiniLM-L6-v2")
+def _normalize(text: str) -> str:
+    return re.sub(r"\s+", " ", text).strip().lower()
+
+def example_id(question: str, query: str) -> str:
+    """Content hash of a question/SQL pair, ignoring case and whitespace differences, used as its Chroma ID."""
+    return hashlib.sha256(f"{_normalize(question)}\n{_normalize(query)}".encode()).hexdigest()[:32]
+
+def iter_examples(path: str):
+    """Yields {'question', 'query'} dicts from a JSONL file, one object per line; bad lines are reported and skipped."""
+    with open(path, encoding='utf-8') as f:
+        for line_number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                example = json.loads(line)
+                question, query = example['question'].strip(), (example.get('query') or example['sql']).strip()
+            except (json.JSONDecodeError, KeyError, AttributeError, TypeError):
+                print(f"⚠️ Warning: Skipping malformed example on line {line_number} of '{path}'.")
+                continue
+            if question and query:
+                yield {'question': question, 'query': query}
+
+def iter_batches(examples, batch_size: int):
+    """Groups examples into lists of `batch_size`, dropping repeats of an example already seen in this run."""
+    seen, batch = set(), []
+    for example in examples:
+        key = example_id(example['question'], example['query'])
+        if key in seen:
+            continue
+        seen.add(key)
+        batch.append({**example, 'id': key})
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+# --- Embedding (in this process or in worker processes, one model per process) ---
+_embedding_function = None
+
+def load_embedding_function():
+    global _embedding_function
+    if _embedding_function is None:
+        from langchain_huggingface import HuggingFaceEmbeddings
+        _embedding_function = HuggingFaceEmbeddings(model_name=EMBEDDING_MODEL)
+    return _embedding_function
+
+def embed_batch(batch):
+    return batch, load_embedding_function().embed_documents([example['question'] for example in batch])
+
+def iter_embedded(batches, workers: int):
+    """
+    Yields (batch, embeddings) pairs. With more than one worker, batches are embedded
+    in a process pool with at most `workers * MAX_PENDING_PER_WORKER` in flight.
+    """
+    if workers <= 1:
+        for batch in batches:
+            yield embed_batch(batch)
+        return
+
+    max_pending = workers * MAX_PENDING_PER_WORKER
+    with ProcessPoolExecutor(max_workers=workers, initializer=load_embedding_function) as executor:
+        pending = set()
+        for batch in batches:
+            pending.add(executor.submit(embed_batch, batch))
+            if len(pending) >= max_pending:
+                break
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                next_batch = next(batches, None)
+                if next_batch is not None:
+                    pending.add(executor.submit(embed_batch, next_batch))
+                yield future.result()
+
+def load_examples(collection, examples, batch_size: int = BATCH_SIZE, workers: int = 1, force: bool = False,
+                  prune: bool = True) -> dict:
+    """
+    Embeds and upserts examples into `collection`, keyed by content hash, so re-running
+    with the same or a growing file never duplicates an example. Examples already in
+    the collection are not embedded again unless `force` is set. With `prune`, curated
+    examples that are no longer among `examples` (changed or removed since they were
+    loaded) are deleted; learned examples are left alone. Returns load statistics.
+    """
+    stats = {'read': 0, 'skipped': 0, 'embedded': 0, 'removed': 0}
+    loaded = set()
+
+    def new_batches():
+        for batch in iter_batches(examples, batch_size):
+            stats['read'] += len(batch)
+            loaded.update(example['id'] for example in batch)
+            if not force:
+                existing = set(collection.get(ids=[example['id'] for example in batch], include=[])['ids'])
+                stats['skipped'] += len(existing)
+                batch = [example for example in batch if example['id'] not in existing]
+            if batch:
+                yield batch
+
+    added_at = datetime.now(timezone.utc).isoformat()
+    started = time.perf_counter()
+    for batch, embeddings in iter_embedded(new_batches(), workers):
+        collection.upsert(
+            ids=[example['id'] for example in batch],
+            embeddings=embeddings,
+            documents=[example['question'] for example in batch],
+            metadatas=[{"sql_query": example['query'], "source": "curated", "added_at": added_at} for example in batch],
+        )
+        stats['embedded'] += len(batch)
+        rate = stats['embedded'] / (time.perf_counter() - started)
+        print(f"➡️ Embedded {stats['embedded']} examples ({rate:.1f} embeddings/sec).")
+
+    if prune:
+        curated = collection.get(where={"source": "curated"}, include=[])['ids']
+        stale = [key for key in curated if key not in loaded]
+        if stale:
+            collection.delete(ids=stale)
+        stats['removed'] = len(stale)
+    stats['seconds'] = time.perf_counter() - started
+    return stats
 
-# Initialize ChromaDB client. This will create the DB in a folder named 'chroma_db'
-client = chromadb.PersistentClient(path="./chroma_db")
-collection = client.get_or_create_collection(
-    name="float-chat-rag-examples",
-    embedding_function=None # We will handle embedding manually for clarity
-)
+def parse_args():
+    parser = argparse.ArgumentParser(description="Load question/SQL examples into the Chroma store used for few-shot retrieval.")
+    parser.add_argument('--examples', metavar='FILE.jsonl',
+                        help='JSONL file of {"question": ..., "query": ...} objects (default: the built-in examples).')
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help="Questions embedded per batch.")
+    parser.add_argument('--workers', type=int, default=1, help="Embedding processes (1 = embed in this process).")
+    parser.add_argument('--force', action='store_true', help="Re-embed examples that are already stored.")
+    parser.add_argument('--keep-missing', action='store_true',
+                        help="Keep stored curated examples that are not in this load (e.g. when adding a supplementary file).")
+    return parser.parse_args()
 
-print(f"Embedding {len(examples)} examples...")
+def main():
+    args = parse_args()
+    import chromadb
 
-# Embed each question and store it with the SQL query as metadata
-ids = [str(i) for i in range(len(examples))]
-questions = [ex["question"] for ex in examples]
-queries = [ex["query"] for ex in examples]
+    print("Initializing vector store...")
+    client = chromadb.PersistentClient(path=CHROMA_PATH)
+    collection = client.get_or_create_collection(
+        name=COLLECTION_NAME,
+        embedding_function=None # Embeddings are computed here, in batches
+    )
+    # Examples stored under the old sequential IDs would otherwise sit next to their hashed copies.
+    collection.delete(ids=LEGACY_IDS)
 
-# Generate embeddings for all questions in a batch
-embeddings = embedding_function.embed_documents(questions)
+    if args.examples and not os.path.exists(args.examples):
+        print(f"❌ Error: Examples file '{args.examples}' not found.")
+        return
+    examples = iter_examples(args.examples) if args.examples else iter(EXAMPLES)
+    stats = load_examples(collection, examples, args.batch_size, max(1, args.workers), args.force, prune=not args.keep_missing)
 
-# Add to the collection
-collection.add(
-    ids=ids,
-    embeddings=embeddings,
-    documents=questions,
-    metadatas=[{"sql_query": q} for q in queries]
-)
+    rate = stats['embedded'] / stats['seconds'] if stats['seconds'] else 0.0
+    print(f"✅ Vector database ready: {stats['embedded']} examples embedded, {stats['skipped']} already stored, "
+          f"{stats['removed']} outdated removed "
+          f"({stats['read']} unique read) in {stats['seconds']:.1f}s, {rate:.1f} embeddings/sec. "
+          f"The collection now holds {collection.count()} examples.")
 
-print("✅ Vector database created successfully with few-shot examples.")
\ No newline at end of file
+if __name__ == '__main__':
+    main()